@@ -1,6 +1,10 @@
 import logging
 import sys
+import time
 from contextlib import asynccontextmanager
+
+STARTED = time.perf_counter()  # taken before the heavy imports, for the startup timings
+
 from fastapi import FastAPI
 
 from src.config import config
@@ -9,9 +13,19 @@ from src.evolution_client import EvolutionAPIClient
 from src.message_processor import MessageProcessor
 from src.webhook import create_webhook_app
 from src.rag_service import RAGService
+from src.rag_indexer import RAGIndexer
 from src.analytics_agent import AgenteAnalista
+from src.analytics_scheduler import AnalyticsScheduler
+from src.engagement_prescorer import EngagementPreScorer
+from src.school_registry import SchoolRegistry
+from src.engagement_store import EngagementStore
 from src.professor_agent import ProfessorAgent
-from src.professor_agent import ProfessorAgent
+from src.semantic_detector import SemanticCrisisDetector
+from src.pattern_sets import PatternSetLoader
+from src.cost_monitor import CostMonitor
+from src.budget_controller import BudgetController
+from src.alert_dispatcher import AlertDispatcher, FileSink, WebhookSink, WhatsAppSink
+from src.warmup import Warmup
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +38,10 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Startup timings; slow components load in the background after the server binds
+warmup = Warmup(STARTED)
+warmup.mark("imports")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,23 +57,122 @@ async def lifespan(app: FastAPI):
         logger.error(f"Configuration error: {e}")
         sys.exit(1)
     
+    # Reload crisis/security/professor patterns when their files change
+    await pattern_sets.start()
+    
+    # Staff notifications for critical alerts
+    await alert_dispatcher.start()
+    
+    # Write API usage stats behind the request path
+    await cost_monitor.start()
+    await budget_controller.start()
+    
+    # Start background analytics (one-time import of the legacy alertas.json)
+    engagement_store.import_json("alertas.json")
+    await engagement_store.start()
+    await analytics_scheduler.start()
+    
+    # Load the embedding model, RAG index and crisis exemplars in the background;
+    # until then /ready answers 503 and replies skip RAG and semantic detection
+    await warmup.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Nino Educational Agent...")
+    await warmup.stop()
+    await analytics_scheduler.stop()
+    await engagement_store.stop()
+    await pattern_sets.stop()
+    await alert_dispatcher.stop()
+    await budget_controller.stop()
+    await cost_monitor.stop()
+    if semantic_detector:
+        semantic_detector.shutdown()
+    await rag_indexer.stop()
+    await rag_service.stop()
+    rag_service.shutdown()
 
 
 # Initialize components
 logger.info("Initializing components...")
 
-# Create RAG service (optional)
-rag_service = RAGService(api_key=config.LLM_API_KEY)
+# Pattern sets shared by SecurityGuard, AlertDetector and ProfessorAgent
+pattern_sets = PatternSetLoader(config.PATTERNS_DIR, poll_interval=config.PATTERNS_POLL_INTERVAL)
+warmup.mark("pattern_sets")
+
+# Create RAG service (optional; the model and index are loaded by the warmup)
+rag_service = RAGService(
+    api_key=config.LLM_API_KEY,
+    embedding_cache_size=config.RAG_EMBEDDING_CACHE_SIZE,
+    result_cache_size=config.RAG_RESULT_CACHE_SIZE,
+    poll_interval=config.RAG_POLL_INTERVAL,
+    load_index=False,
+    mmap=config.RAG_INDEX_MMAP
+)
+
+# New professor documents are added to the live index (saved in the background)
+rag_indexer = RAGIndexer(rag_service)
+warmup.mark("rag_service")
+
+# Semantic crisis detection shares the RAG embedding model (loaded by the warmup, with or without an index)
+semantic_detector = None
+
+# API usage/cost counters (in memory, flushed to disk in the background)
+cost_monitor = CostMonitor(
+    config.COST_STATS_FILE,
+    flush_every=config.COST_FLUSH_EVERY,
+    flush_interval=config.COST_FLUSH_INTERVAL,
+    usage_db=config.COST_USAGE_DB,
+    keep_days=config.COST_KEEP_DAYS
+)
+warmup.mark("cost_monitor")
+
+# Spend forecast, progressive downgrade and per-student/per-school quotas
+school_registry = SchoolRegistry(config.SCHOOL_REGISTRY_FILE)
+budget_controller = BudgetController(
+    cost_monitor,
+    daily_budget=config.BUDGET_DAILY,
+    monthly_budget=config.BUDGET_MONTHLY,
+    cheap_model=config.BUDGET_CHEAP_MODEL,
+    quotas_file=config.BUDGET_QUOTAS_FILE,
+    registry=school_registry,
+    instance=config.EVOLUTION_INSTANCE,
+    provider=config.LLM_PROVIDER
+)
+warmup.mark("budget_controller")
+
+# Create Analytics agent with its engagement store
+engagement_store = EngagementStore(config.ENGAGEMENT_DB_FILE)
+analytics_agent = AgenteAnalista(
+    api_key=config.LLM_API_KEY,
+    model=config.LLM_MODEL,
+    registry=school_registry,
+    instance=config.EVOLUTION_INSTANCE,
+    store=engagement_store,
+    cost_monitor=cost_monitor
+)
 
-# Create Analytics agent
-analytics_agent = AgenteAnalista(api_key=config.LLM_API_KEY, model=config.LLM_MODEL)
+# Schedule analytics in the background, off the reply path
+analytics_scheduler = AnalyticsScheduler(
+    analytics_agent,
+    min_interval=config.ANALYTICS_MIN_INTERVAL,
+    every_n_messages=config.ANALYTICS_EVERY_N_MESSAGES,
+    batch_size=config.ANALYTICS_BATCH_SIZE,
+    prescorer=EngagementPreScorer(pattern_sets=pattern_sets) if config.ANALYTICS_PRESCORER else None,
+    budget=budget_controller
+)
+warmup.mark("analytics")
 
 # Create Professor agent
-professor_agent = ProfessorAgent(api_key=config.LLM_API_KEY, model=config.LLM_MODEL)
+professor_agent = ProfessorAgent(
+    api_key=config.LLM_API_KEY,
+    model=config.LLM_MODEL,
+    pattern_sets=pattern_sets,
+    cost_monitor=cost_monitor,
+    indexer=rag_indexer
+)
+warmup.mark("professor_agent")
 
 # Create Nino agent with RAG
 leo_agent = LeoAgent(
@@ -63,8 +180,12 @@ leo_agent = LeoAgent(
     model=config.LLM_MODEL,
     max_messages=config.MAX_HISTORY_MESSAGES,
     provider=config.LLM_PROVIDER,
-    rag_service=rag_service
+    rag_service=rag_service,
+    pattern_sets=pattern_sets,
+    cost_monitor=cost_monitor,
+    budget=budget_controller
 )
+warmup.mark("leo_agent")
 
 # Create Evolution API client
 evolution_client = EvolutionAPIClient(
@@ -73,21 +194,70 @@ evolution_client = EvolutionAPIClient(
     instance=config.EVOLUTION_INSTANCE
 )
 
+# Notify staff of critical alerts (coordinator WhatsApp, webhook, local file)
+alert_sinks = [FileSink(config.ALERT_NOTIFICATIONS_FILE)]
+alert_sinks += [
+    WhatsAppSink(evolution_client, number, min_severity=config.ALERT_MIN_SEVERITY)
+    for number in config.ALERT_WHATSAPP_NUMBERS
+]
+if config.ALERT_WEBHOOK_URL:
+    alert_sinks.append(WebhookSink(config.ALERT_WEBHOOK_URL, min_severity=config.ALERT_MIN_SEVERITY))
+alert_dispatcher = AlertDispatcher(
+    alert_sinks,
+    window=config.ALERT_AGGREGATION_WINDOW,
+    max_retries=config.ALERT_MAX_RETRIES
+)
+
 # Create message processor with professor agent and analytics
 message_processor = MessageProcessor(
     leo_agent=leo_agent,
     evolution_client=evolution_client,
     professor_agent=professor_agent,
-    analytics_agent=analytics_agent
+    analytics_scheduler=analytics_scheduler,
+    semantic_detector=semantic_detector,
+    pattern_sets=pattern_sets,
+    alert_dispatcher=alert_dispatcher
 )
+warmup.mark("message_processor")
+
+
+def load_semantic_detector():
+    """Embed the crisis exemplars (loads the embedding model if the RAG index did not)"""
+    global semantic_detector
+    if config.SEMANTIC_CRISIS_DETECTION:
+        semantic_detector = SemanticCrisisDetector(rag_service.load_embeddings(), config.CRISIS_EXEMPLARS_FILE)
+        message_processor.alert_detector.semantic_detector = semantic_detector
+
+
+async def start_rag_updates():
+    """Follow versions published by prep_rag.py/other workers and index documents added while down"""
+    await rag_service.start()
+    # An index that exists but failed to load must not be replaced by a partial one
+    if rag_service.vectorstore is not None or not rag_service.store.current():
+        await rag_indexer.start()
+
+
+def load_llm_clients():
+    """Import the provider SDK and build the LLM clients before the first message needs them"""
+    for agent in (leo_agent, professor_agent, analytics_agent):
+        agent.llm
+
+
+warmup.add("llm_clients", load_llm_clients)
+if rag_service.store.current() or config.SEMANTIC_CRISIS_DETECTION:
+    warmup.add("embedding_model", rag_service.load_embeddings)
+warmup.add("rag_index", rag_service.load)
+warmup.add("semantic_detector", load_semantic_detector)
+warmup.add("rag_updates", start_rag_updates)
 
 # Create FastAPI app with webhook
-app = create_webhook_app(message_processor)
+app = create_webhook_app(message_processor, warmup=warmup)
 
 # Update lifespan
 app.router.lifespan_context = lifespan
 
-logger.info("Nino Educational Agent initialized successfully")
+logger.info(f"Nino Educational Agent initialized successfully in {time.perf_counter() - STARTED:.2f}s: " +
+            ", ".join(f"{name} {seconds:.2f}s" for name, seconds in warmup.startup.items()))
 logger.info(f"Server will run on port {config.SERVER_PORT}")
 logger.info(f"Using LLM provider: {config.LLM_PROVIDER}")
 logger.info(f"Using LLM model: {config.LLM_MODEL}")
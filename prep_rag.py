@@ -1,52 +1,57 @@
 """
 Script to prepare RAG index from school documents
+
+Only new or changed files are split and embedded (see src/rag_ingest.py);
+the result is published as a new version in ./faiss_index.
+
+--index-type picks the FAISS variant: flat (exact), f16 (half the size),
+pq or ivfpq (~15x smaller, approximate; ivfpq searches only nearby lists);
+see python -m tests.bench_faiss_variants for recall, latency and memory.
+
+Usage:
+    python prep_rag.py [--workers N] [--batch-size 64] [--threads 2] [--full]
+                       [--index-type flat|f16|pq|ivfpq] [--pq-m M] [--nlist N]
 """
-import os
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_groq import ChatGroq
-from langchain_community.vectorstores import FAISS
+import argparse
 from dotenv import load_dotenv
+from src.compact_index import INDEX_TYPES
+from src.rag_ingest import build_index
 
 load_dotenv()
 
-def create_rag_index():
+def create_rag_index(workers=None, batch_size=64, threads=2, full=False, index_type="flat", pq_m=None, nlist=None):
     """Create FAISS index from documents"""
     print("📚 Loading documents from ./documentos_escola...")
-    
-    # Load documents
-    loader = DirectoryLoader(
+    report = build_index(
         "./documentos_escola",
-        glob="**/*.txt",
-        loader_cls=TextLoader,
-        loader_kwargs={"encoding": "utf-8"}
+        "./faiss_index",
+        workers=workers,
+        batch_size=batch_size,
+        threads=threads,
+        full=full,
+        index_type=index_type,
+        pq_m=pq_m,
+        nlist=nlist
     )
-    documents = loader.load()
-    print(f"✅ Loaded {len(documents)} documents")
-    
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50
-    )
-    splits = text_splitter.split_documents(documents)
-    print(f"✅ Split into {len(splits)} chunks")
-    
-    # Create embeddings (using HuggingFace - free and local)
-    print("🔄 Creating embeddings...")
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    
-    # Create FAISS index
-    vectorstore = FAISS.from_documents(splits, embeddings)
-    
-    # Save index
-    vectorstore.save_local("./faiss_index")
-    print("✅ FAISS index saved to ./faiss_index")
+    print(f"✅ {report['documents']} documents, {report['changed']} new/changed, {report['removed']} removed")
+    print(f"✅ {report['chunks']} chunks, {report['embedded']} embedded now")
+
+    seconds = report["seconds"]
+    print("⏱️  " + ", ".join(f"{stage} {seconds[stage]:.2f}s" for stage in ("scan", "split", "embed", "build", "total")))
+    if report["version"]:
+        print(f"✅ FAISS index ({index_type}) saved to ./faiss_index/{report['version']}")
+    else:
+        print("✅ Nothing changed, ./faiss_index is up to date")
     print("🎉 RAG preparation complete!")
 
 if __name__ == "__main__":
-    create_rag_index()
+    parser = argparse.ArgumentParser(description="Build the RAG index incrementally")
+    parser.add_argument("--workers", type=int, default=None, help="processes for hashing/splitting (default: CPUs)")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per embedding call")
+    parser.add_argument("--threads", type=int, default=2, help="concurrent embedding calls")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-embed everything")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS variant (default: flat)")
+    parser.add_argument("--pq-m", type=int, default=None, help="PQ bytes per vector (default: dimension / 4)")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists for ivfpq (default: 4 * sqrt(chunks))")
+    args = parser.parse_args()
+    create_rag_index(args.workers, args.batch_size, args.threads, args.full, args.index_type, args.pq_m, args.nlist)
@@ -1,12 +1,14 @@
 """
 Critical Alert Detector - Identifies urgent student situations
 """
+import asyncio
 import logging
-import json
-import os
 from datetime import datetime
-from typing import Tuple, Optional
-import re
+from typing import List, Tuple, Optional, Union
+from src.alert_log import AlertLog
+from src.pattern_matcher import SEVERITY_ORDER, PatternMatcher
+from src.pattern_sets import PatternSetLoader, compile_crisis
+from src.text_analysis import MessageAnalysis, analyze_message
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,7 @@ class AlertDetector:
     """Detects critical situations requiring immediate intervention"""
     
     # Critical patterns indicating serious issues
+    # (built-in fallback; the live set is config/patterns/crisis.json)
     CRITICAL_PATTERNS = {
         "dropout_risk": [
             r"vou\s+sair\s+da\s+escola",
@@ -66,49 +69,128 @@ class AlertDetector:
         "severe_anxiety": "MEDIUM"
     }
     
-    def __init__(self, alerts_file: str = "critical_alerts.json"):
+    def __init__(self, alerts_dir: str = "critical_alerts", legacy_alerts_file: str = "critical_alerts.json",
+                 semantic_detector=None, pattern_sets: Optional[PatternSetLoader] = None, dispatcher=None):
         """
         Initialize alert detector
         
         Args:
-            alerts_file: File to store critical alerts
+            alerts_dir: Directory of the critical alert log (segments + status index)
+            legacy_alerts_file: Old JSON file, migrated into the log on first start
+            semantic_detector: Optional SemanticCrisisDetector for paraphrases the patterns miss
+            pattern_sets: Shared PatternSetLoader (hot reload); a private one is created if None
+            dispatcher: Optional AlertDispatcher that notifies staff of new alerts
         """
-        self.alerts_file = alerts_file
+        self.alert_log = AlertLog(alerts_dir, legacy_file=legacy_alerts_file)
+        self.semantic_detector = semantic_detector
+        self.dispatcher = dispatcher
+        self.pattern_sets = pattern_sets or PatternSetLoader()
+        self.pattern_sets.register("crisis", "crisis.json", compile_crisis, self.builtin_patterns())
         logger.info("AlertDetector initialized")
     
-    def detect_critical_situation(self, message: str, user_id: str) -> Tuple[bool, Optional[dict]]:
+    @classmethod
+    def builtin_patterns(cls) -> dict:
+        """Class constants in the crisis.json format"""
+        return {
+            "version": 0,
+            "categories": {
+                category: {"severity": cls.SEVERITY[category], "patterns": patterns}
+                for category, patterns in cls.CRITICAL_PATTERNS.items()
+            }
+        }
+    
+    @property
+    def matcher(self) -> PatternMatcher:
+        """Matcher of the current crisis pattern set"""
+        return self.pattern_sets.get("crisis").matcher
+    
+    def detect_critical_situation(self, message: Union[str, MessageAnalysis], user_id: str) -> Tuple[bool, Optional[dict]]:
         """
         Detect if message indicates a critical situation
         
         Args:
-            message: Student's message
+            message: Student's message (or its MessageAnalysis)
             user_id: Student's phone number
             
         Returns:
             (is_critical, alert_data)
         """
-        message_lower = message.lower()
+        alert = self._match_patterns(analyze_message(message), user_id)
+        if alert is None:
+            return False, None
         
-        for category, patterns in self.CRITICAL_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower, re.IGNORECASE):
-                    alert = self._create_alert(
-                        user_id=user_id,
-                        message=message,
-                        category=category,
-                        pattern=pattern,
-                        severity=self.SEVERITY[category]
-                    )
-                    
-                    self._save_alert(alert)
-                    logger.critical(f"CRITICAL ALERT: {category} detected for user {user_id}")
-                    
-                    return True, alert
+        self._save_alert(alert)
+        logger.critical(f"CRITICAL ALERT: {alert['category']} detected for user {user_id}")
         
-        return False, None
+        return True, alert
+    
+    async def adetect_critical_situation(self, message: Union[str, MessageAnalysis], user_id: str) -> Tuple[bool, Optional[dict]]:
+        """
+        Detect a critical situation with patterns, then semantically if no pattern matched
+        
+        Args:
+            message: Student's message (or its MessageAnalysis)
+            user_id: Student's phone number
+            
+        Returns:
+            (is_critical, alert_data)
+        """
+        analysis = analyze_message(message)
+        alert = self._match_patterns(analysis, user_id)
+        if alert is not None:
+            await self._asave_alert(alert)
+            logger.critical(f"CRITICAL ALERT: {alert['category']} detected for user {user_id}")
+            return True, alert
+        if not self.semantic_detector:
+            return False, None
+        
+        try:
+            # As written, like the exemplars (the model sees accents and case on both sides)
+            matches = await self.semantic_detector.adetect(analysis.text)
+        except Exception as e:
+            logger.error(f"Error in semantic crisis detection: {e}")
+            return False, None
+        if not matches:
+            return False, None
+        
+        # Rank flagged categories by severity, then similarity
+        severity = self.pattern_sets.get("crisis").severity
+        ranked = sorted(matches, key=lambda m: (SEVERITY_ORDER.index(severity.get(m[0], "HIGH")), -m[1]))
+        category, score = ranked[0]
+        alert = self._create_alert(
+            user_id=user_id,
+            message=analysis.text,
+            category=category,
+            pattern=f"semantic:{score:.2f}",
+            severity=severity.get(category, "HIGH"),
+            categories=[c for c, _ in ranked]
+        )
+        
+        await self._asave_alert(alert)
+        logger.critical(f"CRITICAL ALERT: {category} detected semantically ({score:.2f}) for user {user_id}")
+        
+        return True, alert
+    
+    def _match_patterns(self, analysis: MessageAnalysis, user_id: str) -> Optional[dict]:
+        """Alert for the crisis patterns a message matches (not saved), None if none match"""
+        crisis = self.pattern_sets.get("crisis")  # one version for the whole check
+        matches = crisis.matcher.match(*analysis.forms)
+        if not matches:
+            return None
+        
+        # Most severe category first; the others are kept on the alert
+        category, pattern = matches[0]
+        return self._create_alert(
+            user_id=user_id,
+            message=analysis.text,
+            category=category,
+            pattern=pattern,
+            severity=crisis.severity[category],
+            categories=[c for c, _ in matches]
+        )
     
     def _create_alert(self, user_id: str, message: str, category: str, 
-                     pattern: str, severity: str) -> dict:
+                     pattern: str, severity: str, categories: Optional[List[str]] = None) -> dict:
         """Create alert data structure"""
         return {
             "alert_id": f"{user_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
@@ -116,34 +198,34 @@ class AlertDetector:
             "user_id": user_id,
             "severity": severity,
             "category": category,
+            "categories": categories or [category],
             "message": message,
             "pattern_matched": pattern,
             "status": "NEW",
             "requires_immediate_action": severity in ["CRITICAL", "HIGH"]
         }
     
-    def _save_alert(self, alert: dict):
-        """Save critical alert to file"""
+    def _write_alert(self, alert: dict):
+        """Append the alert to the alert log (blocking: fsyncs)"""
         try:
-            # Load existing alerts
-            if os.path.exists(self.alerts_file):
-                with open(self.alerts_file, "r", encoding="utf-8") as f:
-                    alerts = json.load(f)
-            else:
-                alerts = []
-            
-            # Add new alert
-            alerts.append(alert)
-            
-            # Save back
-            with open(self.alerts_file, "w", encoding="utf-8") as f:
-                json.dump(alerts, f, ensure_ascii=False, indent=2)
-            
+            self.alert_log.append(alert)
             logger.info(f"Critical alert saved: {alert['alert_id']}")
             
         except Exception as e:
             logger.error(f"Error saving critical alert: {e}")
     
+    def _save_alert(self, alert: dict):
+        """Save critical alert to the alert log and queue the staff notification"""
+        self._write_alert(alert)
+        if self.dispatcher:
+            self.dispatcher.notify(alert)
+    
+    async def _asave_alert(self, alert: dict):
+        """``_save_alert`` with the durable write in a thread, off the event loop"""
+        await asyncio.to_thread(self._write_alert, alert)
+        if self.dispatcher:
+            self.dispatcher.notify(alert)
+    
     def get_response_for_critical_situation(self, category: str) -> str:
         """
         Get appropriate response for critical situation
@@ -210,11 +292,7 @@ Quer conversar sobre o que te deixa tão nervoso?"""
     def get_pending_alerts(self, status: str = "NEW") -> list:
         """Get alerts by status"""
         try:
-            if os.path.exists(self.alerts_file):
-                with open(self.alerts_file, "r", encoding="utf-8") as f:
-                    alerts = json.load(f)
-                return [a for a in alerts if a.get("status") == status]
-            return []
+            return self.alert_log.by_status(status)
         except Exception as e:
             logger.error(f"Error loading alerts: {e}")
             return []
@@ -222,18 +300,7 @@ Quer conversar sobre o que te deixa tão nervoso?"""
     def mark_alert_handled(self, alert_id: str):
         """Mark alert as handled"""
         try:
-            if os.path.exists(self.alerts_file):
-                with open(self.alerts_file, "r", encoding="utf-8") as f:
-                    alerts = json.load(f)
-                
-                for alert in alerts:
-                    if alert["alert_id"] == alert_id:
-                        alert["status"] = "HANDLED"
-                        alert["handled_at"] = datetime.now().isoformat()
-                
-                with open(self.alerts_file, "w", encoding="utf-8") as f:
-                    json.dump(alerts, f, ensure_ascii=False, indent=2)
-                
+            if self.alert_log.update_status(alert_id, "HANDLED", handled_at=datetime.now().isoformat()):
                 logger.info(f"Alert marked as handled: {alert_id}")
         except Exception as e:
             logger.error(f"Error marking alert as handled: {e}")
@@ -0,0 +1,270 @@
+"""
+Alert Dispatcher - Fans critical alerts out to staff (WhatsApp, webhook, file)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+import httpx
+from src.pattern_matcher import SEVERITY_ORDER
+
+logger = logging.getLogger(__name__)
+
+
+def _severity_rank(severity: str) -> int:
+    """0 for CRITICAL, higher is less urgent"""
+    return SEVERITY_ORDER.index(severity) if severity in SEVERITY_ORDER else len(SEVERITY_ORDER)
+
+
+def format_alert_text(alerts: List[dict]) -> str:
+    """
+    Staff-facing text for one alert or an aggregated group of the same student
+
+    Args:
+        alerts: Alerts of one student, oldest first
+
+    Returns:
+        WhatsApp-friendly message
+    """
+    top = min(alerts, key=lambda a: _severity_rank(a.get("severity")))
+    categorias = sorted({c for a in alerts for c in a.get("categories", [a.get("category")])})
+    linhas = [
+        f"🚨 ALERTA {top.get('severity')} - {top.get('category')}",
+        f"Aluno: {top.get('user_id')}",
+    ]
+    if len(alerts) == 1:
+        linhas.append(f"Mensagem: \"{top.get('message', '')[:300]}\"")
+    else:
+        linhas.append(f"{len(alerts)} alertas desde {alerts[0].get('timestamp', '')[:16]} ({', '.join(categorias)})")
+        linhas.append(f"Última mensagem: \"{alerts[-1].get('message', '')[:300]}\"")
+    linhas.append(f"ID: {alerts[-1].get('alert_id')}")
+    return "\n".join(linhas)
+
+
+class WhatsAppSink:
+    """Sends the alert text to one coordinator number through Evolution API"""
+
+    def __init__(self, evolution_client, phone_number: str, min_severity: str = "HIGH"):
+        self.evolution_client = evolution_client
+        self.phone_number = phone_number
+        self.min_severity = min_severity
+        self.name = f"whatsapp:{phone_number}"
+
+    async def send(self, alerts: List[dict]) -> bool:
+        return await self.evolution_client.send_message(self.phone_number, format_alert_text(alerts))
+
+
+class WebhookSink:
+    """POSTs ``{"alerts": [...], "text": ...}`` as JSON to an HTTP endpoint"""
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 10.0,
+                 min_severity: str = "HIGH"):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.min_severity = min_severity
+        self.name = f"webhook:{url}"
+
+    async def send(self, alerts: List[dict]) -> bool:
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(
+                    self.url, headers=self.headers, json={"alerts": alerts, "text": format_alert_text(alerts)}
+                )
+            if 200 <= response.status_code < 300:
+                return True
+            logger.error(f"Alert webhook returned {response.status_code}: {response.text[:200]}")
+            return False
+        except httpx.HTTPError as e:
+            logger.error(f"Alert webhook error: {e}")
+            return False
+
+
+class FileSink:
+    """Appends one JSON line per notification to a local file"""
+
+    def __init__(self, path: str, min_severity: str = "LOW"):
+        self.path = path
+        self.min_severity = min_severity
+        self.name = f"file:{path}"
+
+    def _append(self, alerts: List[dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"notified_at": time.time(), "alerts": alerts}, ensure_ascii=False) + "\n")
+
+    async def send(self, alerts: List[dict]) -> bool:
+        await asyncio.to_thread(self._append, alerts)
+        return True
+
+
+class _Window:
+    """Aggregation window of one student"""
+
+    __slots__ = ("closes_at", "sent_rank", "pending", "seen")
+
+    def __init__(self, closes_at: float, sent_rank: int):
+        self.closes_at = closes_at
+        self.sent_rank = sent_rank
+        self.pending: List[dict] = []
+        self.seen = set()
+
+
+class AlertDispatcher:
+    """Asynchronous fan-out of new alerts to staff sinks
+
+    ``notify()`` only enqueues, so detection and the student's reply never
+    wait on a notification. A worker groups alerts per student: the first
+    alert is sent immediately and opens an aggregation window; further alerts
+    inside the window are collected and sent as one summary when it closes,
+    unless one is more severe than what was already sent (escalations go out
+    immediately). Every sink is delivered independently with retries and
+    exponential backoff.
+    """
+
+    def __init__(self, sinks: List, window: float = 300.0, max_retries: int = 3,
+                 retry_backoff: float = 2.0, queue_size: int = 1000):
+        """
+        Initialize dispatcher
+
+        Args:
+            sinks: WhatsAppSink/WebhookSink/FileSink (anything with name, min_severity and async send)
+            window: Aggregation window per student in seconds
+            max_retries: Retries per sink after the first attempt
+            retry_backoff: First retry delay in seconds (doubles each retry)
+            queue_size: Max queued alerts (new alerts are dropped and logged beyond this)
+        """
+        self.sinks = sinks
+        self.window = window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._windows: Dict[str, _Window] = {}
+        self._deliveries = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._stats = {"queued": 0, "dropped": 0, "duplicates": 0, "aggregated": 0,
+                       "notifications": 0, "delivered": 0, "failed": 0, "retries": 0}
+        logger.info(f"AlertDispatcher initialized ({', '.join(s.name for s in sinks) or 'no sinks'})")
+
+    def notify(self, alert: dict):
+        """
+        Queue a new alert for dispatch (never blocks)
+
+        Args:
+            alert: Alert created by AlertDetector
+        """
+        try:
+            self._queue.put_nowait(alert)
+            self._stats["queued"] += 1
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            logger.error(f"Alert dispatch queue full, dropped {alert.get('alert_id')}")
+
+    async def start(self):
+        """Start the dispatch worker"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            logger.info("AlertDispatcher started")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop the worker, send open aggregation windows and wait for deliveries"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while not self._queue.empty():
+            self._handle(self._queue.get_nowait(), time.monotonic())
+        for user_id in list(self._windows):
+            self._close_window(user_id)
+        if self._deliveries:
+            await asyncio.wait(self._deliveries, timeout=timeout)
+
+    async def _run(self):
+        """Consume the queue and close expired windows"""
+        while True:
+            now = time.monotonic()
+            for user_id, window in list(self._windows.items()):
+                if window.closes_at <= now:
+                    self._close_window(user_id)
+
+            deadline = min((w.closes_at for w in self._windows.values()), default=None)
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                alert = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                continue
+            self._handle(alert, time.monotonic())
+
+    def _handle(self, alert: dict, now: float):
+        """Send now, aggregate into the student's window, or drop a duplicate"""
+        user_id = alert.get("user_id")
+        rank = _severity_rank(alert.get("severity"))
+        window = self._windows.get(user_id)
+
+        if window is None:
+            self._windows[user_id] = window = _Window(now + self.window, rank)
+            window.seen.add(alert.get("alert_id"))
+            self._dispatch([alert])
+            return
+
+        if alert.get("alert_id") in window.seen:
+            self._stats["duplicates"] += 1
+            return
+        window.seen.add(alert.get("alert_id"))
+
+        if rank < window.sent_rank:
+            # Escalation: page now, together with what was waiting
+            window.sent_rank = rank
+            batch, window.pending = window.pending + [alert], []
+            self._dispatch(batch)
+        else:
+            window.pending.append(alert)
+            self._stats["aggregated"] += 1
+
+    def _close_window(self, user_id: str):
+        """Send the aggregated alerts of a window, if any"""
+        window = self._windows.pop(user_id)
+        if window.pending:
+            self._dispatch(window.pending)
+
+    def _dispatch(self, alerts: List[dict]):
+        """Start one delivery task per sink that wants these alerts"""
+        self._stats["notifications"] += 1
+        top_rank = min(_severity_rank(a.get("severity")) for a in alerts)
+        for sink in self.sinks:
+            if top_rank <= _severity_rank(sink.min_severity):
+                task = asyncio.get_running_loop().create_task(self._deliver(sink, alerts))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, sink, alerts: List[dict]):
+        """Deliver to one sink with retries and exponential backoff"""
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                if await sink.send(alerts):
+                    self._stats["delivered"] += 1
+                    logger.info(f"Alert notification sent via {sink.name} ({len(alerts)} alerts)")
+                    return
+            except Exception as e:
+                logger.error(f"Error sending alert via {sink.name}: {e}")
+            if attempt < self.max_retries:
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        self._stats["failed"] += 1
+        logger.error(f"Alert notification via {sink.name} failed after {self.max_retries + 1} attempts")
+
+    def get_stats(self) -> dict:
+        """Dispatch counters"""
+        return {**self._stats, "pending": self._queue.qsize(), "open_windows": len(self._windows)}
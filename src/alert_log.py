@@ -0,0 +1,294 @@
+"""
+Alert Log - Log-structured, append-only storage for critical alerts
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AlertLog:
+    """Daily-rotated JSONL segments plus a small status index
+
+    Every alert is one line in ``alerts-YYYYMMDD.jsonl``, written with fsync
+    so a crisis alert survives a crash right after detection. Status changes
+    are appended as tombstone records instead of rewriting the alert.
+    ``index.jsonl`` maps alert_id to (segment, offset, status) and is loaded
+    into memory, so pending-alert queries only read the alerts they return.
+    When writes roll over to a new segment the index is compacted to one
+    line per alert (its current status and fields), so status changes do
+    not make it grow forever. On load, records past the last indexed one
+    (a crash between the segment and index writes) are indexed too.
+
+    Writes block on fsync; callers on the event loop run them in a thread
+    (``AlertDetector`` does).
+    """
+
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, log_dir: str = "critical_alerts", legacy_file: Optional[str] = "critical_alerts.json"):
+        """
+        Initialize alert log
+
+        Args:
+            log_dir: Directory with segments and the status index
+            legacy_file: Old single-file JSON store, migrated on first use
+        """
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # alert_id -> {"segment", "offset", "status", "fields", "last"}
+        self._index: Dict[str, Dict] = {}
+        # status -> ordered set of alert_ids
+        self._by_status: Dict[str, Dict[str, None]] = {}
+        self._segment: Optional[str] = None  # segment of the latest write
+
+        self._load_index()
+        if legacy_file and not self._index and os.path.exists(legacy_file):
+            self._migrate_legacy(legacy_file)
+
+        logger.info(f"AlertLog initialized ({len(self._index)} alerts in {log_dir})")
+
+    def _segment_name(self) -> str:
+        """Segment for today"""
+        return f"alerts-{datetime.now().strftime('%Y%m%d')}.jsonl"
+
+    def _write_line(self, filename: str, record: dict) -> int:
+        """Append one JSON line with fsync and return its byte offset"""
+        path = os.path.join(self.log_dir, filename)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return offset
+
+    def _apply_index(self, entry: dict):
+        """Apply one index entry to the in-memory index"""
+        alert_id = entry["alert_id"]
+        current = self._index.get(alert_id)
+
+        if current is None:
+            if "fields" in entry:
+                return  # status update for an unknown alert
+            current = self._index[alert_id] = {
+                "segment": entry["segment"],
+                "offset": entry["offset"],
+                "status": None,
+                "fields": {},
+                "last": None
+            }
+        else:
+            self._by_status.get(current["status"], {}).pop(alert_id, None)
+
+        current["status"] = entry["status"]
+        current["fields"].update(entry.get("fields", {}))
+        # Position of the alert's latest record: kept through compaction, it tells
+        # _recover_tail where the indexed part of each segment ends
+        current["last"] = (entry["segment"], entry["offset"])
+        self._by_status.setdefault(entry["status"], {})[alert_id] = None
+
+    def _segments(self) -> List[str]:
+        """Segment files, oldest first"""
+        return sorted(
+            name for name in os.listdir(self.log_dir)
+            if name.startswith("alerts-") and name.endswith(".jsonl")
+        )
+
+    def _read_segment(self, segment: str, start: int = 0):
+        """Yield the index entry of every record in a segment from a byte offset"""
+        with open(os.path.join(self.log_dir, segment), "rb") as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                try:
+                    record = json.loads(raw)
+                    if record.get("type") == "status":
+                        fields = {k: v for k, v in record.items() if k not in ("type", "alert_id", "status")}
+                        yield {"alert_id": record["alert_id"], "segment": segment,
+                               "offset": offset, "status": record["status"], "fields": fields}
+                    else:
+                        yield {"alert_id": record["alert_id"], "segment": segment,
+                               "offset": offset, "status": record.get("status", "NEW")}
+                except (ValueError, KeyError):
+                    pass  # torn line from a crash mid-write
+                offset += len(raw)
+
+    def _load_index(self):
+        """Load the status index, rebuilding it from segments if missing"""
+        index_path = os.path.join(self.log_dir, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            self._rebuild_index()
+            return
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._apply_index(json.loads(line))
+                except (ValueError, KeyError):
+                    logger.warning("Skipping corrupt alert index line")
+        self._recover_tail()
+        self._segment = max((entry["last"][0] for entry in self._index.values()), default=None)
+
+    def _recover_tail(self):
+        """
+        Index records that reached a segment but not the index
+
+        A crash between the segment fsync and the index fsync leaves the alert
+        only in the segment. Such records can only be at the end of the log:
+        after the last indexed record of the newest indexed segment, or in a
+        newer segment.
+        """
+        indexed: Dict[str, int] = {}
+        for current in self._index.values():
+            segment, offset = current["last"]
+            indexed[segment] = max(offset, indexed.get(segment, -1))
+        newest = max(indexed, default="")
+
+        recovered = 0
+        for segment in self._segments():
+            if segment < newest:
+                continue
+            last = indexed.get(segment)
+            for entry in self._read_segment(segment, last or 0):
+                if last is not None and entry["offset"] <= last:
+                    continue
+                if "fields" in entry and entry["alert_id"] not in self._index:
+                    continue
+                self._apply_index(entry)
+                self._write_line(self.INDEX_FILE, entry)
+                recovered += 1
+        if recovered:
+            logger.warning(f"Recovered {recovered} alert records missing from the index")
+
+    def _rebuild_index(self):
+        """Rebuild the status index by scanning every segment (recovery only)"""
+        segments = self._segments()
+        for segment in segments:
+            for entry in self._read_segment(segment):
+                self._apply_index(entry)
+                self._write_line(self.INDEX_FILE, entry)
+
+        if self._index:
+            logger.info(f"Alert index rebuilt from {len(segments)} segments")
+        self._segment = segments[-1] if segments else None
+
+    def _current_segment(self) -> str:
+        """Segment for the next write; compacts the index when the day rolled over"""
+        segment = self._segment_name()
+        if segment != self._segment:
+            if self._segment is not None:
+                self._compact_index()
+            self._segment = segment
+        return segment
+
+    def _compact_index(self):
+        """Rewrite the index with one line per alert, two if it changed since (replaced atomically)"""
+        index_path = os.path.join(self.log_dir, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for alert_id, current in self._index.items():
+                entry = {"alert_id": alert_id, "segment": current["segment"], "offset": current["offset"],
+                         "status": current["status"]}
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+                last = current["last"]
+                if current["fields"] or last != (current["segment"], current["offset"]):
+                    # Same shape as a status update, at the position of the latest record
+                    entry.update(segment=last[0], offset=last[1], fields=current["fields"])
+                    f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+        logger.info(f"Alert index compacted to {len(self._index)} alerts")
+
+    def _migrate_legacy(self, legacy_file: str):
+        """Import alerts from the old critical_alerts.json"""
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                alerts = json.load(f)
+            for alert in alerts:
+                status = alert.get("status", "NEW")
+                handled_at = alert.get("handled_at")
+                alert_id = self.append({**alert, "status": "NEW"})
+                if status != "NEW":
+                    self.update_status(alert_id, status, **({"handled_at": handled_at} if handled_at else {}))
+            os.replace(legacy_file, f"{legacy_file}.migrated")
+            logger.info(f"Migrated {len(alerts)} alerts from {legacy_file}")
+        except Exception as e:
+            logger.error(f"Error migrating legacy alerts: {e}")
+
+    def append(self, alert: dict) -> str:
+        """
+        Append a new alert (O(1), durable on return)
+
+        Args:
+            alert: Alert data with alert_id and status
+
+        Returns:
+            The stored alert_id (suffixed if it collided with an existing one)
+        """
+        with self._lock:
+            alert_id = alert["alert_id"]
+            suffix = 1
+            while alert_id in self._index:
+                suffix += 1
+                alert_id = f"{alert['alert_id']}_{suffix}"
+            alert["alert_id"] = alert_id
+
+            segment = self._current_segment()
+            offset = self._write_line(segment, {"type": "alert", **alert})
+            entry = {"alert_id": alert_id, "segment": segment, "offset": offset,
+                     "status": alert.get("status", "NEW")}
+            self._write_line(self.INDEX_FILE, entry)
+            self._apply_index(entry)
+            return alert_id
+
+    def update_status(self, alert_id: str, status: str, **fields) -> bool:
+        """
+        Change an alert's status by appending a tombstone record
+
+        Args:
+            alert_id: Alert to update
+            status: New status (e.g. HANDLED)
+            **fields: Extra fields to set on the alert (e.g. handled_at)
+
+        Returns:
+            False if the alert does not exist
+        """
+        with self._lock:
+            if alert_id not in self._index:
+                return False
+
+            segment = self._current_segment()
+            offset = self._write_line(segment, {"type": "status", "alert_id": alert_id, "status": status, **fields})
+            entry = {"alert_id": alert_id, "segment": segment, "offset": offset,
+                     "status": status, "fields": fields}
+            self._write_line(self.INDEX_FILE, entry)
+            self._apply_index(entry)
+            return True
+
+    def get(self, alert_id: str) -> Optional[dict]:
+        """Read one alert with its current status (one seek)"""
+        entry = self._index.get(alert_id)
+        if entry is None:
+            return None
+
+        with open(os.path.join(self.log_dir, entry["segment"]), "rb") as f:
+            f.seek(entry["offset"])
+            record = json.loads(f.readline())
+
+        record.pop("type", None)
+        record["status"] = entry["status"]
+        record.update(entry["fields"])
+        return record
+
+    def by_status(self, status: str) -> List[dict]:
+        """Get all alerts with a status, oldest first, without scanning history"""
+        alert_ids = list(self._by_status.get(status, {}))
+        return [alert for alert in (self.get(alert_id) for alert_id in alert_ids) if alert]
@@ -3,12 +3,14 @@ Analytics Agent using Fredricks (2004) Engagement Framework
 """
 import logging
 import json
-import os
+import time
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from pydantic import BaseModel, Field
-from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
+from src.school_registry import SchoolRegistry
+from src.engagement_store import EngagementStore
+from src.cost_monitor import CostMonitor, token_usage
 
 logger = logging.getLogger(__name__)
 
@@ -41,29 +43,47 @@ class AnaliseEngajamento(BaseModel):
         description="1-2 frases EXATAS do aluno que justificam os scores"
     )
     
-    # Location data for heatmap
-    escola: str = Field(..., description="Nome da escola/instituição")
-    cidade: str = Field(..., description="Cidade da escola, ex: João Pessoa")
-    lat: float = Field(..., description="Latitude da escola")
-    lon: float = Field(..., description="Longitude da escola")
+    # Location data for heatmap (joined from SchoolRegistry, not generated by the LLM)
+    escola: Optional[str] = Field(None, description="Nome da escola/instituição")
+    cidade: Optional[str] = Field(None, description="Cidade da escola, ex: João Pessoa")
+    lat: Optional[float] = Field(None, description="Latitude da escola")
+    lon: Optional[float] = Field(None, description="Longitude da escola")
 
 
 class AgenteAnalista:
     """Analytics agent for student engagement analysis"""
     
-    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile"):
+    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile",
+                 incremental: bool = True, full_every: int = 5,
+                 registry: Optional[SchoolRegistry] = None, instance: Optional[str] = None,
+                 store: Optional[EngagementStore] = None, cost_monitor: Optional[CostMonitor] = None):
         """
         Initialize analytics agent
         
         Args:
             api_key: Groq API key
             model: LLM model name
+            incremental: Send only new turns plus the previous scores when possible
+            full_every: Run a full re-analysis after this many incremental ones (corrects drift)
+            registry: SchoolRegistry used to fill school and location (default: config/escolas.csv)
+            instance: Evolution API instance, used as registry fallback key
+            store: EngagementStore for results (default: engajamento.db, opened on first save)
+            cost_monitor: Records latency/token histograms of the LLM calls (optional)
         """
-        self.llm = ChatGroq(
-            model=model,
-            temperature=0.3,  # Lower temperature for more consistent analysis
-            groq_api_key=api_key
-        )
+        self.incremental = incremental
+        self.full_every = full_every
+        self.registry = registry or SchoolRegistry()
+        self.instance = instance
+        self.store = store
+        self.model = model
+        self.cost_monitor = cost_monitor
+        
+        # Previous analysis and cursor per student: aluno_id -> {"analise", "cursor", "incrementos"}
+        self._estados: Dict[str, Dict] = {}
+        
+        # Groq client, created on first use
+        self._api_key = api_key
+        self._llm = None
         
         self.system_prompt = """Você é um analista educacional sênior. Seu trabalho é analisar a transcrição de uma conversa
 e preencher um JSON, usando o framework de engajamento de Fredricks (2004).
@@ -77,7 +97,8 @@ e preencher um JSON, usando o framework de engajamento de Fredricks (2004).
 1. **score_desmotivacao**: Deve ser calculado como (1.0 - a MÉDIA dos três pilares).
    Ex: Se a média dos 3 pilares for 0.2, o score de desmotivação é 0.8.
 2. **observacoes_chave**: Extraia 1 ou 2 frases exatas do aluno que justificam sua análise.
-3. **Localização**: Use "João Pessoa" como cidade, lat: -7.1195, lon: -34.845
+3. Preencha APENAS os campos engajamento_comportamental, engajamento_emocional, engajamento_cognitivo,
+   score_desmotivacao e observacoes_chave
 
 [IMPORTANTE - CONTEXTO DE CONVERSA]
 - Mensagens curtas de saudação ("Oi", "Olá", apresentações) NÃO devem ser interpretadas como desmotivação
@@ -87,6 +108,22 @@ e preencher um JSON, usando o framework de engajamento de Fredricks (2004).
 
 Responda APENAS com o objeto JSON válido, sem markdown ou explicações."""
         
+        self.incremental_prompt = self.system_prompt + """
+
+[MODO INCREMENTAL]
+Você receberá os scores da ANÁLISE ANTERIOR deste aluno e APENAS as mensagens novas desde então.
+- Atualize os scores considerando a análise anterior como ponto de partida
+- Só mude um score de forma significativa se as mensagens novas trouxerem evidências
+- observacoes_chave deve conter frases das mensagens novas (ou manter as anteriores se não houver nada relevante)"""
+        
+        self.batch_prompt = self.incremental_prompt + """
+
+[MODO LOTE]
+Você receberá conversas de VÁRIOS alunos, cada uma começando com "### aluno_id: <id>".
+- Analise cada aluno de forma independente, sem misturar conversas
+- Análises marcadas como INCREMENTAL trazem a análise anterior e só as mensagens novas
+- Responda com um objeto JSON {"analises": [...]} contendo um objeto por aluno, com o campo "aluno_id" e os mesmos campos da análise individual"""
+        
         logger.info("AgenteAnalista initialized with Fredricks framework")
     
     async def analisar_conversa(self, aluno_id: str, historico: List[Dict[str, str]]) -> AnaliseEngajamento:
@@ -101,100 +138,296 @@ Responda APENAS com o objeto JSON válido, sem markdown ou explicações."""
             AnaliseEngajamento with scores
         """
         try:
-            # Skip analysis for very short conversations (less than 3 student messages)
-            student_messages = [msg for msg in historico if msg['role'] == 'user']
-            
-            if len(student_messages) < 3:
-                logger.info(f"Skipping analysis for {aluno_id}: conversation too short ({len(student_messages)} messages)")
+            if not self._deve_analisar(aluno_id, historico):
                 return None  # Don't analyze yet
             
-            # Skip if total conversation content is too short (greeting only)
-            total_content = " ".join([msg['content'] for msg in student_messages])
-            if len(total_content.strip()) < 20:  # Less than 20 characters total
-                logger.info(f"Skipping analysis for {aluno_id}: content too minimal")
-                return None
-            
-            # Format conversation for analysis
-            conversa_texto = "\n".join([
-                f"{'Aluno' if msg['role'] == 'user' else 'Nino'}: {msg['content']}"
-                for msg in historico
-            ])
-            
-            # Create analysis prompt
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=f"Analise esta conversa:\n\n{conversa_texto}")
-            ]
+            # Build full or incremental prompt
+            messages, incremental = self._montar_mensagens(aluno_id, historico)
+            if messages is None:
+                logger.info(f"No new student messages for {aluno_id}, keeping previous analysis")
+                return self._estados[aluno_id]["analise"]
             
             # Get analysis from LLM
-            response = await self.llm.ainvoke(messages)
-            
-            # Clean response content (remove markdown if present)
-            content = response.content.strip()
-            if content.startswith("```json"):
-                content = content.replace("```json", "").replace("```", "").strip()
-            elif content.startswith("```"):
-                content = content.replace("```", "").strip()
-            
-            # Parse JSON response
-            analise_dict = json.loads(content)
-            
-            # Ensure location data is present
-            if "escola" not in analise_dict:
-                analise_dict["escola"] = "Vista Alegre Park, Haras e Hípica"
-            if "cidade" not in analise_dict:
-                analise_dict["cidade"] = "João Pessoa"
-            if "lat" not in analise_dict:
-                analise_dict["lat"] = -7.1195
-            if "lon" not in analise_dict:
-                analise_dict["lon"] = -34.845
-            
-            # Calculate score_desmotivacao if not provided
-            if "score_desmotivacao" not in analise_dict:
-                media_pilares = (
-                    analise_dict["engajamento_comportamental"] +
-                    analise_dict["engajamento_emocional"] +
-                    analise_dict["engajamento_cognitivo"]
-                ) / 3
-                analise_dict["score_desmotivacao"] = 1.0 - media_pilares
+            response = await self._invocar(messages)
+            analise_dict = self._completar_campos(self._parse_resposta(response.content))
             
             # Create Pydantic model
-            analise = AnaliseEngajamento(**analise_dict)
-            
-            # Save to alerts file
-            self._save_alert(aluno_id, analise)
+            analise = self._criar_analise(aluno_id, analise_dict)
             
-            logger.info(f"Analysis complete for {aluno_id}: risk={analise.score_desmotivacao:.2f}")
+            self._registrar_analise(aluno_id, historico, analise, incremental)
             return analise
             
         except Exception as e:
             logger.error(f"Error analyzing conversation for {aluno_id}: {e}")
             # Return default analysis on error
-            return AnaliseEngajamento(
-                engajamento_comportamental=0.5,
-                engajamento_emocional=0.5,
-                engajamento_cognitivo=0.5,
-                score_desmotivacao=0.5,
-                observacoes_chave=["Análise não disponível"],
-                escola="Vista Alegre Park, Haras e Hípica",
-                cidade="João Pessoa",
-                lat=-7.1195,
-                lon=-34.845
+            return self._criar_analise(aluno_id, {
+                "engajamento_comportamental": 0.5,
+                "engajamento_emocional": 0.5,
+                "engajamento_cognitivo": 0.5,
+                "score_desmotivacao": 0.5,
+                "observacoes_chave": ["Análise não disponível"]
+            })
+    
+    def forget(self, aluno_id: str):
+        """Drop a student's previous analysis and cursor (their next analysis is a full one)"""
+        self._estados.pop(aluno_id, None)
+    
+    @property
+    def llm(self):
+        """Groq client (imports langchain_groq on first use)"""
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            self._llm = ChatGroq(
+                model=self.model,
+                temperature=0.3,  # Lower temperature for more consistent analysis
+                groq_api_key=self._api_key
             )
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    def _formatar_conversa(self, historico: List[Dict[str, str]]) -> str:
+        """Format conversation turns as a transcript"""
+        return "\n".join([
+            f"{'Aluno' if msg['role'] == 'user' else 'Nino'}: {msg['content']}"
+            for msg in historico
+        ])
+    
+    def _deve_analisar(self, aluno_id: str, historico: List[Dict[str, str]]) -> bool:
+        """Check if the conversation has enough student content to analyze"""
+        # Skip analysis for very short conversations (less than 3 student messages)
+        student_messages = [msg for msg in historico if msg['role'] == 'user']
+        
+        if len(student_messages) < 3:
+            logger.info(f"Skipping analysis for {aluno_id}: conversation too short ({len(student_messages)} messages)")
+            return False
+        
+        # Skip if total conversation content is too short (greeting only)
+        total_content = " ".join([msg['content'] for msg in student_messages])
+        if len(total_content.strip()) < 20:  # Less than 20 characters total
+            logger.info(f"Skipping analysis for {aluno_id}: content too minimal")
+            return False
+        
+        return True
+    
+    def _montar_conteudo(self, aluno_id: str, historico: List[Dict[str, str]]) -> Tuple[Optional[str], bool]:
+        """
+        Build the text to analyze, incremental when a previous analysis exists
+        
+        Args:
+            aluno_id: Student phone number
+            historico: Conversation history
+            
+        Returns:
+            (texto, incremental) - texto is None when there is nothing new to analyze
+        """
+        estado = self._estados.get(aluno_id)
+        
+        use_incremental = (
+            self.incremental
+            and estado is not None
+            and estado["cursor"] <= len(historico)  # memory was not reset
+            and estado["incrementos"] < self.full_every
+        )
+        
+        if not use_incremental:
+            return f"Conversa completa:\n\n{self._formatar_conversa(historico)}", False
+        
+        novas = historico[estado["cursor"]:]
+        if not any(msg['role'] == 'user' for msg in novas):
+            return None, True
+        
+        anterior = estado["analise"]
+        scores_anteriores = json.dumps({
+            "engajamento_comportamental": anterior.engajamento_comportamental,
+            "engajamento_emocional": anterior.engajamento_emocional,
+            "engajamento_cognitivo": anterior.engajamento_cognitivo,
+            "score_desmotivacao": anterior.score_desmotivacao,
+            "observacoes_chave": anterior.observacoes_chave
+        }, ensure_ascii=False)
+        
+        return (
+            f"Análise anterior:\n{scores_anteriores}\n\n"
+            f"Mensagens novas:\n\n{self._formatar_conversa(novas)}"
+        ), True
+    
+    def _montar_mensagens(self, aluno_id: str, historico: List[Dict[str, str]]) -> Tuple[Optional[list], bool]:
+        """
+        Build the analysis prompt for a single student
+        
+        Returns:
+            (messages, incremental) - messages is None when there is nothing new to analyze
+        """
+        texto, incremental = self._montar_conteudo(aluno_id, historico)
+        if texto is None:
+            return None, incremental
+        
+        system_prompt = self.incremental_prompt if incremental else self.system_prompt
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"Analise esta conversa:\n\n{texto}")
+        ], incremental
+    
+    def _registrar_analise(self, aluno_id: str, historico: List[Dict[str, str]],
+                           analise: AnaliseEngajamento, incremental: bool):
+        """Save analysis and remember it with its cursor for the next incremental run"""
+        # Save to alerts file
+        self._save_alert(aluno_id, analise)
+        
+        estado = self._estados.get(aluno_id)
+        self._estados[aluno_id] = {
+            "analise": analise,
+            "cursor": len(historico),
+            "incrementos": estado["incrementos"] + 1 if incremental else 0
+        }
+        
+        mode = "incremental" if incremental else "full"
+        logger.info(f"Analysis complete for {aluno_id} ({mode}): risk={analise.score_desmotivacao:.2f}")
+    
+    async def analisar_lote(self, pendentes: Dict[str, List[Dict[str, str]]],
+                            max_tokens_lote: int = 6000) -> Dict[str, AnaliseEngajamento]:
+        """
+        Analyze several students with one LLM call per batch
+        
+        Pending transcripts are packed into batches up to ``max_tokens_lote``
+        estimated prompt tokens. Each result is validated on its own; students
+        missing from the response or with an invalid result are retried with
+        analisar_conversa.
+        
+        Args:
+            pendentes: aluno_id -> conversation history
+            max_tokens_lote: Approximate prompt token budget per batch (1 token ≈ 4 chars)
+            
+        Returns:
+            Dict aluno_id -> AnaliseEngajamento for every analyzed student
+        """
+        resultados: Dict[str, AnaliseEngajamento] = {}
+        
+        # Build one item per student with something new to analyze
+        itens = []
+        for aluno_id, historico in pendentes.items():
+            if not self._deve_analisar(aluno_id, historico):
+                continue
+            texto, incremental = self._montar_conteudo(aluno_id, historico)
+            if texto is None:
+                resultados[aluno_id] = self._estados[aluno_id]["analise"]
+                continue
+            itens.append((aluno_id, historico, texto, incremental))
+        
+        # Pack items into batches by estimated tokens
+        lotes, lote, tokens_lote = [], [], 0
+        for item in itens:
+            tokens_item = len(item[2]) // 4
+            if lote and tokens_lote + tokens_item > max_tokens_lote:
+                lotes.append(lote)
+                lote, tokens_lote = [], 0
+            lote.append(item)
+            tokens_lote += tokens_item
+        if lote:
+            lotes.append(lote)
+        
+        falhas = []
+        for lote in lotes:
+            if len(lote) == 1:
+                falhas.extend(lote)
+                continue
+            
+            try:
+                respostas = await self._analisar_lote_llm(lote)
+            except Exception as e:
+                logger.error(f"Error in batch analysis ({len(lote)} students): {e}")
+                respostas = {}
+            
+            for aluno_id, historico, texto, incremental in lote:
+                try:
+                    analise_dict = self._completar_campos(respostas[aluno_id])
+                    analise = self._criar_analise(aluno_id, analise_dict)
+                except Exception as e:
+                    logger.warning(f"Invalid batch result for {aluno_id}, retrying alone: {e}")
+                    falhas.append((aluno_id, historico, texto, incremental))
+                    continue
+                
+                self._registrar_analise(aluno_id, historico, analise, incremental)
+                resultados[aluno_id] = analise
+        
+        # Retry failed items (and single-item batches) individually
+        for aluno_id, historico, texto, incremental in falhas:
+            analise = await self.analisar_conversa(aluno_id, historico)
+            if analise:
+                resultados[aluno_id] = analise
+        
+        logger.info(f"Batch analysis complete: {len(resultados)} students, {len(lotes)} batches, {len(falhas)} retried")
+        return resultados
+    
+    async def _analisar_lote_llm(self, lote: list) -> Dict[str, dict]:
+        """Send one batch to the LLM and return raw results keyed by aluno_id"""
+        blocos = []
+        for aluno_id, historico, texto, incremental in lote:
+            modo = "INCREMENTAL" if incremental else "COMPLETA"
+            blocos.append(f"### aluno_id: {aluno_id} (análise {modo})\n{texto}")
+        
+        messages = [
+            SystemMessage(content=self.batch_prompt),
+            HumanMessage(content="Analise estas conversas:\n\n" + "\n\n".join(blocos))
+        ]
+        response = await self._invocar(messages)
+        
+        analises = self._parse_resposta(response.content)
+        if isinstance(analises, dict):
+            analises = analises.get("analises", [])
+        
+        return {
+            str(item["aluno_id"]): item
+            for item in analises
+            if isinstance(item, dict) and "aluno_id" in item
+        }
+    
+    async def _invocar(self, messages):
+        """Call the LLM and record its latency/tokens"""
+        inicio = time.perf_counter()
+        response = await self.llm.ainvoke(messages)
+        if self.cost_monitor:
+            self.cost_monitor.record_call(
+                "AgenteAnalista", "groq", self.model, time.perf_counter() - inicio, None, *token_usage(response)
+            )
+        return response
+    
+    def _parse_resposta(self, content: str) -> dict:
+        """Parse LLM JSON response, removing markdown fences if present"""
+        content = content.strip()
+        if content.startswith("```json"):
+            content = content.replace("```json", "").replace("```", "").strip()
+        elif content.startswith("```"):
+            content = content.replace("```", "").strip()
+        return json.loads(content)
+    
+    def _completar_campos(self, analise_dict: dict) -> dict:
+        """Fill the derived score if missing from the LLM output"""
+        # Calculate score_desmotivacao if not provided
+        if "score_desmotivacao" not in analise_dict:
+            media_pilares = (
+                analise_dict["engajamento_comportamental"] +
+                analise_dict["engajamento_emocional"] +
+                analise_dict["engajamento_cognitivo"]
+            ) / 3
+            analise_dict["score_desmotivacao"] = 1.0 - media_pilares
+        
+        return analise_dict
+    
+    def _criar_analise(self, aluno_id: str, analise_dict: dict) -> AnaliseEngajamento:
+        """Validate LLM scores and join the student's school from the registry"""
+        campos = {k: v for k, v in analise_dict.items() if k not in ("aluno_id", "escola", "cidade", "lat", "lon")}
+        localizacao = self.registry.resolve(aluno_id, self.instance)
+        return AnaliseEngajamento(**campos, **localizacao.model_dump())
     
     def _save_alert(self, aluno_id: str, analise: AnaliseEngajamento):
-        """Save analysis to alerts.json file"""
+        """Append analysis to the engagement store"""
         try:
-            alerts_file = "alertas.json"
-            
-            # Load existing alerts
-            if os.path.exists(alerts_file):
-                with open(alerts_file, "r", encoding="utf-8") as f:
-                    alerts = json.load(f)
-            else:
-                alerts = []
+            if self.store is None:
+                self.store = EngagementStore()
             
-            # Add new alert
             alert = {
                 "aluno_id": aluno_id,
                 "timestamp": datetime.now().isoformat(),
@@ -209,12 +442,7 @@ Responda APENAS com o objeto JSON válido, sem markdown ou explicações."""
                 "lon": analise.lon
             }
             
-            alerts.append(alert)
-            
-            # Save back to file
-            with open(alerts_file, "w", encoding="utf-8") as f:
-                json.dump(alerts, f, ensure_ascii=False, indent=2)
-            
+            self.store.add(alert)
             logger.info(f"Alert saved for {aluno_id}")
             
         except Exception as e:
@@ -0,0 +1,257 @@
+"""
+Analytics Scheduler - Runs engagement analysis in the background, off the reply path
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _StudentState:
+    """Per-student scheduling state"""
+
+    __slots__ = ("historico", "new_messages", "last_run", "last_message", "pending")
+
+    def __init__(self):
+        self.historico: List[Dict[str, str]] = []
+        self.new_messages = 0
+        self.last_run = float("-inf")
+        self.last_message = float("-inf")
+        self.pending = False
+
+
+class AnalyticsScheduler:
+    """Debounced per-student scheduler for AgenteAnalista
+
+    Each student is analyzed at most once per ``min_interval`` seconds, unless
+    ``every_n_messages`` new user messages arrive first. Pending jobs are
+    collapsed per student (only the latest history is kept) and the worker
+    yields to live replies: it never starts an analysis while a reply is
+    being generated.
+
+    A student with nothing pending who has not written for ``idle_intervals``
+    times the interval is dropped on the next sweep (with their history, and
+    AgenteAnalista forgets their previous analysis), so the state only covers
+    recently active students; a returning student starts fresh and is due
+    right away.
+    """
+
+    def __init__(self, analytics_agent, min_interval: float = 600.0,
+                 every_n_messages: int = 10, tick: float = 5.0, batch_size: int = 1,
+                 prescorer=None, budget=None, idle_intervals: float = 3.0):
+        """
+        Initialize analytics scheduler
+
+        Args:
+            analytics_agent: AgenteAnalista instance
+            min_interval: Minimum seconds between two analyses of the same student
+            every_n_messages: Analyze earlier once this many new user messages arrive
+            tick: Seconds between sweeps for students whose interval has elapsed
+            batch_size: Max students per AgenteAnalista.analisar_lote call (1 disables batching)
+            prescorer: Optional EngagementPreScorer; only high-risk or uncertain students reach the LLM
+            budget: Optional BudgetController; its plan stretches both thresholds when over budget
+            idle_intervals: Drop a student's state after this many intervals without messages
+        """
+        self.analytics_agent = analytics_agent
+        self.min_interval = min_interval
+        self.every_n_messages = every_n_messages
+        self.tick = tick
+        self.batch_size = max(1, batch_size)
+        self.prescorer = prescorer
+        self.budget = budget
+        self.idle_intervals = idle_intervals
+
+        self._students: Dict[str, _StudentState] = {}
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._active_replies = 0
+        self._worker: Optional[asyncio.Task] = None
+
+        self.stats = {"messages": 0, "analyses": 0, "collapsed": 0, "skipped_local": 0, "evicted": 0}
+        logger.info(
+            f"AnalyticsScheduler initialized (interval={min_interval}s, every={every_n_messages} msgs)"
+        )
+
+    def record_message(self, aluno_id: str, historico: List[Dict[str, str]]) -> None:
+        """
+        Record a new user message for a student (never blocks)
+
+        Args:
+            aluno_id: Student phone number
+            historico: Full conversation history after the reply
+        """
+        state = self._students.get(aluno_id)
+        if state is None:
+            state = self._students[aluno_id] = _StudentState()
+
+        if state.pending:
+            self.stats["collapsed"] += 1
+        state.historico = historico
+        state.new_messages += 1
+        state.pending = True
+        state.last_message = now = time.monotonic()
+        self.stats["messages"] += 1
+
+        if self._is_due(state, now, self._factor()):
+            self._wakeup.set()
+
+    @asynccontextmanager
+    async def live_reply(self):
+        """Mark a live reply in progress; analytics waits until none are running"""
+        self._active_replies += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active_replies -= 1
+            if self._active_replies == 0:
+                self._idle.set()
+
+    def _is_due(self, state: _StudentState, now: float, factor: float = 1.0) -> bool:
+        """Check if a pending student should be analyzed now"""
+        if not state.pending:
+            return False
+        if state.new_messages >= self.every_n_messages * factor:
+            return True
+        return now - state.last_run >= self.min_interval * factor
+    
+    def _factor(self) -> float:
+        """Interval multiplier from the budget plan (1.0 without budget)"""
+        return self.budget.plan().analytics_factor if self.budget else 1.0
+
+    def _evict_idle(self) -> int:
+        """Drop students with nothing pending and no message for ``idle_intervals`` intervals"""
+        cutoff = time.monotonic() - self.min_interval * self._factor() * self.idle_intervals
+        idle = [aluno_id for aluno_id, state in self._students.items()
+                if not state.pending and state.last_message < cutoff]
+        for aluno_id in idle:
+            del self._students[aluno_id]
+            self.analytics_agent.forget(aluno_id)  # its cursor would be stale when they return
+        self.stats["evicted"] += len(idle)
+        return len(idle)
+
+    def _due_students(self) -> List[str]:
+        """Get students that are due, oldest analysis first"""
+        now = time.monotonic()
+        factor = self._factor()
+        due = [aluno_id for aluno_id, state in self._students.items() if self._is_due(state, now, factor)]
+        due.sort(key=lambda aluno_id: self._students[aluno_id].last_run)
+        return due
+
+    async def start(self):
+        """Start the background worker"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            logger.info("AnalyticsScheduler worker started")
+
+    async def stop(self):
+        """Stop the background worker"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            logger.info("AnalyticsScheduler worker stopped")
+
+    async def _run(self):
+        """Worker loop: wait for due students and analyze them one at a time"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            self._evict_idle()
+            due = self._due_students()
+            if self.prescorer and due:
+                due = self._prescreen(due)
+            for start in range(0, len(due), self.batch_size):
+                chunk = due[start:start + self.batch_size]
+                await self._idle.wait()
+                if len(chunk) > 1:
+                    await self._analyze_batch(chunk)
+                else:
+                    await self._analyze(chunk[0])
+
+    def _prescreen(self, alunos: List[str]) -> List[str]:
+        """Score due students locally and keep only those that need the LLM"""
+        try:
+            scores = self.prescorer.score([self._students[aluno_id].historico for aluno_id in alunos])
+        except Exception as e:
+            logger.error(f"Error in local pre-scoring, escalating all: {e}")
+            return alunos
+
+        now = time.monotonic()
+        escalated = []
+        for aluno_id, escalate, risk in zip(alunos, scores["escalate"], scores["score_desmotivacao"]):
+            if escalate:
+                escalated.append(aluno_id)
+                continue
+            state = self._students[aluno_id]
+            state.pending = False
+            state.new_messages = 0
+            state.last_run = now
+            self.stats["skipped_local"] += 1
+            logger.info(f"Engagement analysis not needed for {aluno_id}: local risk={risk:.2f}")
+        return escalated
+
+    async def _analyze(self, aluno_id: str):
+        """Run one analysis for a student"""
+        state = self._students[aluno_id]
+        historico = state.historico
+        previous_run = state.last_run
+        state.pending = False
+        state.new_messages = 0
+        state.last_run = time.monotonic()
+
+        try:
+            logger.info(f"Running engagement analysis for {aluno_id}")
+            self.stats["analyses"] += 1
+            result = await self.analytics_agent.analisar_conversa(aluno_id, historico)
+            if result:
+                logger.info(f"Engagement analysis complete for {aluno_id}: risk={result.score_desmotivacao:.2f}")
+            else:
+                # Too short to analyze: don't spend the interval on it
+                state.last_run = previous_run
+                logger.info(f"Engagement analysis skipped for {aluno_id}: conversation too short")
+        except Exception as e:
+            logger.error(f"Error in analytics for {aluno_id}: {e}")
+
+    async def _analyze_batch(self, alunos: List[str]):
+        """Run one batched analysis for several students"""
+        pendentes = {}
+        previous_runs = {}
+        now = time.monotonic()
+        for aluno_id in alunos:
+            state = self._students[aluno_id]
+            pendentes[aluno_id] = state.historico
+            previous_runs[aluno_id] = state.last_run
+            state.pending = False
+            state.new_messages = 0
+            state.last_run = now
+
+        try:
+            logger.info(f"Running batched engagement analysis for {len(alunos)} students")
+            self.stats["analyses"] += len(alunos)
+            resultados = await self.analytics_agent.analisar_lote(pendentes)
+            for aluno_id in alunos:
+                if aluno_id not in resultados:
+                    # Too short to analyze: don't spend the interval on it
+                    self._students[aluno_id].last_run = previous_runs[aluno_id]
+        except Exception as e:
+            logger.error(f"Error in batched analytics: {e}")
+
+    def get_stats(self) -> dict:
+        """Get scheduler statistics"""
+        return {
+            **self.stats,
+            "pending": sum(1 for state in self._students.values() if state.pending),
+            "students": len(self._students),
+        }
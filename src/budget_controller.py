@@ -0,0 +1,287 @@
+"""
+Budget Controller - Spend forecasting, progressive downgrade and calendar quotas
+"""
+import asyncio
+import calendar
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetPlan:
+    """What the agents may spend right now"""
+
+    __slots__ = ("level", "name", "model", "max_tokens", "analytics_factor")
+
+    def __init__(self, level: int, name: str, model: Optional[str], max_tokens: Optional[int],
+                 analytics_factor: float):
+        self.level = level
+        self.name = name
+        self.model = model  # None = configured model
+        self.max_tokens = max_tokens  # None = configured max_tokens
+        self.analytics_factor = analytics_factor  # multiplies the analytics intervals
+
+
+class BudgetController:
+    """Forecasts spend from CostMonitor counters and degrades service before the budget runs out
+
+    The total cost is sampled periodically; the rolling spend rate over
+    ``rate_window`` seconds (today's average until there are enough samples)
+    projects today's and this month's spend to the end of the period. The
+    forecast-to-budget ratio picks a level from ``LEVELS``: shorter replies
+    first, then the cheaper model, with analytics running less often at every
+    step. A level is only left once the ratio is ``RECOVERY_MARGIN`` below
+    its threshold, since the downgrade itself lowers the spend rate. The
+    cheap model must be priced for the provider in ``CostMonitor.COSTS``
+    (otherwise it is not used). Quotas count requests per student and per school in calendar
+    windows (day or month) and live in the CostMonitor usage store, so they
+    are persisted with it.
+    """
+
+    # (name, forecast/budget ratio, use cheap model, max_tokens, analytics interval factor)
+    LEVELS = [
+        ("normal", 0.0, False, None, 1.0),
+        ("economy", 0.8, False, 300, 2.0),
+        ("reduced", 1.0, True, 200, 4.0),
+        ("minimum", 1.2, True, 120, 8.0),
+    ]
+
+    RECOVERY_MARGIN = 0.1
+
+    WINDOWS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+    def __init__(self, cost_monitor, daily_budget: float = 0.0, monthly_budget: float = 0.0,
+                 cheap_model: Optional[str] = None, quotas_file: str = "config/budget_quotas.json",
+                 registry=None, instance: Optional[str] = None, rate_window: float = 3600.0,
+                 sample_interval: float = 60.0, provider: Optional[str] = None):
+        """
+        Initialize budget controller
+
+        Args:
+            cost_monitor: Shared CostMonitor
+            daily_budget: Daily budget in USD (0 disables)
+            monthly_budget: Monthly budget in USD (0 disables)
+            cheap_model: Model used from the "reduced" level on (None keeps the configured model)
+            quotas_file: JSON with per-student and per-school request quotas
+            registry: SchoolRegistry used to find a student's school (school quotas need it)
+            instance: Evolution API instance, used as registry fallback key
+            rate_window: Seconds of history for the rolling spend rate
+            sample_interval: Seconds between cost samples / level updates
+            provider: LLM provider the cheap model must belong to ('openai' or 'groq')
+        """
+        self.cost_monitor = cost_monitor
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+        self.cheap_model = cheap_model
+        if cheap_model and provider and cheap_model not in cost_monitor.COSTS.get(provider, {}):
+            logger.warning(f"Budget cheap model {cheap_model} is not a priced {provider} model, "
+                           f"over-budget levels keep the configured model")
+            self.cheap_model = None
+        self.registry = registry
+        self.instance = instance
+        self.rate_window = rate_window
+        self.sample_interval = sample_interval
+
+        self.quotas = self._load_quotas(quotas_file)
+        self._samples: deque = deque()
+        self._plan = self._make_plan(0)
+        self._evaluated_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        logger.info(
+            f"BudgetController initialized (daily=${daily_budget}, monthly=${monthly_budget}, "
+            f"quotas: {len(self.quotas['users'])} user, {len(self.quotas['schools'])} school)"
+        )
+
+    def _load_quotas(self, quotas_file: str) -> Dict[str, Dict[str, Tuple[int, str]]]:
+        """
+        Load quotas
+
+        Format: ``{"users": {"*": {"requests": 60, "window": "day"}, "<phone>": {...}},
+        "schools": {"*": {...}, "<escola>": {...}}}`` ("*" is the default)
+        """
+        quotas = {"users": {}, "schools": {}}
+        if not quotas_file or not os.path.exists(quotas_file):
+            return quotas
+
+        try:
+            with open(quotas_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for scope in quotas:
+                for key, spec in data.get(scope, {}).items():
+                    if spec.get("window") not in self.WINDOWS:
+                        raise ValueError(f"{scope}.{key}: window must be one of {list(self.WINDOWS)}")
+                    quotas[scope][key] = (int(spec["requests"]), spec["window"])
+        except Exception as e:
+            logger.error(f"Error loading budget quotas from {quotas_file}: {e}")
+            return {"users": {}, "schools": {}}
+        return quotas
+
+    def _make_plan(self, level: int) -> BudgetPlan:
+        name, _, cheap, max_tokens, factor = self.LEVELS[level]
+        return BudgetPlan(level, name, self.cheap_model if cheap else None, max_tokens, factor)
+
+    # ----- Spend forecast -----
+
+    def _spent(self, now: datetime) -> Tuple[float, float]:
+        """(today's cost, this month's cost) from the CostMonitor daily counters"""
+        spent_today = self.cost_monitor.get_daily_usage(now.strftime("%Y-%m-%d"))["cost"]
+        return spent_today, self.cost_monitor.get_month_cost(now.strftime("%Y-%m"))
+
+    def sample(self):
+        """Record the current total cost (called every sample_interval)"""
+        now = time.time()
+        self._samples.append((now, self.cost_monitor.stats["total_cost"]))
+        while len(self._samples) > 2 and self._samples[1][0] <= now - self.rate_window:
+            self._samples.popleft()
+
+    def spend_rate(self) -> float:
+        """Rolling spend rate in USD per second"""
+        now = datetime.now()
+        if len(self._samples) >= 2:
+            (t0, c0), (t1, c1) = self._samples[0], self._samples[-1]
+            if t1 - t0 >= self.sample_interval:
+                return max(c1 - c0, 0.0) / (t1 - t0)
+        # Not enough history: today's average so far
+        elapsed = (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()
+        return self._spent(now)[0] / max(elapsed, 1.0)
+
+    def forecast(self) -> Dict[str, float]:
+        """
+        Projected spend at the end of the day and of the month
+
+        Returns:
+            {"spent_today", "spent_month", "rate_per_hour", "end_of_day", "end_of_month"}
+        """
+        now = datetime.now()
+        spent_today, spent_month = self._spent(now)
+        rate = self.spend_rate()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        left_today = 86400 - (now - midnight).total_seconds()
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        left_month = left_today + 86400 * (days_in_month - now.day)
+        return {
+            "spent_today": spent_today,
+            "spent_month": spent_month,
+            "rate_per_hour": rate * 3600,
+            "end_of_day": spent_today + rate * left_today,
+            "end_of_month": spent_month + rate * left_month,
+        }
+
+    def evaluate(self) -> BudgetPlan:
+        """Sample, forecast and pick the level"""
+        self.sample()
+        self._evaluated_at = time.monotonic()
+        forecast = self.forecast()
+
+        ratio = 0.0
+        if self.daily_budget > 0:
+            ratio = max(ratio, forecast["end_of_day"] / self.daily_budget)
+        if self.monthly_budget > 0:
+            ratio = max(ratio, forecast["end_of_month"] / self.monthly_budget)
+        level = max(i for i, spec in enumerate(self.LEVELS) if ratio >= spec[1])
+        if level < self._plan.level and ratio >= self.LEVELS[self._plan.level][1] - self.RECOVERY_MARGIN:
+            level = self._plan.level
+
+        if level != self._plan.level:
+            log = logger.warning if level > self._plan.level else logger.info
+            log(
+                f"Budget level {self._plan.name} -> {self.LEVELS[level][0]} "
+                f"(forecast day ${forecast['end_of_day']:.2f}, month ${forecast['end_of_month']:.2f})"
+            )
+            self._plan = self._make_plan(level)
+        return self._plan
+
+    def plan(self) -> BudgetPlan:
+        """Current plan (re-evaluated at most every sample_interval)"""
+        if time.monotonic() - self._evaluated_at >= self.sample_interval:
+            return self.evaluate()
+        return self._plan
+
+    # ----- Quotas -----
+
+    def _school(self, user_id: str) -> Optional[str]:
+        if self.registry is None:
+            return None
+        return self.registry.resolve(user_id, self.instance).escola
+
+    def _quota_checks(self, user_id: str):
+        """(counter key, limit, window) for each quota that applies to the student"""
+        users, schools = self.quotas["users"], self.quotas["schools"]
+        quota = users.get(user_id) or users.get("*")
+        if quota:
+            yield f"user:{user_id}", quota[0], quota[1]
+        if schools:
+            school = self._school(user_id)
+            quota = schools.get(school) or schools.get("*")
+            if quota and school:
+                yield f"school:{school}", quota[0], quota[1]
+
+    def _count(self, key: str, window: str, now: datetime) -> int:
+        """Requests of a quota key in the current calendar window"""
+        current = self.cost_monitor.usage.quota(key)
+        if current and current[0] == now.strftime(self.WINDOWS[window]):
+            return current[1]
+        return 0
+
+    def check_quota(self, user_id: str) -> Tuple[bool, str]:
+        """
+        Check the student's and the school's quotas
+
+        Args:
+            user_id: Student phone number
+
+        Returns:
+            (within_quota, message)
+        """
+        now = datetime.now()
+        for key, limit, window in self._quota_checks(user_id):
+            if self._count(key, window, now) >= limit:
+                periodo = "hoje" if window == "day" else "este mês"
+                if key.startswith("user:"):
+                    return False, f"Você já usou suas {limit} mensagens de {periodo} 😅 Volta depois que a gente continua!"
+                return False, f"Sua escola atingiu o limite de mensagens de {periodo}. Fala com o professor, tá?"
+        return True, ""
+
+    def record_request(self, user_id: str):
+        """Count one answered request against the student's and the school's quotas"""
+        now = datetime.now()
+        for key, _, window in self._quota_checks(user_id):
+            self.cost_monitor.usage.set_quota(key, now.strftime(self.WINDOWS[window]), self._count(key, window, now) + 1)
+
+    # ----- Background -----
+
+    async def start(self):
+        """Start periodic sampling"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("BudgetController started")
+
+    async def stop(self):
+        """Stop periodic sampling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Sample spend and update the level"""
+        while True:
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.error(f"Error evaluating budget: {e}")
+            await asyncio.sleep(self.sample_interval)
+
+    def get_status(self) -> dict:
+        """Current level and forecast"""
+        return {"level": self._plan.name, **self.forecast(),
+                "daily_budget": self.daily_budget, "monthly_budget": self.monthly_budget}
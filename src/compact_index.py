@@ -0,0 +1,321 @@
+"""
+Compact Index - Compressed FAISS variants and a non-pickle, memory-mapped version format
+"""
+import json
+import logging
+import math
+import mmap
+import os
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "f16", "pq", "ivfpq")
+INDEX_FILE = "index.faiss"
+HEADER_FILE = "docstore.json"
+TEXT_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+METADATA_FILE = "chunks.meta.npy"
+FORMAT = 1
+PQ_MIN_VECTORS = 256  # 8-bit codebooks: 256 centroids per sub-quantizer
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """Default PQ code size: one byte per 4 dimensions (96 bytes for MiniLM's 384)"""
+    for dims in (4, 2, 1):
+        if dimension % dims == 0:
+            return dimension // dims
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: str = "flat", pq_m: Optional[int] = None,
+                      nlist: Optional[int] = None, nprobe: int = 16):
+    """
+    Train (if needed) and fill a FAISS index of the requested type
+
+    Args:
+        vectors: float32 matrix, one row per chunk
+        index_type: "flat" (exact, 4 bytes/dim), "f16" (half floats, 2 bytes/dim),
+            "pq" (product quantization) or "ivfpq" (inverted lists + PQ, searches ``nprobe`` lists)
+        pq_m: PQ bytes per vector (default: dimension / 4)
+        nlist: IVF lists (default: 4 * sqrt(n), at least 39 training vectors per list)
+        nprobe: Lists searched per query (stored in the index)
+
+    Returns:
+        FAISS index (pq/ivfpq fall back to f16 below PQ_MIN_VECTORS chunks)
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimension = vectors.shape
+    if index_type in ("pq", "ivfpq") and n < PQ_MIN_VECTORS:
+        logger.warning(f"{n} chunks are too few to train {index_type} (needs {PQ_MIN_VECTORS}), using f16")
+        index_type = "f16"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "f16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+    elif index_type == "pq":
+        index = faiss.IndexPQ(dimension, pq_m or pq_subquantizers(dimension), 8)
+    else:
+        nlist = nlist or max(1, min(int(4 * math.sqrt(n)), n // 39))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist,
+                                 pq_m or pq_subquantizers(dimension), 8)
+        index.nprobe = min(nprobe, nlist)
+
+    if not index.is_trained:
+        # Codebooks over 4-dim sub-vectors converge in a few iterations; ~10,000 training
+        # vectors (FAISS's 39 per centroid) are enough, more only slows the build down
+        index.pq.cp.niter = 10
+        index.pq.cp.max_points_per_centroid = 39
+        if n < 39 * 256:
+            # FAISS would print one warning per sub-quantizer; say it once
+            logger.info(f"Training {index_type} on {n} chunks; PQ codebooks are more accurate from ~10,000 chunks")
+            index.pq.cp.min_points_per_centroid = 1
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def index_type_of(index) -> str:
+    """Name of a FAISS index's variant ("flat", "f16", "pq", "ivfpq")"""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer) and index.sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+        return "f16"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def copy_index(index):
+    """Writable in-memory copy (also of a memory-mapped, read-only index)"""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+class ChunkIds(MutableMapping):
+    """``index_to_docstore_id`` of a compact version: position i -> "i", without a dict per chunk
+
+    Chunks added after loading (``RAGService.add_texts``) are kept in a
+    small dict on top.
+    """
+
+    def __init__(self, count: int, extra: Optional[Dict[int, str]] = None):
+        self.count = count
+        self._extra = dict(extra or {})
+
+    def __getitem__(self, position) -> str:
+        position = int(position)
+        if 0 <= position < self.count:
+            return str(position)
+        return self._extra[position]
+
+    def __setitem__(self, position, docstore_id: str):
+        position = int(position)
+        if 0 <= position < self.count:
+            raise ValueError(f"Chunk {position} of a published version is read-only")
+        self._extra[position] = docstore_id
+
+    def __delitem__(self, position):
+        del self._extra[int(position)]
+
+    def __iter__(self) -> Iterator[int]:
+        yield from range(self.count)
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return self.count + len(self._extra)
+
+    def copy(self) -> "ChunkIds":
+        return ChunkIds(self.count, self._extra)
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """Chunk texts of a version in one UTF-8 file, found through an offsets array
+
+    Chunk i is ``chunks.bin[offsets[i]:offsets[i + 1]]`` with metadata
+    ``metadatas[meta[i]]`` (each distinct metadata dict, e.g. one per source
+    file, is stored once in ``docstore.json``). The text file and both arrays
+    are memory-mapped, so loading reads no chunk text and workers on the
+    same host share the pages. Nothing is unpickled. Documents added after
+    loading live in an in-memory dict on top.
+    """
+
+    def __init__(self, text, offsets: np.ndarray, meta: np.ndarray, metadatas: List[Dict],
+                 extra: Optional[Dict[str, Document]] = None):
+        self._text = text
+        self._offsets = offsets
+        self._meta = meta
+        self._metadatas = metadatas
+        self._extra = dict(extra or {})
+        self.count = len(offsets) - 1
+
+    @classmethod
+    def open(cls, path: str, metadatas: List[Dict], use_mmap: bool = True) -> "CompactDocstore":
+        """Open the chunk files of a version directory"""
+        mode = "r" if use_mmap else None
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode=mode)
+        meta = np.load(os.path.join(path, METADATA_FILE), mmap_mode=mode)
+        with open(os.path.join(path, TEXT_FILE), "rb") as f:
+            if not use_mmap:
+                text = f.read()
+            elif os.fstat(f.fileno()).st_size == 0:
+                text = b""  # an empty file cannot be mapped
+            else:
+                text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(text, offsets, meta, metadatas)
+
+    def search(self, search: str):
+        """Document with this id, or an error string (LangChain's Docstore contract)"""
+        doc = self._extra.get(search)
+        if doc is not None:
+            return doc
+        try:
+            position = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= position < self.count:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return Document(
+            id=search,
+            page_content=self._text[start:end].decode("utf-8"),
+            metadata=dict(self._metadatas[int(self._meta[position])])
+        )
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._extra)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._extra.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for docstore_id in ids:
+            if docstore_id not in self._extra:
+                raise ValueError(f"Chunk {docstore_id} is not an added document (published chunks are read-only)")
+        for docstore_id in ids:
+            del self._extra[docstore_id]
+
+    def metadatas(self) -> Iterator[Dict]:
+        """Every distinct stored metadata dict plus the metadata of added documents"""
+        yield from self._metadatas
+        for doc in self._extra.values():
+            yield doc.metadata
+
+    def copy(self) -> "CompactDocstore":
+        """Same published chunks (shared, not copied) with a copy of the added ones"""
+        return CompactDocstore(self._text, self._offsets, self._meta, self._metadatas, self._extra)
+
+    def __len__(self) -> int:
+        return self.count + len(self._extra)
+
+
+def is_compact(path: str) -> bool:
+    """True if the version directory uses this format (False for LangChain's index.pkl)"""
+    return os.path.exists(os.path.join(path, HEADER_FILE))
+
+
+def read_header(path: str) -> Optional[Dict]:
+    """docstore.json of a compact version, None for any other layout"""
+    try:
+        with open(os.path.join(path, HEADER_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_version(path: str, index, texts: List[str], metadatas: List[Dict], normalize_L2: bool = False,
+                  distance_strategy: str = DistanceStrategy.EUCLIDEAN_DISTANCE.value,
+                  requested_type: Optional[str] = None):
+    """
+    Write an index and its chunks (chunk i = vector i) into an empty version directory
+
+    Args:
+        path: Directory to fill (an IndexStore staging directory)
+        index: FAISS index
+        texts: Chunk texts in index order
+        metadatas: One metadata dict per chunk
+        normalize_L2: Passed back to LangChain's FAISS on load
+        distance_strategy: Passed back to LangChain's FAISS on load
+        requested_type: Index type asked for at build time, if it fell back to another one
+    """
+    if len(texts) != index.ntotal or len(metadatas) != index.ntotal:
+        raise ValueError(f"{index.ntotal} vectors but {len(texts)} texts and {len(metadatas)} metadatas")
+    distinct: Dict[str, int] = {}
+    meta = np.empty(len(texts), dtype=np.uint32)
+    for i, metadata in enumerate(metadatas):
+        meta[i] = distinct.setdefault(json.dumps(metadata, sort_keys=True, ensure_ascii=False), len(distinct))
+
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+
+    faiss.write_index(index, os.path.join(path, INDEX_FILE))
+    with open(os.path.join(path, TEXT_FILE), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(path, OFFSETS_FILE), offsets)
+    np.save(os.path.join(path, METADATA_FILE), meta)
+    with open(os.path.join(path, HEADER_FILE), "w", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "format": FORMAT,
+            "count": len(texts),
+            "index_type": index_type_of(index),
+            "requested_type": requested_type or index_type_of(index),
+            "dimension": index.d,
+            "normalize_L2": normalize_L2,
+            "distance_strategy": DistanceStrategy(distance_strategy).value,
+            "metadatas": [json.loads(key) for key in distinct],
+        }, ensure_ascii=False))
+
+
+def save_vectorstore(vectorstore: FAISS, path: str):
+    """Write a LangChain FAISS store (any docstore) as a compact version"""
+    texts, metadatas = [], []
+    for position in range(vectorstore.index.ntotal):
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        texts.append(doc.page_content)
+        metadatas.append(doc.metadata)
+    write_version(path, vectorstore.index, texts, metadatas, normalize_L2=vectorstore._normalize_L2,
+                  distance_strategy=vectorstore.distance_strategy)
+
+
+def load_version(path: str, embeddings, use_mmap: bool = True) -> FAISS:
+    """
+    Open a compact version as a LangChain FAISS store
+
+    Args:
+        path: Version directory
+        embeddings: Embedding model used for queries
+        use_mmap: Memory-map the index and chunk files (read-only, shared between processes)
+
+    Returns:
+        FAISS store backed by a CompactDocstore
+    """
+    header = read_header(path)
+    if header is None:
+        raise FileNotFoundError(f"No {HEADER_FILE} in {path}")
+    if header["format"] != FORMAT:
+        raise ValueError(f"Unsupported index format {header['format']} in {path}")
+    # IVF-PQ's precomputed residual table is private memory (nlist x m x 256 floats per worker);
+    # without it a search is ~15% slower but everything the worker holds is shared
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_SKIP_PRECOMPUTE_TABLE if use_mmap else 0
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+    if index.ntotal != header["count"]:
+        raise ValueError(f"{INDEX_FILE} has {index.ntotal} vectors, {HEADER_FILE} lists {header['count']} chunks")
+    return FAISS(
+        embeddings,
+        index,
+        CompactDocstore.open(path, header["metadatas"], use_mmap=use_mmap),
+        ChunkIds(header["count"]),
+        normalize_L2=header["normalize_L2"],
+        distance_strategy=DistanceStrategy(header["distance_strategy"])
+    )
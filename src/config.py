@@ -21,6 +21,41 @@ class Config:
     SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
     MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "20"))
     
+    # Engagement analytics scheduling
+    ANALYTICS_MIN_INTERVAL = float(os.getenv("ANALYTICS_MIN_INTERVAL", "600"))  # seconds per student
+    ANALYTICS_EVERY_N_MESSAGES = int(os.getenv("ANALYTICS_EVERY_N_MESSAGES", "10"))
+    ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "8"))
+    ANALYTICS_PRESCORER = os.getenv("ANALYTICS_PRESCORER", "true").lower() == "true"
+    SCHOOL_REGISTRY_FILE = os.getenv("SCHOOL_REGISTRY_FILE", "config/escolas.csv")
+    ENGAGEMENT_DB_FILE = os.getenv("ENGAGEMENT_DB_FILE", "engajamento.db")
+    SEMANTIC_CRISIS_DETECTION = os.getenv("SEMANTIC_CRISIS_DETECTION", "false").lower() == "true"  # thresholds uncalibrated
+    CRISIS_EXEMPLARS_FILE = os.getenv("CRISIS_EXEMPLARS_FILE", "config/crisis_exemplars.json")
+    PATTERNS_DIR = os.getenv("PATTERNS_DIR", "config/patterns")
+    PATTERNS_POLL_INTERVAL = float(os.getenv("PATTERNS_POLL_INTERVAL", "5"))  # seconds
+    RAG_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "2048"))  # query embeddings
+    RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "1024"))  # search results
+    RAG_POLL_INTERVAL = float(os.getenv("RAG_POLL_INTERVAL", "5"))  # seconds between CURRENT checks
+    RAG_INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "true").lower() == "true"  # share index pages between workers
+    COST_STATS_FILE = os.getenv("COST_STATS_FILE", "api_stats.json")
+    COST_FLUSH_EVERY = int(os.getenv("COST_FLUSH_EVERY", "50"))  # updates
+    COST_FLUSH_INTERVAL = float(os.getenv("COST_FLUSH_INTERVAL", "30"))  # seconds
+    COST_USAGE_DB = os.getenv("COST_USAGE_DB", "api_stats.db")  # per-user/per-day counters
+    COST_KEEP_DAYS = int(os.getenv("COST_KEEP_DAYS", "90"))  # older days roll up into months
+    
+    # Spend budget (USD, 0 = no limit) and request quotas
+    BUDGET_DAILY = float(os.getenv("BUDGET_DAILY", "0"))
+    BUDGET_MONTHLY = float(os.getenv("BUDGET_MONTHLY", "0"))
+    BUDGET_CHEAP_MODEL = os.getenv("BUDGET_CHEAP_MODEL") or None  # e.g. gpt-3.5-turbo (same provider)
+    BUDGET_QUOTAS_FILE = os.getenv("BUDGET_QUOTAS_FILE", "config/budget_quotas.json")
+    
+    # Staff notification of critical alerts
+    ALERT_WHATSAPP_NUMBERS = [n.strip() for n in os.getenv("ALERT_WHATSAPP_NUMBERS", "").split(",") if n.strip()]
+    ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+    ALERT_NOTIFICATIONS_FILE = os.getenv("ALERT_NOTIFICATIONS_FILE", "critical_alerts/notifications.jsonl")
+    ALERT_MIN_SEVERITY = os.getenv("ALERT_MIN_SEVERITY", "HIGH")  # for WhatsApp and webhook
+    ALERT_AGGREGATION_WINDOW = float(os.getenv("ALERT_AGGREGATION_WINDOW", "300"))  # seconds per student
+    ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+    
     @classmethod
     def validate(cls):
         """Validate that all required environment variables are set"""
@@ -1,17 +1,50 @@
 """
 Cost monitoring and API usage tracking
 """
+import asyncio
 import logging
 import json
 import os
-from datetime import datetime
-from typing import Dict, Tuple
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from src.histograms import HistogramSet
+from src.usage_store import UsageStore
 
 logger = logging.getLogger(__name__)
 
 
+def token_usage(message) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Prompt/completion tokens reported by the provider on an LLM response
+
+    Args:
+        message: AIMessage or merged AIMessageChunk
+
+    Returns:
+        (prompt_tokens, completion_tokens), None where not reported
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
 class CostMonitor:
-    """Monitor API usage and costs"""
+    """Monitor API usage and costs
+
+    Counters live in memory and are written behind, every ``flush_every``
+    updates or every ``flush_interval`` seconds. ``api_stats.json`` only holds
+    the small aggregates (totals, per provider, histograms) and is replaced
+    with an atomic rename; per-user, per-day and per-month counters live in a
+    UsageStore and only the rows that changed are written. Once ``start()`` is
+    called the writes happen in a worker thread. Reads never touch disk.
+
+    Per (provider, model, agent) it also keeps daily fixed-bucket histograms of
+    time to first token, total latency and prompt/completion tokens, so
+    p50/p95/p99 come from bucket counts instead of raw events.
+    """
     
     # Approximate costs (update based on actual pricing)
     COSTS = {
@@ -25,15 +58,41 @@ class CostMonitor:
         }
     }
     
-    def __init__(self, stats_file: str = "api_stats.json"):
+    PERCENTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self, stats_file: str = "api_stats.json", flush_every: int = 50,
+                 flush_interval: float = 30.0, histogram_days: int = 30,
+                 usage_db: Optional[str] = None, keep_days: int = 90):
         """
         Initialize cost monitor
         
         Args:
             stats_file: File to store statistics
+            flush_every: Write the file after this many unsaved updates
+            flush_interval: Seconds between background flushes
+            histogram_days: Days of latency/token histograms to keep
+            usage_db: SQLite file for per-user/per-day counters (default: stats_file with .db)
+            keep_days: Days kept as daily counters before rolling into monthly ones
         """
         self.stats_file = stats_file
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
         self.stats = self._load_stats()
+        self.histograms = HistogramSet.from_dict(self.stats.pop("histograms", {}), histogram_days)
+        self.usage = UsageStore(usage_db or f"{os.path.splitext(stats_file)[0]}.db", keep_days)
+        
+        # Stats files written before the UsageStore kept every user and day in the JSON
+        by_user, daily = self.stats.pop("by_user", None), self.stats.pop("daily", None)
+        if by_user or daily:
+            self.usage.import_stats(by_user or {}, daily or {})
+            self._write(self._snapshot())
+        
+        self._dirty = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # One write at a time (also for direct flush() calls): an older usage snapshot
+        # must never land after a newer one
+        self._flush_lock = asyncio.Lock()
         logger.info("CostMonitor initialized")
     
     def _load_stats(self) -> Dict:
@@ -49,19 +108,92 @@ class CostMonitor:
             "total_requests": 0,
             "total_tokens": 0,
             "total_cost": 0.0,
-            "by_provider": {},
-            "by_user": {},
-            "daily": {}
+            "by_provider": {}
         }
     
+    def _snapshot(self) -> Tuple[str, Dict]:
+        """Serialize the aggregates and collect changed usage rows (in the caller's thread)"""
+        self._dirty = 0
+        data = json.dumps({**self.stats, "histograms": self.histograms.to_dict()}, separators=(",", ":"))
+        return data, self.usage.changes()
+    
+    def _write(self, snapshot: Tuple[str, Dict]):
+        """Upsert changed usage rows and replace the stats file with an atomic rename"""
+        data, changes = snapshot
+        try:
+            self.usage.write(changes)
+        except Exception:
+            self.usage.restore(changes)
+            raise
+        fd, tmp_file = tempfile.mkstemp(prefix=f".{os.path.basename(self.stats_file)}.",
+                                        dir=os.path.dirname(os.path.abspath(self.stats_file)))
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_file, self.stats_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+    
     def _save_stats(self):
-        """Save statistics to file"""
+        """Save statistics to file now (blocking)"""
         try:
-            with open(self.stats_file, "w") as f:
-                json.dump(self.stats, f, indent=2)
+            self._write(self._snapshot())
         except Exception as e:
             logger.error(f"Error saving stats: {e}")
     
+    async def flush(self):
+        """Save statistics from a worker thread if anything changed (one flush at a time)"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, data = self._dirty, self._snapshot()
+            try:
+                await asyncio.to_thread(self._write, data)
+            except Exception as e:
+                logger.error(f"Error saving stats: {e}")
+                self._dirty += dirty
+    
+    async def start(self):
+        """Start periodic background flushes"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+            logger.info("CostMonitor background flush started")
+    
+    async def stop(self):
+        """Stop background flushes and save what is left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+    
+    async def _run(self):
+        """Flush periodically"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Start a background flush unless one is running (timer and flush_every share the task)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+    
+    def _updated(self):
+        """Count one unsaved update; write once ``flush_every`` are pending"""
+        self._dirty += 1
+        if self._dirty >= self.flush_every:
+            if self._flusher is None:
+                self._save_stats()
+            else:
+                self._schedule_flush()
+    
     def log_request(self, provider: str, model: str, tokens: int, user_id: str):
         """
         Log an API request
@@ -91,33 +223,79 @@ class CostMonitor:
         self.stats["by_provider"][provider]["tokens"] += tokens
         self.stats["by_provider"][provider]["cost"] += cost
         
-        # Update by user
-        if user_id not in self.stats["by_user"]:
-            self.stats["by_user"][user_id] = {
-                "requests": 0,
-                "tokens": 0,
-                "cost": 0.0
-            }
-        self.stats["by_user"][user_id]["requests"] += 1
-        self.stats["by_user"][user_id]["tokens"] += tokens
-        self.stats["by_user"][user_id]["cost"] += cost
+        # Update by user and daily stats
+        self.usage.add(user_id, tokens, cost)
         
-        # Update daily stats
+        # Save stats (write-behind)
+        self._updated()
+        
+        logger.info(f"API call logged: {provider}/{model} - {tokens} tokens - ${cost:.4f}")
+    
+    def record_call(self, agent: str, provider: str, model: str, latency: float,
+                    ttft: Optional[float] = None, prompt_tokens: Optional[int] = None,
+                    completion_tokens: Optional[int] = None):
+        """
+        Record timing and token counts of one LLM call in today's histograms
+        
+        Args:
+            agent: Calling agent (LeoAgent, AgenteAnalista, ProfessorAgent)
+            provider: LLM provider (groq/openai)
+            model: Model name
+            latency: Total call time in seconds
+            ttft: Time to first token in seconds (streaming calls only)
+            prompt_tokens: Prompt tokens (reported or estimated)
+            completion_tokens: Completion tokens (reported or estimated)
+        """
         today = datetime.now().strftime("%Y-%m-%d")
-        if today not in self.stats["daily"]:
-            self.stats["daily"][today] = {
-                "requests": 0,
-                "tokens": 0,
-                "cost": 0.0
-            }
-        self.stats["daily"][today]["requests"] += 1
-        self.stats["daily"][today]["tokens"] += tokens
-        self.stats["daily"][today]["cost"] += cost
+        observe = self.histograms.observe
+        observe(today, provider, model, agent, "latency_ms", latency * 1000)
+        if ttft is not None:
+            observe(today, provider, model, agent, "ttft_ms", ttft * 1000)
+        if prompt_tokens is not None:
+            observe(today, provider, model, agent, "prompt_tokens", prompt_tokens)
+        if completion_tokens is not None:
+            observe(today, provider, model, agent, "completion_tokens", completion_tokens)
+        self._updated()
+    
+    @staticmethod
+    def _last_days(days: int) -> Iterable[str]:
+        today = datetime.now()
+        return [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    
+    def get_percentiles(self, metric: str, days: int = 1, provider: Optional[str] = None,
+                        model: Optional[str] = None, agent: Optional[str] = None) -> Dict:
+        """
+        Percentiles of one metric over the last days
         
-        # Save stats
-        self._save_stats()
+        Args:
+            metric: ttft_ms, latency_ms, prompt_tokens or completion_tokens
+            days: Number of days including today
+            provider/model/agent: Filters (None = all)
+            
+        Returns:
+            {"count", "mean", "p50", "p95", "p99"} (None values if no data)
+        """
+        histogram = self.histograms.query(metric, self._last_days(days), provider, model, agent)
+        result = {"count": histogram.total, "mean": histogram.sum / histogram.total if histogram.total else None}
+        for q in self.PERCENTILES:
+            result[f"p{round(q * 100)}"] = histogram.percentile(q)
+        return result
+    
+    def get_latency_report(self, days: int = 1) -> Dict:
+        """
+        Percentiles of every metric per provider/model/agent over the last days
         
-        logger.info(f"API call logged: {provider}/{model} - {tokens} tokens - ${cost:.4f}")
+        Returns:
+            {"provider/model/agent": {metric: percentiles}}
+        """
+        dias = self._last_days(days)
+        return {
+            f"{provider}/{model}/{agent}": {
+                metric: self.get_percentiles(metric, days, provider, model, agent)
+                for metric in ("ttft_ms", "latency_ms", "prompt_tokens", "completion_tokens")
+            }
+            for provider, model, agent in self.histograms.keys(dias)
+        }
     
     def _calculate_cost(self, provider: str, model: str, tokens: int) -> float:
         """Calculate cost for API call"""
@@ -137,9 +315,15 @@ class CostMonitor:
     
     def get_user_usage(self, user_id: str) -> Dict:
         """Get usage for specific user"""
-        if user_id in self.stats["by_user"]:
-            return self.stats["by_user"][user_id]
-        return {"requests": 0, "tokens": 0, "cost": 0.0}
+        return self.usage.user(user_id)
+    
+    def get_daily_usage(self, day: str) -> Dict:
+        """Get usage of a day ("YYYY-MM-DD", within the last keep_days)"""
+        return self.usage.day(day)
+    
+    def get_month_cost(self, month: str) -> float:
+        """Get cost of a month ("YYYY-MM")"""
+        return self.usage.month_cost(month)
     
     def check_user_limit(self, user_id: str, max_requests: int = 100) -> Tuple[bool, str]:
         """
@@ -152,9 +336,7 @@ class CostMonitor:
         Returns:
             (within_limit, message)
         """
-        usage = self.get_user_usage(user_id)
-        
-        if usage["requests"] >= max_requests:
+        if self.usage.user_requests(user_id) >= max_requests:
             return False, f"Você atingiu o limite de {max_requests} mensagens. Entre em contato com o administrador."
         
         return True, ""
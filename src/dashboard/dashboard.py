@@ -22,11 +22,23 @@ def carregar_dados():
         # Read from root directory (two levels up from src/dashboard/)
         import os
         root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        db_path = os.path.join(root_dir, os.getenv('ENGAGEMENT_DB_FILE', 'engajamento.db'))
         alertas_path = os.path.join(root_dir, 'alertas.json')
         
-        with open(alertas_path, 'r', encoding='utf-8') as f:
-            dados = json.load(f)
-        df = pd.DataFrame(dados)
+        if os.path.exists(db_path):
+            # Banco de engajamento (SQLite) - somente leitura
+            import sqlite3
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                df = pd.read_sql_query("SELECT * FROM analises ORDER BY timestamp", conn)
+            finally:
+                conn.close()
+            df['observacoes_chave'] = df['observacoes_chave'].apply(lambda x: json.loads(x or '[]'))
+        else:
+            # Formato antigo (antes da migração)
+            with open(alertas_path, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            df = pd.DataFrame(dados)
         # Parse timestamp with ISO8601 format to handle microseconds
         df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
         
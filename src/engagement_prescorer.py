@@ -0,0 +1,216 @@
+"""
+Local engagement pre-scorer - Cheap Fredricks (2004) estimate used to gate LLM analytics
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.alert_detector import AlertDetector
+from src.pattern_sets import PatternSetLoader, compile_crisis
+from src.text_analysis import analyze_message, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class EngagementPreScorer:
+    """Approximates the three Fredricks pillars from simple conversation features
+
+    Text features are counted per student message in one pass, then reduced
+    per conversation and scored with NumPy, so thousands of histories can be
+    scored per second. Only conversations that are high-risk or uncertain
+    need to be escalated to AgenteAnalista.
+    """
+
+    # Negative vocabulary on top of the crisis patterns
+    NEGATIVE_WORDS = [
+        "saco", "chato", "chata", "tédio", "entediado", "cansado", "cansada",
+        "desanimado", "desanimada", "desisto", "odeio", "difícil", "não entendi",
+        "não entendo", "não sei", "não consigo", "sei lá", "tanto faz", "preguiça",
+        "não sirvo", "burro", "burra", "nada a ver", "triste", "reprovar",
+        "pra que serve", "não deu tempo",
+    ]
+
+    POSITIVE_WORDS = [
+        "entendi", "legal", "obrigado", "obrigada", "valeu", "show", "massa",
+        "faz sentido", "adorei", "gostei", "consegui", "interessante", "top", "boa",
+    ]
+
+    POSITIVE_EMOJIS = "😊😀😃😄😁😆🙂😍🥰🤩👍👏🙌🎉✨💡📚🤓💙❤️"
+    NEGATIVE_EMOJIS = "😞😔😟😢😭😡😠😤🙁☹😩😫😒🥺👎💔"
+
+    # Feature columns (bias is appended as the last column)
+    FEATURES = [
+        "length",            # log mean length of student messages
+        "length_trend",      # slope of message length over the conversation
+        "questions",         # share of messages with a question mark
+        "negative",          # negative vocabulary hits per message
+        "critical",          # crisis pattern categories matched per message
+        "positive",          # positive vocabulary hits per message
+        "emoji_balance",     # (positive - negative) / (total + 1) emojis
+        "short_answers",     # share of messages with 3 words or less
+        "latency",           # log mean response latency (0 when unknown)
+    ]
+
+    # Weights per pillar: comportamental, emocional, cognitivo
+    WEIGHTS = np.array([
+        [2.0, 0.5, 1.5],     # length
+        [0.8, 0.3, 0.5],     # length_trend
+        [0.5, 0.3, 3.0],     # questions
+        [-0.5, -3.0, -0.5],  # negative
+        [-1.0, -4.0, -0.5],  # critical
+        [0.5, 2.5, 0.5],     # positive
+        [0.2, 1.5, 0.0],     # emoji_balance
+        [-2.0, -0.5, -1.5],  # short_answers
+        [-1.0, -0.3, 0.0],   # latency
+        [-0.6, 0.0, -1.2],   # bias
+    ], dtype=np.float64)
+
+    def __init__(self, low_risk: float = 0.35, high_risk: float = 0.6,
+                 min_messages: int = 3, pattern_sets: Optional[PatternSetLoader] = None):
+        """
+        Initialize pre-scorer
+
+        Args:
+            low_risk: Conversations at or below this local risk are considered fine
+            high_risk: Conversations at or above this local risk are always escalated
+            min_messages: Fewer student messages than this are considered uncertain
+            pattern_sets: Shared PatternSetLoader, so the "critical" feature sees the same
+                (hot-reloaded) crisis patterns as AlertDetector; a private one is created if None
+        """
+        self.low_risk = low_risk
+        self.high_risk = high_risk
+        self.min_messages = min_messages
+
+        self.pattern_sets = pattern_sets or PatternSetLoader()
+        self.pattern_sets.register("crisis", "crisis.json", compile_crisis, AlertDetector.builtin_patterns())
+        self._negative_re = self._compile_words(self.NEGATIVE_WORDS)
+        self._positive_re = self._compile_words(self.POSITIVE_WORDS, negatable=True)
+        self._positive_emojis = frozenset(self.POSITIVE_EMOJIS)
+        self._negative_emojis = frozenset(self.NEGATIVE_EMOJIS)
+        logger.info("EngagementPreScorer initialized")
+
+    @staticmethod
+    def _compile_words(words: List[str], negatable: bool = False) -> re.Pattern:
+        """Compile a word list into one alternation with word boundaries, for normalized text"""
+        ordered = sorted({normalize_text(w) for w in words}, key=len, reverse=True)
+        # "não entendi" must not count as "entendi"
+        prefix = r"(?<!nao )" if negatable else ""
+        return re.compile(prefix + r"\b(?:" + "|".join(re.escape(w) for w in ordered) + r")\b")
+
+    def extract_features(self, historicos: List[List[Dict]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Extract the feature matrix for many conversations
+
+        Args:
+            historicos: Conversations in AgenteAnalista format ({"role", "content", optional "timestamp"})
+
+        Returns:
+            (features, counts) - (n, len(FEATURES) + 1) matrix with the bias as last
+            column, and the number of student messages per conversation
+        """
+        n = len(historicos)
+        crisis = self.pattern_sets.get("crisis").matcher  # one version for the whole batch
+        owner, position, lengths, questions, short = [], [], [], [], []
+        negative, critical, positive, emoji_pos, emoji_neg = [], [], [], [], []
+        latency_owner, latencies = [], []
+
+        for idx, historico in enumerate(historicos):
+            pos = 0
+            last_reply_at: Optional[float] = None
+            for msg in historico:
+                if msg["role"] != "user":
+                    last_reply_at = msg.get("timestamp")
+                    continue
+
+                text = msg["content"]
+                analysis = analyze_message(text)
+                # Casefolded, without accents, leetspeak mapped: "tedio", "N4O SEI" count too
+                words = analysis.deleet
+                owner.append(idx)
+                position.append(pos)
+                lengths.append(len(text))
+                questions.append("?" in text)
+                short.append(len(text.split()) <= 3)
+                negative.append(len(self._negative_re.findall(words)))
+                # Same forms as AlertDetector: "nao aguento mais", "n4o aguento" match too
+                critical.append(len(crisis.match(*analysis.forms)))
+                positive.append(len(self._positive_re.findall(words)))
+                emoji_pos.append(sum(c in self._positive_emojis for c in text))
+                emoji_neg.append(sum(c in self._negative_emojis for c in text))
+                pos += 1
+
+                sent_at = msg.get("timestamp")
+                if sent_at is not None and last_reply_at is not None:
+                    latency_owner.append(idx)
+                    latencies.append(max(0.0, sent_at - last_reply_at))
+
+        owner = np.asarray(owner, dtype=np.int64)
+        counts = np.bincount(owner, minlength=n).astype(np.float64)
+        safe_counts = np.maximum(counts, 1.0)
+
+        def per_conversation(values) -> np.ndarray:
+            return np.bincount(owner, weights=np.asarray(values, dtype=np.float64), minlength=n) / safe_counts
+
+        x = np.asarray(position, dtype=np.float64)
+        y = np.asarray(lengths, dtype=np.float64)
+        mean_x, mean_y = per_conversation(x), per_conversation(y)
+        cov = per_conversation(x * y) - mean_x * mean_y
+        var = per_conversation(x * x) - mean_x ** 2
+        slope = np.divide(cov, var, out=np.zeros(n), where=var > 0)
+        trend = np.clip(np.divide(slope, mean_y, out=np.zeros(n), where=mean_y > 0) * 5.0, -1.0, 1.0)
+
+        emoji_pos_sum = per_conversation(emoji_pos) * counts
+        emoji_neg_sum = per_conversation(emoji_neg) * counts
+
+        latency = np.zeros(n)
+        if latencies:
+            latency_owner = np.asarray(latency_owner, dtype=np.int64)
+            latency_counts = np.bincount(latency_owner, minlength=n)
+            latency_sum = np.bincount(latency_owner, weights=np.asarray(latencies), minlength=n)
+            mean_latency = np.divide(latency_sum, latency_counts, out=np.zeros(n), where=latency_counts > 0)
+            latency = np.log1p(mean_latency) / np.log1p(3600.0)
+
+        return np.column_stack([
+            np.log1p(mean_y) / np.log(200.0),
+            trend,
+            per_conversation(questions),
+            np.minimum(per_conversation(negative), 1.0),
+            np.minimum(per_conversation(critical), 1.0),
+            np.minimum(per_conversation(positive), 1.0),
+            (emoji_pos_sum - emoji_neg_sum) / (emoji_pos_sum + emoji_neg_sum + 1.0),
+            per_conversation(short),
+            np.minimum(latency, 1.0),
+            np.ones(n),
+        ]), counts
+
+    def score(self, historicos: List[List[Dict]]) -> Dict[str, np.ndarray]:
+        """
+        Score many conversations at once
+
+        Args:
+            historicos: Conversations in AgenteAnalista format
+
+        Returns:
+            Dict of arrays: engajamento_comportamental, engajamento_emocional,
+            engajamento_cognitivo, score_desmotivacao, mensagens, high_risk,
+            uncertain and escalate (high_risk or uncertain)
+        """
+        features, counts = self.extract_features(historicos)
+        pillars = 1.0 / (1.0 + np.exp(-(features @ self.WEIGHTS)))
+        risk = 1.0 - pillars.mean(axis=1)
+
+        critical = features[:, self.FEATURES.index("critical")] > 0
+        high_risk = (risk >= self.high_risk) | critical
+        confident_ok = (risk <= self.low_risk) & (counts >= self.min_messages) & ~critical
+        uncertain = ~confident_ok & ~high_risk
+
+        return {
+            "engajamento_comportamental": pillars[:, 0],
+            "engajamento_emocional": pillars[:, 1],
+            "engajamento_cognitivo": pillars[:, 2],
+            "score_desmotivacao": risk,
+            "mensagens": counts,
+            "high_risk": high_risk,
+            "uncertain": uncertain,
+            "escalate": high_risk | uncertain,
+        }
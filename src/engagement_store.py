@@ -0,0 +1,248 @@
+"""
+Engagement Store - Append-only SQLite (WAL) store for engagement analyses
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EngagementStore:
+    """Append-only store for AgenteAnalista results
+
+    Replaces the read-modify-write of ``alertas.json``. Inserts are O(1) and
+    indexed by aluno_id, timestamp and escola. Once ``start()`` is called,
+    records are buffered and inserted in batches from a worker thread so the
+    event loop never waits on disk; before that (scripts, tests) each record
+    is inserted immediately.
+    """
+
+    COLUMNS = [
+        "aluno_id", "timestamp", "engajamento_comportamental", "engajamento_emocional",
+        "engajamento_cognitivo", "score_desmotivacao", "observacoes_chave",
+        "escola", "cidade", "lat", "lon",
+    ]
+
+    def __init__(self, db_file: str = "engajamento.db", batch_size: int = 50,
+                 flush_interval: float = 2.0):
+        """
+        Initialize engagement store
+
+        Args:
+            db_file: SQLite database file
+            batch_size: Flush as soon as this many records are buffered
+            flush_interval: Seconds between background flushes
+        """
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._create_schema()
+
+        self._buffer: List[Dict] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        logger.info(f"EngagementStore initialized ({db_file})")
+
+    def _create_schema(self):
+        """Create tables and indexes"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS analises (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    aluno_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    engajamento_comportamental REAL,
+                    engajamento_emocional REAL,
+                    engajamento_cognitivo REAL,
+                    score_desmotivacao REAL,
+                    observacoes_chave TEXT,
+                    escola TEXT,
+                    cidade TEXT,
+                    lat REAL,
+                    lon REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_analises_aluno ON analises (aluno_id);
+                CREATE INDEX IF NOT EXISTS idx_analises_timestamp ON analises (timestamp);
+                CREATE INDEX IF NOT EXISTS idx_analises_escola ON analises (escola);
+                CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+            """)
+            self._conn.commit()
+
+    def _insert_many(self, registros: List[Dict]):
+        """Insert records in one transaction (runs in a worker thread when started)"""
+        rows = [
+            tuple(
+                json.dumps(r.get(col, []), ensure_ascii=False) if col == "observacoes_chave" else r.get(col)
+                for col in self.COLUMNS
+            )
+            for r in registros
+        ]
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO analises ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+            self._conn.commit()
+
+    def add(self, registro: Dict):
+        """
+        Add one analysis record (never blocks once the store is started)
+
+        Args:
+            registro: Dict with the COLUMNS fields
+        """
+        if self._flusher is None:
+            self._insert_many([registro])
+            return
+
+        self._buffer.append(registro)
+        if len(self._buffer) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        """Insert all buffered records from a worker thread"""
+        if not self._buffer:
+            return
+        registros, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._insert_many, registros)
+            logger.info(f"Engagement store flushed {len(registros)} records")
+        except Exception as e:
+            logger.error(f"Error flushing engagement store: {e}")
+            self._buffer = registros + self._buffer
+
+    async def start(self):
+        """Start batched background inserts"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+            logger.info("EngagementStore background flush started")
+
+    async def stop(self):
+        """Stop background inserts and flush what is left"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def _run(self):
+        """Flush buffered records periodically"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def import_json(self, json_file: str = "alertas.json") -> int:
+        """
+        One-time import of the legacy alertas.json
+
+        Args:
+            json_file: Legacy JSON file (list of records)
+
+        Returns:
+            Number of imported records (0 if already imported or missing)
+        """
+        key = f"imported:{os.path.abspath(json_file)}"
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM meta WHERE chave = ?", (key,)).fetchone()
+        if done or not os.path.exists(json_file):
+            return 0
+
+        with open(json_file, "r", encoding="utf-8") as f:
+            registros = json.load(f)
+
+        self._insert_many(registros)
+        with self._lock:
+            self._conn.execute("INSERT INTO meta (chave, valor) VALUES (?, ?)", (key, str(len(registros))))
+            self._conn.commit()
+
+        logger.info(f"Imported {len(registros)} records from {json_file}")
+        return len(registros)
+
+    def query(self, aluno_id: Optional[str] = None, escola: Optional[str] = None,
+              since: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Query records, newest first
+
+        Args:
+            aluno_id: Filter by student
+            escola: Filter by school
+            since: ISO timestamp lower bound
+            limit: Max number of records
+
+        Returns:
+            List of records in the alertas.json format
+        """
+        where, params = [], []
+        if aluno_id:
+            where.append("aluno_id = ?")
+            params.append(aluno_id)
+        if escola:
+            where.append("escola = ?")
+            params.append(escola)
+        if since:
+            where.append("timestamp >= ?")
+            params.append(since)
+
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM analises"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        registros = []
+        for row in rows:
+            registro = dict(zip(self.COLUMNS, row))
+            registro["observacoes_chave"] = json.loads(registro["observacoes_chave"] or "[]")
+            registros.append(registro)
+        return registros
+
+    def export_json(self, json_file: str = "alertas.json") -> int:
+        """
+        Export all records to a JSON file (atomic rename), oldest first
+
+        Args:
+            json_file: Output file
+
+        Returns:
+            Number of exported records
+        """
+        registros = list(reversed(self.query()))
+        tmp_file = f"{json_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(registros, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, json_file)
+        logger.info(f"Exported {len(registros)} records to {json_file}")
+        return len(registros)
+
+
+if __name__ == "__main__":
+    # python -m src.engagement_store import|export [alertas.json] [engajamento.db]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Uso: python -m src.engagement_store import|export [alertas.json] [engajamento.db]")
+        sys.exit(1)
+
+    json_file = sys.argv[2] if len(sys.argv) > 2 else "alertas.json"
+    store = EngagementStore(sys.argv[3] if len(sys.argv) > 3 else "engajamento.db")
+    if sys.argv[1] == "import":
+        print(f"✅ {store.import_json(json_file)} registros importados de {json_file}")
+    else:
+        print(f"✅ {store.export_json(json_file)} registros exportados para {json_file}")
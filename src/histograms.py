@@ -0,0 +1,151 @@
+"""
+Fixed-bucket histograms for latency and token counts
+"""
+import bisect
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+def geometric_bounds(start: float, stop: float, factor: float) -> List[float]:
+    """Upper bucket bounds start, start*factor, ... up to stop"""
+    count = int(math.ceil(math.log(stop / start) / math.log(factor))) + 1
+    return [start * factor ** i for i in range(count)]
+
+
+# ~20% relative error per bucket
+LATENCY_MS_BOUNDS = geometric_bounds(5.0, 180_000.0, 1.2)
+TOKEN_BOUNDS = geometric_bounds(1.0, 131_072.0, 1.2)
+
+METRIC_BOUNDS = {
+    "ttft_ms": LATENCY_MS_BOUNDS,
+    "latency_ms": LATENCY_MS_BOUNDS,
+    "prompt_tokens": TOKEN_BOUNDS,
+    "completion_tokens": TOKEN_BOUNDS,
+}
+
+
+class FixedHistogram:
+    """Counts per fixed bucket (plus one overflow bucket), 8 bytes per bucket
+
+    Percentiles are estimated by linear interpolation inside the bucket that
+    holds the requested rank, so a query never looks at individual events.
+    Histograms with the same bounds merge by adding counts.
+    """
+
+    __slots__ = ("bounds", "counts", "total", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = array("q", bytes(8 * (len(bounds) + 1)))
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Add one observation"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def merge(self, other: "FixedHistogram"):
+        """Add another histogram's counts into this one"""
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total += other.total
+        self.sum += other.sum
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimate a percentile
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            Estimated value, or None if empty
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * max(rank - cumulative, 0) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def to_pairs(self) -> List[List[int]]:
+        """Sparse [bucket, count] pairs for persistence"""
+        return [[i, c] for i, c in enumerate(self.counts) if c]
+
+    @classmethod
+    def from_pairs(cls, bounds: Sequence[float], pairs: Iterable, total_sum: float = 0.0) -> "FixedHistogram":
+        """Rebuild from to_pairs() output"""
+        histogram = cls(bounds)
+        for i, count in pairs:
+            histogram.counts[i] = count
+            histogram.total += count
+        histogram.sum = total_sum
+        return histogram
+
+
+class HistogramSet:
+    """Daily histograms keyed by (provider, model, agent, metric)
+
+    Each day is its own rollup; older days are dropped after ``retention_days``.
+    Queries merge the matching day/key histograms.
+    """
+
+    def __init__(self, retention_days: int = 30):
+        self.retention_days = retention_days
+        # day -> "provider|model|agent|metric" -> histogram
+        self.days: Dict[str, Dict[str, FixedHistogram]] = {}
+
+    def observe(self, day: str, provider: str, model: str, agent: str, metric: str, value: float):
+        """Add one observation to the day's histogram"""
+        histograms = self.days.get(day)
+        if histograms is None:
+            histograms = self.days[day] = {}
+            for old in sorted(self.days)[:-self.retention_days]:
+                del self.days[old]
+        key = f"{provider}|{model}|{agent}|{metric}"
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = FixedHistogram(METRIC_BOUNDS[metric])
+        histogram.observe(value)
+
+    def query(self, metric: str, days: Iterable[str], provider: Optional[str] = None,
+              model: Optional[str] = None, agent: Optional[str] = None) -> FixedHistogram:
+        """Merge the histograms of a metric over days, filtered by provider/model/agent"""
+        merged = FixedHistogram(METRIC_BOUNDS[metric])
+        for day in days:
+            for key, histogram in self.days.get(day, {}).items():
+                p, m, a, name = key.split("|")
+                if name == metric and provider in (None, p) and model in (None, m) and agent in (None, a):
+                    merged.merge(histogram)
+        return merged
+
+    def keys(self, days: Iterable[str]) -> List[tuple]:
+        """Distinct (provider, model, agent) seen on the given days"""
+        return sorted({tuple(key.split("|")[:3]) for day in days for key in self.days.get(day, {})})
+
+    def to_dict(self) -> Dict:
+        """Serializable form: day -> key -> {"sum", "buckets"}"""
+        return {
+            day: {key: {"sum": h.sum, "buckets": h.to_pairs()} for key, h in histograms.items()}
+            for day, histograms in self.days.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, retention_days: int = 30) -> "HistogramSet":
+        """Rebuild from to_dict() output"""
+        histogram_set = cls(retention_days)
+        for day, histograms in data.items():
+            histogram_set.days[day] = {
+                key: FixedHistogram.from_pairs(METRIC_BOUNDS[key.rsplit("|", 1)[1]], h["buckets"], h["sum"])
+                for key, h in histograms.items()
+            }
+        return histogram_set
@@ -0,0 +1,190 @@
+"""
+Index Store - Versioned FAISS index snapshots with an atomically swapped pointer
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+POINTER = "CURRENT"
+LOCK = ".publish.lock"
+VERSION_RE = re.compile(r"^v(\d+)$")
+
+
+class IndexStore:
+    """Directory of immutable index versions
+
+    Layout::
+
+        faiss_index/
+            CURRENT        <- "v3" (replaced with os.replace, never edited)
+            v2/index.faiss, v2/docstore.json, v2/chunks.*
+            v3/index.faiss, v3/docstore.json, v3/chunks.*
+
+    A version is written to a temporary directory and renamed to ``v<N>``
+    before ``CURRENT`` is switched, so a reader never sees a half-written
+    index. Readers poll the pointer with a single ``stat``. A directory with
+    the old flat layout (index.faiss at the top, no pointer) is served as
+    version "legacy" until the first publish.
+
+    Writers (prep_rag.py, every uvicorn worker's RAGIndexer) serialize on an
+    exclusive lock file, ``lock()``; a writer that builds on the published
+    corpus re-reads ``CURRENT`` while holding it. Old versions are pruned
+    only once they have been superseded for ``grace`` seconds, so a worker
+    still loading or mapping one does not lose it mid-read.
+    """
+
+    def __init__(self, root: str = "./faiss_index", keep: int = 3, grace: float = 60.0):
+        """
+        Initialize store
+
+        Args:
+            root: Index directory
+            keep: Versions kept on disk after a publish (the current one and at least one previous)
+            grace: Seconds a superseded version stays on disk at least (readers poll less often)
+        """
+        self.root = root
+        self.keep = max(keep, 2)
+        self.grace = grace
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.root, POINTER)
+
+    def pointer_stat(self) -> Optional[Tuple[int, int]]:
+        """Cheap change check: (inode, mtime) of the pointer, None if missing"""
+        try:
+            st = os.stat(self.pointer_path)
+            return st.st_ino, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def current(self) -> Optional[str]:
+        """Name of the published version ("v3", "legacy") or None"""
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+            if VERSION_RE.match(name) and os.path.isdir(os.path.join(self.root, name)):
+                return name
+            logger.error(f"Index pointer {self.pointer_path} names a missing version: {name!r}")
+        except FileNotFoundError:
+            pass
+        if os.path.exists(os.path.join(self.root, "index.faiss")):
+            return "legacy"
+        return None
+
+    def path(self, name: str) -> str:
+        """Directory holding a version"""
+        return self.root if name == "legacy" else os.path.join(self.root, name)
+
+    def versions(self) -> List[int]:
+        """Version numbers on disk, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        numbers = []
+        for entry in os.listdir(self.root):
+            match = VERSION_RE.match(entry)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    @contextmanager
+    def lock(self):
+        """Hold the exclusive publish lock (blocks other processes and threads until released)"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK), "a+b") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def publish(self, write: Callable[[str], None], locked: bool = False) -> str:
+        """
+        Write a new version and make it current
+
+        Args:
+            write: Called with an empty directory to fill (e.g. ``compact_index.write_version``)
+            locked: The caller already holds ``lock()``
+
+        Returns:
+            Name of the new version
+        """
+        if not locked:
+            with self.lock():
+                return self.publish(write, locked=True)
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            write(staging)
+            while True:
+                name = f"v{(self.versions() or [0])[-1] + 1}"
+                try:
+                    os.rename(staging, os.path.join(self.root, name))
+                    break
+                except OSError:
+                    if not os.path.exists(os.path.join(self.root, name)):
+                        raise
+                    # another writer took this number; try the next one
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        fd, tmp = tempfile.mkstemp(prefix=".pointer-", dir=self.root)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(name + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer_path)
+        logger.info(f"Published index {name} in {self.root}")
+
+        self.prune(keep_name=name)
+        return name
+
+    def prune(self, keep_name: Optional[str] = None):
+        """
+        Delete versions older than the newest ``keep``
+
+        The current one is never deleted, nor one superseded less than
+        ``grace`` seconds ago (a worker may still be loading it). A version
+        that is still mapped on Windows cannot be removed; the next prune retries.
+        """
+        current = keep_name or self.current()
+        numbers = self.versions()
+        cutoff = time.time() - self.grace
+        for number, successor in zip(numbers[:-self.keep], numbers[1:]):
+            name = f"v{number}"
+            if name == current:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.root, f"v{successor}")) > cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
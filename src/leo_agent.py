@@ -1,14 +1,12 @@
 import logging
 import time
 from typing import Dict, Optional
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import InMemoryChatMessageHistory as ChatMessageHistory
 from src.security import SecurityGuard
-from src.cost_monitor import CostMonitor
+from src.cost_monitor import CostMonitor, token_usage
+from src.text_analysis import analyze_message
 
 logger = logging.getLogger(__name__)
 
@@ -92,8 +90,12 @@ IMPORTANTE: Identifique automaticamente qual modo usar baseado na mensagem do al
 class LeoAgent:
     """LangChain-based agent for Nino educational chatbot"""
     
+    # Keywords (normalized: no accents) that trigger a RAG search
+    RAG_KEYWORDS = ["tarefa", "calendario", "prova", "trabalho", "professor", "quando"]
+    
     def __init__(self, api_key: str, model: str = "llama-3.1-70b-versatile", 
-                 max_messages: int = 20, provider: str = "groq", rag_service=None):
+                 max_messages: int = 20, provider: str = "groq", rag_service=None, pattern_sets=None,
+                 cost_monitor: Optional[CostMonitor] = None, budget=None):
         """
         Initialize Nino agent with LangChain
         
@@ -103,29 +105,24 @@ class LeoAgent:
             max_messages: Maximum messages to keep in memory per user
             provider: LLM provider ('openai' or 'groq')
             rag_service: Optional RAG service for document retrieval
+            pattern_sets: Optional shared PatternSetLoader for the security patterns
+            cost_monitor: Shared CostMonitor (flushed from the app lifespan); a new one if None
+            budget: Optional BudgetController (quotas, cheaper model / shorter replies when over budget)
         """
         self.rag_service = rag_service
         self.provider = provider
         self.model = model
         
         # Initialize security and monitoring
-        self.security = SecurityGuard()
-        self.cost_monitor = CostMonitor()
-        # Initialize LLM based on provider
-        if provider == "groq":
-            self.llm = ChatGroq(
-                model=model,
-                temperature=0.7,
-                max_tokens=500,
-                groq_api_key=api_key
-            )
-        else:  # openai
-            self.llm = ChatOpenAI(
-                model=model,
-                temperature=0.7,
-                max_tokens=500,
-                openai_api_key=api_key
-            )
+        self.security = SecurityGuard(pattern_sets)
+        self.cost_monitor = cost_monitor or CostMonitor()
+        self.budget = budget
+        # LLM client, created on first use (only the chosen provider's SDK is imported)
+        self._api_key = api_key
+        self._llm = None
+        
+        # Downgraded copies of the LLM: (model, max_tokens) -> LLM
+        self._llm_variants = {}
         
         # Memory storage per phone number
         self.memories: Dict[str, ChatMessageHistory] = {}
@@ -146,6 +143,44 @@ class LeoAgent:
         
         logger.info(f"LeoAgent initialized with {provider} provider and model {model}")
     
+    @property
+    def llm(self):
+        """LLM client for the configured provider (imports its SDK on first use)"""
+        if self._llm is None:
+            if self.provider == "groq":
+                from langchain_groq import ChatGroq
+                self._llm = ChatGroq(
+                    model=self.model,
+                    temperature=0.7,
+                    max_tokens=500,
+                    groq_api_key=self._api_key
+                )
+            else:  # openai
+                from langchain_openai import ChatOpenAI
+                self._llm = ChatOpenAI(
+                    model=self.model,
+                    temperature=0.7,
+                    max_tokens=500,
+                    openai_api_key=self._api_key,
+                    stream_usage=True
+                )
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    def _llm_for(self, model: str, max_tokens: Optional[int]):
+        """LLM for a budget plan (same client, other model and/or max_tokens)"""
+        if model == self.model and max_tokens is None:
+            return self.llm
+        key = (model, max_tokens)
+        if key not in self._llm_variants:
+            self._llm_variants[key] = self.llm.model_copy(
+                update={"model_name": model, "max_tokens": max_tokens or self.llm.max_tokens}
+            )
+        return self._llm_variants[key]
+    
     def get_or_create_memory(self, phone_number: str) -> ChatMessageHistory:
         """
         Get existing memory or create new one for phone number
@@ -217,14 +252,19 @@ class LeoAgent:
             Generated response text
         """
         try:
+            received_at = time.time()
+            
             # Check rate limits
             allowed, limit_message = self.check_rate_limit(phone_number)
             if not allowed:
                 logger.warning(f"Rate limit exceeded for {phone_number}")
                 return limit_message
             
+            # Normalized forms, shared with the other checks for this message
+            analysis = analyze_message(message)
+            
             # Security check: prompt injection
-            is_safe, security_msg = self.security.check_prompt_injection(message)
+            is_safe, security_msg = self.security.check_prompt_injection(analysis)
             if not is_safe:
                 logger.warning(f"Security block for {phone_number}: {security_msg}")
                 return security_msg
@@ -244,6 +284,17 @@ class LeoAgent:
             if not within_limit:
                 return limit_msg
             
+            # Budget: calendar quotas, and a cheaper model / shorter replies when over budget
+            model, llm = self.model, self.llm
+            if self.budget:
+                within_quota, quota_msg = self.budget.check_quota(phone_number)
+                if not within_quota:
+                    logger.warning(f"Budget quota exceeded for {phone_number}")
+                    return quota_msg
+                plan = self.budget.plan()
+                model = plan.model or self.model
+                llm = self._llm_for(model, plan.max_tokens)
+            
             # Check if this is a new user
             is_new = self.is_new_user(phone_number)
             
@@ -255,18 +306,17 @@ class LeoAgent:
             
             # Check if RAG context is needed (keywords: tarefa, calendario, prova, trabalho)
             rag_context = None
-            if self.rag_service and any(keyword in message.lower() for keyword in 
-                                       ["tarefa", "calendario", "prova", "trabalho", "professor", "quando"]):
-                rag_context = self.rag_service.search(message)
+            if self.rag_service and any(keyword in analysis.normalized for keyword in self.RAG_KEYWORDS):
+                rag_context = await self.rag_service.asearch(message)
                 if rag_context:
                     logger.info(f"RAG context found for: {message[:50]}...")
             
             # Choose prompt based on user status
             if is_new:
-                chain = self.prompt_new_user | self.llm
+                chain = self.prompt_new_user | llm
                 logger.info(f"New user detected: {phone_number} - Using introduction prompt")
             else:
-                chain = self.prompt_returning_user | self.llm
+                chain = self.prompt_returning_user | llm
                 logger.info(f"Returning user: {phone_number} - Using regular prompt")
             
             # Prepare input with RAG context if available
@@ -274,22 +324,38 @@ class LeoAgent:
             if rag_context:
                 input_message = f"[CONTEXTO DOS DOCUMENTOS DA ESCOLA]:\n{rag_context}\n\n[PERGUNTA DO ALUNO]: {message}"
             
-            # Generate response
-            response = await chain.ainvoke({
+            # Generate response (streamed, to measure time to first token)
+            started = time.perf_counter()
+            ttft = None
+            response = None
+            async for chunk in chain.astream({
                 "chat_history": messages,
                 "input": input_message
-            })
+            }):
+                if ttft is None and chunk.content:
+                    ttft = time.perf_counter() - started
+                response = chunk if response is None else response + chunk
+            latency = time.perf_counter() - started
             
             # Add messages to memory
-            memory.add_user_message(message)
-            memory.add_ai_message(response.content)
+            memory.add_message(HumanMessage(content=message, additional_kwargs={"timestamp": received_at}))
+            memory.add_message(AIMessage(content=response.content, additional_kwargs={"timestamp": time.time()}))
             
             # Update rate limit
             self.update_rate_limit(phone_number)
             
             # Log API usage for cost monitoring
             estimated_tokens = self.security.estimate_tokens(message + response.content)
-            self.cost_monitor.log_request(self.provider, self.model, estimated_tokens, phone_number)
+            self.cost_monitor.log_request(self.provider, model, estimated_tokens, phone_number)
+            if self.budget:
+                self.budget.record_request(phone_number)
+            prompt_tokens, completion_tokens = token_usage(response)
+            self.cost_monitor.record_call(
+                "LeoAgent", self.provider, model, latency, ttft,
+                prompt_tokens if prompt_tokens is not None else self.security.estimate_tokens(
+                    input_message + "".join(str(m.content) for m in messages)),
+                completion_tokens if completion_tokens is not None else self.security.estimate_tokens(response.content)
+            )
             
             logger.info(f"Generated response for {phone_number}")
             return response.content.strip()
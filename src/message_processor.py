@@ -2,6 +2,7 @@ import logging
 from src.leo_agent import LeoAgent
 from src.evolution_client import EvolutionAPIClient
 from src.alert_detector import AlertDetector
+from src.text_analysis import analyze_message
 
 logger = logging.getLogger(__name__)
 
@@ -9,7 +10,8 @@ logger = logging.getLogger(__name__)
 class MessageProcessor:
     """Processes incoming messages and coordinates response generation"""
     
-    def __init__(self, leo_agent: LeoAgent, evolution_client: EvolutionAPIClient, professor_agent=None, analytics_agent=None):
+    def __init__(self, leo_agent: LeoAgent, evolution_client: EvolutionAPIClient, professor_agent=None, analytics_scheduler=None,
+                 semantic_detector=None, pattern_sets=None, alert_dispatcher=None):
         """
         Initialize message processor
         
@@ -17,13 +19,20 @@ class MessageProcessor:
             leo_agent: LeoAgent instance for generating responses
             evolution_client: EvolutionAPIClient for sending messages
             professor_agent: Optional ProfessorAgent for handling teacher messages
-            analytics_agent: Optional AnalyticsAgent for engagement analysis
+            analytics_scheduler: Optional AnalyticsScheduler for background engagement analysis
+            semantic_detector: Optional SemanticCrisisDetector (second stage of crisis detection)
+            pattern_sets: Optional shared PatternSetLoader for the crisis patterns
+            alert_dispatcher: Optional AlertDispatcher that notifies staff of critical alerts
         """
         self.leo_agent = leo_agent
         self.evolution_client = evolution_client
         self.professor_agent = professor_agent
-        self.analytics_agent = analytics_agent
-        self.alert_detector = AlertDetector()
+        self.analytics_scheduler = analytics_scheduler
+        self.alert_detector = AlertDetector(
+            semantic_detector=semantic_detector,
+            pattern_sets=pattern_sets,
+            dispatcher=alert_dispatcher
+        )
         logger.info("MessageProcessor initialized")
     
     async def process_message(self, phone_number: str, message_text: str) -> None:
@@ -37,6 +46,9 @@ class MessageProcessor:
         try:
             logger.info(f"Processing message from {phone_number}: {message_text[:50]}...")
             
+            # Normalize once; the same analysis is used by every check below
+            analysis = analyze_message(message_text)
+            
             # Check if this is a professor message
             if self.professor_agent:
                 # Check if professor is in an active session
@@ -48,14 +60,14 @@ class MessageProcessor:
                     return
                 
                 # Check for reindex command
-                if "reindexar" in message_text.lower():
+                if "reindexar" in analysis.normalized:
                     success, response = await self.professor_agent.handle_reindex_request()
                     await self.evolution_client.send_message(phone_number, response)
                     return
                 
                 # Detect if this is a new professor message
                 is_professor, confidence = await self.professor_agent.detect_professor(
-                    phone_number, message_text
+                    phone_number, analysis
                 )
                 
                 if is_professor and confidence > 0.7:
@@ -66,8 +78,8 @@ class MessageProcessor:
                     return
             
             # Check for critical situations BEFORE generating response
-            is_critical, alert_data = self.alert_detector.detect_critical_situation(
-                message_text, phone_number
+            is_critical, alert_data = await self.alert_detector.adetect_critical_situation(
+                analysis, phone_number
             )
             
             if is_critical:
@@ -80,7 +92,11 @@ class MessageProcessor:
                 return
             
             # Regular student message - generate response using Nino agent
-            response = await self.leo_agent.generate_response(phone_number, message_text)
+            if self.analytics_scheduler:
+                async with self.analytics_scheduler.live_reply():
+                    response = await self.leo_agent.generate_response(phone_number, message_text)
+            else:
+                response = await self.leo_agent.generate_response(phone_number, message_text)
             
             # Send response via Evolution API
             success = await self.evolution_client.send_message(phone_number, response)
@@ -88,27 +104,20 @@ class MessageProcessor:
             if success:
                 logger.info(f"Successfully processed and responded to {phone_number}")
                 
-                # Analyze conversation for engagement metrics (async, don't wait)
-                if self.analytics_agent:
-                    try:
-                        # Get conversation history
-                        memory = self.leo_agent.get_or_create_memory(phone_number)
-                        if len(memory.messages) >= 4:  # Analyze after at least 2 exchanges
-                            # Convert to format expected by analytics agent
-                            historico = []
-                            for msg in memory.messages:
-                                role = "user" if msg.type == "human" else "assistant"
-                                historico.append({"role": role, "content": msg.content})
-                            
-                            # Run analysis in background
-                            logger.info(f"Running engagement analysis for {phone_number}")
-                            result = await self.analytics_agent.analisar_conversa(phone_number, historico)
-                            if result:
-                                logger.info(f"Engagement analysis complete for {phone_number}: risk={result.score_desmotivacao:.2f}")
-                            else:
-                                logger.info(f"Engagement analysis skipped for {phone_number}: conversation too short")
-                    except Exception as analytics_error:
-                        logger.error(f"Error in analytics: {analytics_error}")
+                # Queue engagement analysis in the background (debounced per student)
+                if self.analytics_scheduler:
+                    memory = self.leo_agent.get_or_create_memory(phone_number)
+                    if len(memory.messages) >= 4:  # Analyze after at least 2 exchanges
+                        # Convert to format expected by analytics agent
+                        historico = []
+                        for msg in memory.messages:
+                            role = "user" if msg.type == "human" else "assistant"
+                            historico.append({
+                                "role": role,
+                                "content": msg.content,
+                                "timestamp": msg.additional_kwargs.get("timestamp")
+                            })
+                        self.analytics_scheduler.record_message(phone_number, historico)
             else:
                 logger.error(f"Failed to send response to {phone_number}")
                 
@@ -0,0 +1,224 @@
+"""
+Pattern Matcher - Single-pass multi-pattern scanner with a literal prefilter
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Severity levels, most urgent first
+SEVERITY_ORDER = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+
+
+def required_literal(pattern: str) -> Optional[str]:
+    """
+    Extract the longest literal run that every match of a regex must contain
+
+    Only top-level literal characters count: groups, classes, escapes like
+    ``\\s`` and optional atoms (``?``, ``*``, ``{0,n}``) break the run.
+
+    Args:
+        pattern: Regular expression
+
+    Returns:
+        Literal text, or None if the pattern has no required literal
+        (e.g. a top-level alternation)
+    """
+    runs, current = [], []
+    i, n = 0, len(pattern)
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    while i < n:
+        c = pattern[i]
+        if c == "\\":
+            nxt = pattern[i + 1] if i + 1 < n else ""
+            i += 2
+            if nxt.isalnum():  # \s, \d, \b, backreferences...
+                flush()
+                continue
+            current.append(nxt)
+        elif c in "([":
+            # Skip the whole group or character class
+            depth, j = 0, i
+            closing = ")" if c == "(" else "]"
+            while j < n:
+                if pattern[j] == "\\":
+                    j += 2
+                    continue
+                if c == "(" and pattern[j] == "[":
+                    end = pattern.find("]", j + 2)
+                    j = end + 1 if end != -1 else n
+                    continue
+                if pattern[j] == c:
+                    depth += 1
+                elif pattern[j] == closing:
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            flush()
+            i = j + 1
+        elif c == "|":
+            return None
+        elif c in ".^$":
+            flush()
+            i += 1
+        elif c in "*?":
+            # Previous atom is optional
+            if current:
+                current.pop()
+            flush()
+            i += 1
+            if i < n and pattern[i] in "?+":
+                i += 1
+        elif c == "+":
+            flush()
+            i += 1
+            if i < n and pattern[i] in "?+":
+                i += 1
+        elif c == "{" and re.match(r"\{\d*,?\d*\}", pattern[i:]):
+            end = pattern.index("}", i)
+            if pattern[i + 1] in "0,":
+                if current:
+                    current.pop()
+            flush()
+            i = end + 1
+        else:
+            current.append(c)
+            i += 1
+    flush()
+
+    if not runs:
+        return None
+    return max(runs, key=len)
+
+
+def trie_regex(literals: List[str]) -> str:
+    """
+    Build a regex alternation factored by common prefixes
+
+    ``re`` tries alternatives one by one, so a flat ``a|b|c`` costs one attempt
+    per literal at every position. Factoring into a trie makes each position
+    cost one branch per character, and the greedy optional tails still report
+    the longest literal that starts there.
+
+    Args:
+        literals: Literal strings
+
+    Returns:
+        Regex source matching any of the literals (longest at each position)
+    """
+    trie: Dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        ends = "" in node
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        if len(branches) > 1:
+            return "(?:" + "|".join(branches) + ")" + ("?" if ends else "")
+        if ends:
+            return branches[0] + "?" if len(branches[0]) == 1 else f"(?:{branches[0]})?"
+        return branches[0]
+
+    return build(trie)
+
+
+class PatternMatcher:
+    """Compiles categorized regex lists into one scanner
+
+    One pass of a combined literal prefilter over the text finds which
+    patterns can possibly match; only those are verified with their own
+    compiled regex. Every matched category is returned, ranked by severity.
+    The result is the same as running ``re.search`` for every pattern.
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]], severity: Optional[Dict[str, str]] = None,
+                 flags: int = re.IGNORECASE):
+        """
+        Initialize matcher
+
+        Args:
+            patterns: category -> list of regexes
+            severity: category -> severity level (see SEVERITY_ORDER)
+            flags: Regex flags for every pattern
+        """
+        self.patterns = patterns
+        self.severity = severity or {}
+
+        # (category, pattern, compiled) in category/pattern order
+        self._compiled: List[Tuple[str, str, re.Pattern]] = []
+        literal_to_ids: Dict[str, List[int]] = {}
+        self._always: List[int] = []
+
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                pattern_id = len(self._compiled)
+                self._compiled.append((category, pattern, re.compile(pattern, flags)))
+                literal = required_literal(pattern)
+                if literal:
+                    literal_to_ids.setdefault(literal.lower(), []).append(pattern_id)
+                else:
+                    self._always.append(pattern_id)
+
+        # The prefilter reports the longest literal at each position; shorter
+        # literals contained in it are implied
+        self._literals = sorted(literal_to_ids, key=len, reverse=True)
+        self._implied: Dict[str, List[int]] = {
+            literal: sorted({
+                pattern_id
+                for other in self._literals if other in literal
+                for pattern_id in literal_to_ids[other]
+            })
+            for literal in self._literals
+        }
+        self._prefilter = None
+        if self._literals:
+            self._prefilter = re.compile(f"(?=({trie_regex(self._literals)}))", flags)
+
+        rank = {level: i for i, level in enumerate(SEVERITY_ORDER)}
+        order = list(patterns)
+        self._category_rank = {
+            category: (rank.get(self.severity.get(category), len(rank)), order.index(category))
+            for category in patterns
+        }
+
+    def match(self, *texts: str) -> List[Tuple[str, str]]:
+        """
+        Find every matching category
+
+        Args:
+            *texts: Text to scan; several forms of the same message
+                (e.g. MessageAnalysis.forms) are matched as a union
+
+        Returns:
+            List of (category, first matching pattern), most severe first
+        """
+        candidates = set(self._always)
+        if self._prefilter is not None:
+            for text in texts:
+                for found in self._prefilter.finditer(text):
+                    candidates.update(self._implied[found.group(1).lower()])
+
+        matched: Dict[str, str] = {}
+        for pattern_id in sorted(candidates):
+            category, pattern, compiled = self._compiled[pattern_id]
+            if category not in matched and any(compiled.search(text) for text in texts):
+                matched[category] = pattern
+
+        return sorted(matched.items(), key=lambda item: self._category_rank[item[0]])
+
+    def search(self, *texts: str) -> Optional[Tuple[str, str]]:
+        """Most severe (category, pattern) match, or None"""
+        matches = self.match(*texts)
+        return matches[0] if matches else None
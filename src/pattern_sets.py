@@ -0,0 +1,246 @@
+"""
+Pattern Sets - Versioned, hot-reloadable pattern files compiled into matchers
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from src.pattern_matcher import SEVERITY_ORDER, PatternMatcher
+from src.text_analysis import normalize_pattern, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class CrisisPatterns:
+    """Compiled crisis patterns (config/patterns/crisis.json)"""
+
+    __slots__ = ("version", "patterns", "severity", "matcher")
+
+    def __init__(self, version: int, patterns: Dict[str, List[str]], severity: Dict[str, str]):
+        self.version = version
+        self.patterns = patterns
+        self.severity = severity
+        # Patterns without accents so "nao aguento mais" matches too
+        self.matcher = PatternMatcher(
+            {category: [normalize_pattern(p) for p in ps] for category, ps in patterns.items()},
+            severity
+        )
+
+
+class InjectionPatterns:
+    """Compiled prompt injection patterns (config/patterns/security.json)"""
+
+    __slots__ = ("version", "patterns", "regex")
+
+    def __init__(self, version: int, patterns: List[str]):
+        self.version = version
+        self.patterns = patterns
+        # All injection patterns in one regex: one scan instead of one re.search per pattern.
+        # It runs case-sensitively on lowercased/casefolded forms, which keeps sre's
+        # first-character prefix scan (re.IGNORECASE disables it)
+        self.regex = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+class ProfessorKeywords:
+    """Normalized professor keywords (config/patterns/professor.json)"""
+
+    __slots__ = ("version", "keywords")
+
+    def __init__(self, version: int, keywords: List[str]):
+        self.version = version
+        # Keywords in normalized form ("atenção 6º ano" -> "atencao 6o ano")
+        self.keywords = [normalize_text(keyword) for keyword in keywords]
+
+
+def _version(data: dict) -> int:
+    version = data.get("version")
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError("'version' must be an integer")
+    return version
+
+
+def _string_list(value, name: str) -> List[str]:
+    if not isinstance(value, list) or not value or not all(isinstance(v, str) and v.strip() for v in value):
+        raise ValueError(f"'{name}' must be a non-empty list of non-empty strings")
+    return value
+
+
+def compile_crisis(data: dict) -> CrisisPatterns:
+    """
+    Validate and compile a crisis pattern file
+
+    Format: ``{"version": 1, "categories": {"<category>": {"severity": "HIGH", "patterns": [...]}}}``
+
+    Raises:
+        ValueError/re.error if the file is invalid
+    """
+    version = _version(data)
+    categories = data.get("categories")
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError("'categories' must be a non-empty object")
+
+    patterns, severity = {}, {}
+    for category, spec in categories.items():
+        if spec.get("severity") not in SEVERITY_ORDER:
+            raise ValueError(f"{category}: severity must be one of {SEVERITY_ORDER}")
+        patterns[category] = _string_list(spec.get("patterns"), f"{category}.patterns")
+        severity[category] = spec["severity"]
+    return CrisisPatterns(version, patterns, severity)
+
+
+# Escapes and group syntax whose uppercase letters are not literals (\S, \W, \N{...}, (?P<Name>...))
+_NOT_LITERAL = re.compile(r"\\N\{[^}]*\}|\\.|\(\?P(?:<\w+>|=\w+\)|>)")
+
+
+def compile_injection(data: dict) -> InjectionPatterns:
+    """
+    Validate and compile a security pattern file
+
+    Format: ``{"version": 1, "injection_patterns": [...]}``
+
+    Raises:
+        ValueError if a pattern has an uppercase literal: it only runs on
+        lowercased forms, so it could never match
+    """
+    patterns = _string_list(data.get("injection_patterns"), "injection_patterns")
+    for pattern in patterns:
+        if any(c.isupper() for c in _NOT_LITERAL.sub("", pattern)):
+            raise ValueError(f"injection pattern {pattern!r} has uppercase letters; write it in lowercase")
+    return InjectionPatterns(_version(data), patterns)
+
+
+def compile_professor(data: dict) -> ProfessorKeywords:
+    """
+    Validate and compile a professor keyword file
+
+    Format: ``{"version": 1, "keywords": [...]}``
+    """
+    return ProfessorKeywords(_version(data), _string_list(data.get("keywords"), "keywords"))
+
+
+class PatternSetLoader:
+    """Loads pattern files and swaps in new versions without a restart
+
+    Each set is registered by the component that uses it, with its class
+    constants as fallback. ``check()`` compares file mtimes; a changed file is
+    parsed and compiled off to the side and only then swapped in with a single
+    reference assignment, so a reader always sees one complete version. A file
+    that fails validation is logged and the previous version stays active.
+    """
+
+    def __init__(self, directory: str = "config/patterns", poll_interval: float = 5.0):
+        """
+        Initialize loader
+
+        Args:
+            directory: Directory with the pattern files
+            poll_interval: Seconds between mtime checks once started
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+
+        # name -> compiled set (replaced atomically)
+        self._sets: Dict[str, object] = {}
+        # name -> (filename, compiler)
+        self._specs: Dict[str, Tuple[str, Callable[[dict], object]]] = {}
+        # name -> last seen (mtime_ns, size), including rejected versions
+        self._seen: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, self._specs[name][0])
+
+    def _stat(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._path(name))
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _compile_file(self, name: str):
+        """Read and compile a set from its file (raises on any problem)"""
+        with open(self._path(name), "r", encoding="utf-8") as f:
+            return self._specs[name][1](json.load(f))
+
+    def register(self, name: str, filename: str, compiler: Callable[[dict], object], fallback: dict):
+        """
+        Register a pattern set (no-op if already registered)
+
+        Args:
+            name: Set name (e.g. "crisis")
+            filename: File inside the directory
+            compiler: Validates the parsed JSON and returns the compiled set
+            fallback: Data used when the file is missing or invalid at startup
+        """
+        if name in self._specs:
+            return
+        self._specs[name] = (filename, compiler)
+        self._seen[name] = self._stat(name)
+
+        if self._seen[name] is not None:
+            try:
+                self._sets[name] = self._compile_file(name)
+                logger.info(f"Pattern set '{name}' v{self._sets[name].version} loaded from {self._path(name)}")
+                return
+            except Exception as e:
+                logger.error(f"Invalid pattern file {self._path(name)}, using built-in '{name}' patterns: {e}")
+        else:
+            logger.warning(f"Pattern file {self._path(name)} not found, using built-in '{name}' patterns")
+        self._sets[name] = compiler(fallback)
+
+    def get(self, name: str):
+        """Current compiled set (take it once per message for a consistent view)"""
+        return self._sets[name]
+
+    def check(self) -> List[str]:
+        """
+        Reload every set whose file changed
+
+        Returns:
+            Names of the sets that were swapped
+        """
+        reloaded = []
+        for name in list(self._specs):
+            stat = self._stat(name)
+            if stat is None or stat == self._seen[name]:
+                continue
+            self._seen[name] = stat
+
+            try:
+                compiled = self._compile_file(name)
+            except Exception as e:
+                logger.error(f"Rejected pattern file {self._path(name)}, keeping v{self._sets[name].version}: {e}")
+                continue
+
+            previous = self._sets[name].version
+            self._sets[name] = compiled
+            reloaded.append(name)
+            logger.info(f"Pattern set '{name}' reloaded: v{previous} -> v{compiled.version}")
+        return reloaded
+
+    async def start(self):
+        """Start polling the pattern files"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Pattern set polling started ({self.directory}, every {self.poll_interval}s)")
+
+    async def stop(self):
+        """Stop polling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Poll file mtimes periodically"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                logger.error(f"Error checking pattern files: {e}")
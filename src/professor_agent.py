@@ -3,10 +3,13 @@ Professor Agent - Allows teachers to update RAG documents via WhatsApp
 """
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Optional, Tuple
-from langchain_groq import ChatGroq
+from typing import Optional, Tuple, Union
 from langchain_core.messages import SystemMessage, HumanMessage
+from src.cost_monitor import CostMonitor, token_usage
+from src.pattern_sets import PatternSetLoader, compile_professor
+from src.text_analysis import MessageAnalysis, analyze_message
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,7 @@ class ProfessorAgent:
     professor_sessions = {}  # phone_number -> {"state": "awaiting_content", "buffer": []}
     
     # Keywords that indicate professor identity
+    # (built-in fallback; the live set is config/patterns/professor.json)
     PROFESSOR_KEYWORDS = [
         "sou professor",
         "sou o professor",
@@ -38,19 +42,25 @@ class ProfessorAgent:
         "atenção 6º ano"
     ]
     
-    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile"):
+    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile",
+                 pattern_sets: Optional[PatternSetLoader] = None, cost_monitor: Optional[CostMonitor] = None,
+                 indexer=None):
         """
         Initialize professor agent
         
         Args:
             api_key: Groq API key
             model: LLM model name
+            pattern_sets: Shared PatternSetLoader (hot reload); a private one is created if None
+            cost_monitor: Records latency/token histograms of the LLM calls (optional)
+            indexer: RAGIndexer that adds published messages to the live index (optional)
         """
-        self.llm = ChatGroq(
-            model=model,
-            temperature=0.2,
-            groq_api_key=api_key
-        )
+        self.model = model
+        self.indexer = indexer
+        self.cost_monitor = cost_monitor
+        # Groq client, created on first use
+        self._api_key = api_key
+        self._llm = None
         
         self.system_prompt = """Você é um assistente que identifica se uma mensagem é de um professor.
 
@@ -74,35 +84,60 @@ Indicadores de que NÃO é professor:
 - Pede ajuda ou explicação
 - Conversa casual"""
         
+        self.pattern_sets = pattern_sets or PatternSetLoader()
+        self.pattern_sets.register(
+            "professor", "professor.json", compile_professor,
+            {"version": 0, "keywords": self.PROFESSOR_KEYWORDS}
+        )
+        
         logger.info("ProfessorAgent initialized")
     
+    @property
+    def llm(self):
+        """Groq client (imports langchain_groq on first use)"""
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            self._llm = ChatGroq(
+                model=self.model,
+                temperature=0.2,
+                groq_api_key=self._api_key
+            )
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
     def is_known_professor(self, phone_number: str) -> bool:
         """Check if phone number is a known professor"""
         return phone_number in self.PROFESSOR_NUMBERS
     
-    def has_professor_keywords(self, message: str) -> bool:
-        """Quick check for professor keywords"""
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in self.PROFESSOR_KEYWORDS)
+    def has_professor_keywords(self, message: Union[str, MessageAnalysis]) -> bool:
+        """Quick check for professor keywords (accent/case-insensitive)"""
+        normalized = analyze_message(message).normalized
+        return any(keyword in normalized for keyword in self.pattern_sets.get("professor").keywords)
     
-    async def detect_professor(self, phone_number: str, message: str) -> Tuple[bool, float]:
+    async def detect_professor(self, phone_number: str, message: Union[str, MessageAnalysis]) -> Tuple[bool, float]:
         """
         Detect if message is from a professor
         
         Args:
             phone_number: Sender's phone number
-            message: Message text
+            message: Message text (or its MessageAnalysis)
             
         Returns:
             (is_professor, confidence)
         """
+        analysis = analyze_message(message)
+        message = analysis.text
+        
         # Quick check: known professor number
         if self.is_known_professor(phone_number):
             logger.info(f"Known professor detected: {phone_number}")
             return True, 1.0
         
         # Quick check: professor keywords
-        if not self.has_professor_keywords(message):
+        if not self.has_professor_keywords(analysis):
             return False, 0.0
         
         # LLM analysis for uncertain cases
@@ -112,7 +147,12 @@ Indicadores de que NÃO é professor:
                 HumanMessage(content=f"Mensagem: {message}")
             ]
             
+            started = time.perf_counter()
             response = await self.llm.ainvoke(messages)
+            if self.cost_monitor:
+                self.cost_monitor.record_call(
+                    "ProfessorAgent", "groq", self.model, time.perf_counter() - started, None, *token_usage(response)
+                )
             
             # Parse response
             import json
@@ -210,8 +250,10 @@ Aguardando sua mensagem... 📝"""
             # Combine all buffered messages
             full_message = "\n\n".join(session["buffer"])
             
-            # Save and return confirmation
+            # Save, index in the background and return confirmation
             filename = self.save_professor_message(full_message, phone_number)
+            if self.indexer:
+                self.indexer.submit(filename)
             
             # Clear session
             del self.professor_sessions[phone_number]
@@ -244,19 +286,22 @@ Continue enviando mais conteúdo ou:
     
     def generate_confirmation_message(self, filename: str) -> str:
         """Generate confirmation message for professor"""
+        aviso = "\n🔄 Os alunos já conseguem consultar em alguns segundos.\n" if self.indexer else self.REINDEX_NOTICE
         return f"""✅ Mensagem publicada com sucesso, Professor(a)!
 
 Sua mensagem foi adicionada aos documentos da escola e os alunos poderão consultá-la através do Leo.
 
 📁 Arquivo: {os.path.basename(filename)}
 ⏰ Publicado em: {datetime.now().strftime("%d/%m/%Y às %H:%M")}
-
+{aviso}
+Obrigado por usar o sistema! 📚"""
+    
+    REINDEX_NOTICE = """
 ⚠️ IMPORTANTE: Para que os alunos vejam a atualização imediatamente, digite:
 "REINDEXAR"
 
 Ou aguarde a reindexação automática (ocorre a cada hora).
-
-Obrigado por usar o sistema! 📚"""
+"""
     
     async def handle_reindex_request(self) -> Tuple[bool, str]:
         """
@@ -266,6 +311,16 @@ Obrigado por usar o sistema! 📚"""
             (success, message)
         """
         try:
+            if self.indexer:
+                # Index whatever is missing into the live index (no process restart)
+                count = await self.indexer.sync_directory()
+                logger.info(f"RAG sync indexed {count} documents")
+                return True, """✅ Sistema atualizado com sucesso!
+
+Os alunos já podem consultar sua nova mensagem através do Leo.
+
+Tudo pronto! 🎉"""
+
             # Import here to avoid circular dependency
             import subprocess
             
@@ -0,0 +1,136 @@
+"""
+RAG Cache - LRU caches for query embeddings and retrieval results
+"""
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Sequence
+import numpy as np
+
+
+class LRUCache:
+    """Size-bounded LRU map with hit/miss counters (thread-safe)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable):
+        """Value or None; a hit becomes the most recently used entry"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        """Insert, evicting the least recently used entry when full"""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "capacity": self.capacity, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+
+class EmbeddingCache(LRUCache):
+    """LRU of query embeddings stored as rows of one float32 matrix
+
+    The map only holds row numbers; an evicted entry's row is reused by the
+    next insert, so the cache never allocates after the matrix is created
+    (on the first insert, once the dimension is known).
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._matrix: Optional[np.ndarray] = None
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Copy of the cached vector, or None"""
+        with self._lock:
+            row = self._data.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._matrix[row].copy()
+
+    def put(self, key: Hashable, vector: Sequence[float]):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            row = self._data.get(key)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    _, row = self._data.popitem(last=False)
+                    self.evictions += 1
+                self._data[key] = row
+            self._data.move_to_end(key)
+            self._matrix[row] = vector
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._free = list(range(self.capacity - 1, -1, -1))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["bytes"] = 0 if self._matrix is None else self._matrix.nbytes
+        return stats
+
+
+class RAGCache:
+    """Query embedding cache plus result cache, tied to one index version
+
+    Keys are normalized queries (``normalize_query``). Results are keyed by
+    (query, k, index version); when the version changes both levels are
+    cleared, so nothing computed against an older index is ever served.
+    """
+
+    def __init__(self, embedding_capacity: int = 2048, result_capacity: int = 1024):
+        self.embeddings = EmbeddingCache(embedding_capacity)
+        self.results = LRUCache(result_capacity)
+        self.version = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def check_version(self, version: int):
+        """Clear both levels if the index version changed"""
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    if self.version is not None:
+                        self.invalidations += 1
+                    self.embeddings.clear()
+                    self.results.clear()
+                    self.version = version
+
+    def stats(self) -> dict:
+        return {"version": self.version, "invalidations": self.invalidations,
+                "embeddings": self.embeddings.stats(), "results": self.results.stats()}
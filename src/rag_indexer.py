@@ -0,0 +1,156 @@
+"""
+RAG Indexer - Adds new school documents to the live FAISS index
+"""
+import asyncio
+import glob
+import logging
+import os
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RAGIndexer:
+    """In-process incremental indexing for RAGService
+
+    A published document is split with the same settings as ``prep_rag.py``,
+    only its chunks are embedded, and they are added to the running
+    RAGService (copy-on-write swap), so students can retrieve it within
+    seconds. A few seconds after a change the index is published as a new
+    version (``RAGService.save``) from a background thread, which other
+    workers then load. Documents are indexed one at a time.
+    """
+
+    def __init__(self, rag_service, documents_dir: str = "documentos_escola", chunk_size: int = 500,
+                 chunk_overlap: int = 50, persist_delay: float = 2.0):
+        """
+        Initialize indexer
+
+        Args:
+            rag_service: Live RAGService
+            documents_dir: Folder with the school's .txt documents
+            chunk_size: Chunk size (same as prep_rag.py)
+            chunk_overlap: Chunk overlap (same as prep_rag.py)
+            persist_delay: Seconds after a change before the index is saved
+        """
+        self.rag_service = rag_service
+        self.documents_dir = documents_dir
+        self.persist_delay = persist_delay
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._splitter = None  # created on first document (keeps langchain_text_splitters off startup)
+
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._persist_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self.stats = {"documents": 0, "chunks": 0, "saves": 0, "errors": 0}
+
+    def _split(self, path: str):
+        """Read and split one document (blocking)"""
+        if self._splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            self._splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size,
+                                                            chunk_overlap=self.chunk_overlap)
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        chunks = self._splitter.split_text(text)
+        return chunks, [{"source": path} for _ in chunks]
+
+    def _add_file(self, path: str) -> int:
+        """Split, embed and add one document (blocking)"""
+        chunks, metadatas = self._split(path)
+        return self.rag_service.add_texts(chunks, metadatas)
+
+    async def index_file(self, path: str) -> int:
+        """
+        Index one document into the live index
+
+        Args:
+            path: Document path (stored as the chunks' "source")
+
+        Returns:
+            Number of chunks added
+        """
+        path = self.rag_service.normalize_source(path)
+        async with self._lock:
+            if path in self.rag_service.indexed_sources():
+                logger.info(f"{path} is already indexed")
+                return 0
+            added = await asyncio.to_thread(self._add_file, path)
+
+        self.stats["documents"] += 1
+        self.stats["chunks"] += added
+        logger.info(f"Indexed {path}: {added} chunks (index v{self.rag_service.index_version})")
+        self._schedule_persist()
+        return added
+
+    def _track(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def submit(self, path: str) -> asyncio.Task:
+        """Index a document in the background (never blocks the caller)"""
+        return self._track(self._index_logged(path))
+
+    async def _index_logged(self, path: str):
+        try:
+            await self.index_file(path)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error indexing {path}: {e}")
+
+    async def sync_directory(self) -> int:
+        """
+        Index every document in documents_dir that is not in the index yet
+
+        Returns:
+            Number of documents indexed
+        """
+        indexed = self.rag_service.indexed_sources()
+        paths = sorted(glob.glob(os.path.join(self.documents_dir, "**", "*.txt"), recursive=True))
+        missing = [path for path in map(self.rag_service.normalize_source, paths) if path not in indexed]
+        for path in missing:
+            await self._index_logged(path)
+        return len(missing)
+
+    def _schedule_persist(self):
+        """Schedule a save unless one is already pending"""
+        self._dirty = True
+        if self._persist_task is None or self._persist_task.done():
+            self._persist_task = asyncio.get_running_loop().create_task(self._persist_later())
+
+    async def _persist_later(self):
+        await asyncio.sleep(self.persist_delay)
+        await self.flush()
+
+    async def flush(self):
+        """Save the live index now, in a worker thread, if it changed"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            name = await asyncio.to_thread(self.rag_service.save)
+            self.stats["saves"] += 1
+            logger.info(f"RAG index published as {name} in {self.rag_service.index_path}")
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Error saving RAG index: {e}")
+
+    async def start(self):
+        """Index documents added while the app was down (in the background)"""
+        self._track(self.sync_directory())
+
+    async def stop(self):
+        """Wait for pending documents and save"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._persist_task is not None:
+            self._persist_task.cancel()
+            try:
+                await self._persist_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
@@ -0,0 +1,233 @@
+"""
+RAG Ingest - Incremental, parallel build of the FAISS index from documentos_escola
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src import compact_index
+from src.index_store import IndexStore
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+MANIFEST = "manifest.json"
+
+
+def split_file(path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Tuple[str, List[str]]:
+    """
+    Hash and split one document (runs in a worker process)
+
+    Returns:
+        (sha256 of the file, chunk texts)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return hashlib.sha256(data).hexdigest(), splitter.split_text(data.decode("utf-8"))
+
+
+def embed_batched(embeddings, texts: List[str], batch_size: int = 64, threads: int = 2) -> np.ndarray:
+    """
+    Embed texts in batches on a thread pool (the model releases the GIL)
+
+    Returns:
+        float32 matrix, one row per text
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if threads > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embed") as pool:
+            results = list(pool.map(embeddings.embed_documents, batches))
+    else:
+        results = [embeddings.embed_documents(batch) for batch in batches]
+    return np.asarray([vector for batch in results for vector in batch], dtype=np.float32)
+
+
+class IngestManifest:
+    """Content hash, chunks and chunk vectors of every indexed document
+
+    Stored next to the index versions as ``manifest.json`` plus one
+    ``manifest-<token>.npy`` matrix; the JSON names its matrix and is
+    replaced last, so a crash never pairs it with the wrong vectors. A file
+    whose size and mtime did not change is not even re-read; one whose hash
+    did not change is not re-embedded. Changing the model or the chunk
+    settings empties the manifest.
+    """
+
+    def __init__(self, settings: Dict):
+        self.settings = settings
+        self.files: Dict[str, Dict] = {}  # source -> {"sha256", "size", "mtime_ns", "chunks", "offset"}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def load(cls, root: str, settings: Dict) -> "IngestManifest":
+        manifest = cls(settings)
+        try:
+            with open(os.path.join(root, MANIFEST), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("settings") != settings:
+                logger.info("Model or chunk settings changed, re-embedding every document")
+                return manifest
+            vectors = np.load(os.path.join(root, data["vectors"]))
+            if vectors.shape[0] != data["rows"]:
+                raise ValueError(f"{data['vectors']} has {vectors.shape[0]} rows, expected {data['rows']}")
+            manifest.files, manifest.vectors = data["files"], vectors
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest in {root}: {e}")
+        return manifest
+
+    def chunk_vectors(self, source: str) -> np.ndarray:
+        entry = self.files[source]
+        return self.vectors[entry["offset"]:entry["offset"] + len(entry["chunks"])]
+
+    def save(self, root: str):
+        """Write the vectors, then atomically replace the JSON that points to them"""
+        os.makedirs(root, exist_ok=True)
+        previous = {name for name in os.listdir(root) if name.startswith("manifest-") and name.endswith(".npy")}
+        vectors_name = f"manifest-{uuid.uuid4().hex[:12]}.npy"
+        np.save(os.path.join(root, vectors_name), self.vectors)
+
+        tmp = os.path.join(root, f".{MANIFEST}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            # dumps, not dump: one call to the C encoder instead of streaming in Python
+            f.write(json.dumps({"settings": self.settings, "vectors": vectors_name,
+                                "rows": int(self.vectors.shape[0]), "files": self.files}, ensure_ascii=False))
+        os.replace(tmp, os.path.join(root, MANIFEST))
+        for name in previous:
+            os.remove(os.path.join(root, name))
+
+
+def build_index(documents_dir: str = "./documentos_escola", index_dir: str = "./faiss_index", embeddings=None,
+                workers: Optional[int] = None, batch_size: int = 64, threads: int = 2, full: bool = False,
+                model_name: str = MODEL_NAME, chunk_size: int = CHUNK_SIZE,
+                chunk_overlap: int = CHUNK_OVERLAP, index_type: str = "flat", pq_m: Optional[int] = None,
+                nlist: Optional[int] = None) -> Dict:
+    """
+    Build the index from new/changed documents only and publish it
+
+    Args:
+        documents_dir: Folder with the school's .txt documents
+        index_dir: IndexStore directory
+        embeddings: Embedding model (default: MiniLM, loaded only if something changed)
+        workers: Processes used to read, hash and split changed files (default: CPU count)
+        batch_size: Texts per embed_documents call
+        threads: Concurrent embed_documents calls
+        full: Ignore the manifest and re-embed everything
+        model_name: Embedding model name (part of the manifest settings)
+        chunk_size: Chunk size
+        chunk_overlap: Chunk overlap
+        index_type: FAISS variant, "flat", "f16", "pq" or "ivfpq" (see compact_index.build_faiss_index)
+        pq_m: PQ bytes per vector (pq/ivfpq)
+        nlist: IVF lists (ivfpq)
+
+    Returns:
+        Report with counts, per-stage seconds and the published version (None if unchanged)
+    """
+    timings = {}
+    start = time.perf_counter()
+    settings = {"model": model_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    store = IndexStore(index_dir)
+    manifest = IngestManifest(settings) if full else IngestManifest.load(index_dir, settings)
+
+    # 1. Which files changed (stat only)
+    paths = sorted(glob.glob(os.path.join(documents_dir, "**", "*.txt"), recursive=True))
+    stats = {}
+    to_split = []
+    for path in paths:
+        source = os.path.normpath(path)
+        st = os.stat(path)
+        stats[source] = (st.st_size, st.st_mtime_ns)
+        entry = manifest.files.get(source)
+        if entry is None or (entry["size"], entry["mtime_ns"]) != stats[source]:
+            to_split.append(source)
+    removed = set(manifest.files) - set(stats)
+    timings["scan"] = time.perf_counter() - start
+
+    # 2. Hash + split the changed files in parallel
+    mark = time.perf_counter()
+    split = {}
+    if len(to_split) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(to_split) // ((workers or os.cpu_count() or 1) * 4))
+            results = pool.map(split_file, to_split, [chunk_size] * len(to_split),
+                               [chunk_overlap] * len(to_split), chunksize=chunksize)
+            split = dict(zip(to_split, results))
+    else:
+        split = {source: split_file(source, chunk_size, chunk_overlap) for source in to_split}
+    timings["split"] = time.perf_counter() - mark
+
+    # 3. Embed the chunks of files whose content actually changed
+    mark = time.perf_counter()
+    changed = sorted(source for source, (sha, _) in split.items()
+                     if source not in manifest.files or manifest.files[source]["sha256"] != sha)
+    new_texts = [text for source in changed for text in split[source][1]]
+    if new_texts and embeddings is None:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    new_vectors = embed_batched(embeddings, new_texts, batch_size, threads) if new_texts else None
+    timings["embed"] = time.perf_counter() - mark
+
+    # 4. New manifest: reused vectors + new ones, in path order
+    mark = time.perf_counter()
+    rows = []
+    updated = IngestManifest(settings)
+    offset = new_offset = 0
+    changed_set = set(changed)
+    for source in sorted(stats):
+        size, mtime_ns = stats[source]
+        if source in changed_set:
+            sha, chunks = split[source]
+            vectors = new_vectors[new_offset:new_offset + len(chunks)]
+            new_offset += len(chunks)
+        else:
+            sha = split[source][0] if source in split else manifest.files[source]["sha256"]
+            chunks = manifest.files[source]["chunks"]
+            vectors = manifest.chunk_vectors(source)
+        updated.files[source] = {"sha256": sha, "size": size, "mtime_ns": mtime_ns, "chunks": chunks,
+                                 "offset": offset}
+        offset += len(chunks)
+        if len(chunks):
+            rows.append(vectors)
+    if rows:
+        updated.vectors = np.vstack(rows).astype(np.float32, copy=False)
+
+    report = {
+        "documents": len(stats), "split": len(to_split), "changed": len(changed), "removed": len(removed),
+        "chunks": int(updated.vectors.shape[0]), "embedded": len(new_texts), "version": None,
+    }
+
+    # 5. Publish only if the content or the index type changed (or there is no index yet)
+    current = store.current()
+    header = compact_index.read_header(store.path(current)) if current else None
+    retype = rows and (header is None or header["requested_type"] != index_type)  # incl. index.pkl versions
+    if changed or removed or current is None or retype:
+        if not rows:
+            raise ValueError(f"No documents to index in {documents_dir}")
+        report["version"] = store.publish(lambda path: _write_version(updated, path, index_type, pq_m, nlist))
+    if to_split or removed:
+        updated.save(index_dir)
+    timings["build"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+    report["seconds"] = timings
+    return report
+
+
+def _write_version(manifest: IngestManifest, path: str, index_type: str, pq_m: Optional[int], nlist: Optional[int]):
+    """Compact version with every chunk of the manifest (manifest rows are in chunk order)"""
+    texts, metadatas = [], []
+    for source, entry in manifest.files.items():
+        texts.extend(entry["chunks"])
+        metadatas.extend({"source": source} for _ in entry["chunks"])
+    index = compact_index.build_faiss_index(manifest.vectors, index_type, pq_m=pq_m, nlist=nlist)
+    compact_index.write_version(path, index, texts, metadatas, requested_type=index_type)
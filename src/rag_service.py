@@ -1,67 +1,451 @@
 """
 RAG Service for retrieving school documents
 """
+import asyncio
 import logging
 import os
-from typing import Optional
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src.index_store import IndexStore
+from src.rag_cache import RAGCache
+from src.text_analysis import normalize_text
 
 logger = logging.getLogger(__name__)
 
 
 class RAGService:
-    """Service for retrieving relevant documents"""
-    
-    def __init__(self, api_key: str, index_path: str = "./faiss_index"):
+    """Service for retrieving relevant documents
+
+    ``asearch()`` never runs the model on the event loop: queries that arrive
+    within ``batch_window`` seconds of each other are collected and handled
+    as one batch (one ``embed_documents`` call, then one FAISS search per
+    query) on a small thread pool. ``search()`` is the blocking variant for
+    scripts.
+
+    Normalized-equal queries ("Quando é a prova?" / "quando e a prova") share
+    a cached embedding and, for the same k and index version, a cached
+    result; a cached result is returned without leaving the event loop.
+    Loading a new index bumps ``index_version``, which clears both caches.
+
+    FAISS, LangChain and the embedding model are imported when the index is
+    first loaded, not when the module is imported.
+
+    Versions are stored in the compact format of ``src/compact_index.py``
+    (no pickle) and memory-mapped when ``mmap`` is set, so uvicorn workers
+    on one host share the index and chunk pages instead of each holding a
+    copy; versions written before it (LangChain's ``index.pkl``) still load.
+
+    ``add_texts()`` adds chunks copy-on-write: the new vectors go into a copy
+    of the index that replaces the live one with a single reference swap, so
+    searches in flight keep using the version they started with.
+
+    ``index_path`` is an ``IndexStore``: once started, the service polls its
+    ``CURRENT`` pointer and, when another process (prep_rag.py, another
+    worker) publishes a version, loads it in a worker thread and swaps it in
+    the same way. A replaced index is freed as soon as the last search using
+    it finishes (``draining()`` lists the ones still referenced).
+
+    Chunks added here are remembered until they are published. Loading a
+    version another writer published (poll or ``save()``) re-applies them on
+    top of it, minus documents that version already has, and ``save()``
+    does this under the store's publish lock, so concurrent workers never
+    publish over each other's documents.
+    """
+
+    def __init__(self, api_key: str, index_path: str = "./faiss_index", embeddings=None,
+                 max_workers: int = 2, batch_window: float = 0.005, max_batch: int = 16,
+                 embedding_cache_size: int = 2048, result_cache_size: int = 1024,
+                 poll_interval: float = 5.0, load_index: bool = True, mmap: bool = True):
         """
         Initialize RAG service
-        
+
         Args:
             api_key: Not used (kept for compatibility)
             index_path: Path to FAISS index
+            embeddings: Embedding model (default: MiniLM via HuggingFaceEmbeddings)
+            max_workers: Threads for embedding + search batches
+            batch_window: Seconds to wait for more queries before running a batch
+            max_batch: Run a batch right away once this many queries are waiting
+            embedding_cache_size: Query embeddings kept (LRU, float32 rows)
+            result_cache_size: Search results kept (LRU)
+            poll_interval: Seconds between checks for a newly published index once started
+            load_index: Load the model and index now; False leaves it to ``load()``
+                (e.g. a background warmup), searching returns None until then
+            mmap: Memory-map compact index versions instead of reading them into memory
         """
         self.index_path = index_path
+        self.store = IndexStore(index_path)
+        self.index_name = None  # published version in memory ("v3", "legacy")
+        self.poll_interval = poll_interval
+        self.mmap = mmap
         self.vectorstore = None
-        
-        try:
-            if os.path.exists(index_path):
-                # Use HuggingFace embeddings (free and local)
-                embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2"
-                )
-                self.vectorstore = FAISS.load_local(
-                    index_path,
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                logger.info(f"RAG index loaded from {index_path}")
-            else:
-                logger.warning(f"RAG index not found at {index_path}. Run prep_rag.py first.")
-        except Exception as e:
-            logger.error(f"Error loading RAG index: {e}")
-    
+        self.embeddings = embeddings  # also used by SemanticCrisisDetector
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag")
+        self._pending = []  # (query, k, future) waiting for the next batch
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"queries": 0, "batches": 0}
+        self.index_version = 0
+        self.cache = RAGCache(embedding_cache_size, result_cache_size)
+        self._write_lock = threading.Lock()
+        self._unpublished = []  # (texts, vectors, metadatas) added since the last publish
+        self._pointer = self.store.pointer_stat()
+        self._draining = weakref.WeakValueDictionary()  # index_version -> replaced index
+        self._task: Optional[asyncio.Task] = None
+
+        if load_index:
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Error loading RAG index: {e}", exc_info=True)
+
+    def load(self) -> bool:
+        """
+        Load the embedding model and the published index (blocking, raises on failure)
+
+        Returns:
+            True if an index was loaded
+        """
+        self._pointer = self.store.pointer_stat()
+        name = self.store.current()
+        if not name:
+            logger.warning(f"RAG index not found at {self.index_path}. Run prep_rag.py first.")
+            return False
+        if self.vectorstore is not None and self.index_name == name:
+            return True  # add_texts() loaded it first and may have added chunks on top
+        self._rebase(name)
+        logger.info(f"RAG index {name} loaded from {self.index_path}")
+        return True
+
+    def _load(self, name: str):
+        """Read one published version (blocking)"""
+        from src import compact_index
+        path = self.store.path(name)
+        if compact_index.is_compact(path):
+            return compact_index.load_version(path, self.load_embeddings(), use_mmap=self.mmap)
+
+        # Written before the compact format: LangChain's pickled docstore
+        from langchain_community.vectorstores import FAISS
+        return FAISS.load_local(
+            path,
+            self.load_embeddings(),
+            allow_dangerous_deserialization=True
+        )
+
+    def _set_vectorstore(self, vectorstore, name: Optional[str] = None):
+        """Swap in a (new) index; cached embeddings and results are dropped"""
+        previous = self.vectorstore
+        if previous is not None:
+            self._draining[self.index_version] = previous
+        self.vectorstore = vectorstore
+        if name:
+            self.index_name = name
+        self.index_version += 1
+        self.cache.check_version(self.index_version)
+
+    def _rebase(self, name: str):
+        """Load a published version and re-apply the unpublished chunks on top of it (blocking)"""
+        vectorstore = self._load(name)
+        sources = self._sources(vectorstore)
+        with self._write_lock:
+            if self.store.current() != name:
+                return  # superseded while loading (a save() went first); the next poll loads it
+            # Documents the version already has were published by another writer too
+            self._unpublished = [
+                (texts, vectors, metadatas) for texts, vectors, metadatas in self._unpublished
+                if not metadatas or not all(self.normalize_source(m.get("source", "")) in sources
+                                            for m in metadatas)
+            ]
+            for texts, vectors, metadatas in self._unpublished:
+                vectorstore = self._extend(vectorstore, texts, vectors, metadatas)
+            self._set_vectorstore(vectorstore, name)
+
+    def draining(self) -> List[int]:
+        """Versions replaced but still held by a search in progress"""
+        return sorted(self._draining.keys())
+
+    def refresh(self) -> bool:
+        """
+        Load the published version if the pointer moved (blocking)
+
+        Returns:
+            True if a new index was swapped in
+        """
+        pointer = self.store.pointer_stat()
+        if pointer == self._pointer:
+            return False
+        self._pointer = pointer
+
+        name = self.store.current()
+        if name is None or name == self.index_name:
+            return False
+        self._rebase(name)
+        logger.info(f"RAG index {name} loaded from {self.index_path} (v{self.index_version})")
+        return True
+
+    async def start(self):
+        """Start polling for newly published index versions"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"RAG index polling started ({self.index_path}, every {self.poll_interval}s)")
+
+    async def stop(self):
+        """Stop polling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Check the version pointer periodically"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Error reloading RAG index: {e}")
+
+    def load_embeddings(self):
+        """Embedding model, loaded on first use (blocking)"""
+        if self.embeddings is None:
+            # Use HuggingFace embeddings (free and local)
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        return self.embeddings
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None) -> int:
+        """
+        Embed chunks and add them to the live index (blocking)
+
+        Args:
+            texts: Chunk texts
+            metadatas: One metadata dict per chunk (e.g. {"source": path})
+
+        Returns:
+            Number of chunks added
+        """
+        if not texts:
+            return 0
+        vectors = self.load_embeddings().embed_documents(texts)
+
+        with self._write_lock:
+            current = self.vectorstore
+            name = self.store.current() if current is None else None
+            if name:
+                # Not loaded yet (warmup) or the load failed: add on top of the published corpus
+                # instead of starting a store with only these chunks (raises if it is unreadable)
+                pointer = self.store.pointer_stat()
+                current = self._load(name)
+                self._pointer = pointer
+                self._set_vectorstore(current, name)
+            self._set_vectorstore(self._extend(current, texts, vectors, metadatas))
+            self._unpublished.append((texts, vectors, metadatas))
+        return len(texts)
+
+    def _extend(self, current, texts: List[str], vectors, metadatas: Optional[List[Dict]]):
+        """Copy of ``current`` (None: a new store) with the chunks added"""
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+        from src.compact_index import copy_index
+        if current is None:
+            return FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas)
+        docstore = current.docstore
+        updated = FAISS(
+            self.embeddings,
+            copy_index(current.index),
+            docstore.copy() if hasattr(docstore, "copy") else InMemoryDocstore(dict(docstore._dict)),
+            current.index_to_docstore_id.copy(),
+            normalize_L2=current._normalize_L2,
+            distance_strategy=current.distance_strategy
+        )
+        updated.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+        return updated
+
+    @staticmethod
+    def normalize_source(path: str) -> str:
+        """Comparable document path (indexes built on Windows store backslashes)"""
+        return os.path.normpath(path.replace("\\", "/"))
+
+    def indexed_sources(self) -> set:
+        """Normalized "source" of every document in the live index"""
+        return self._sources(self.vectorstore)
+
+    @classmethod
+    def _sources(cls, vectorstore) -> set:
+        if vectorstore is None:
+            return set()
+        docstore = vectorstore.docstore
+        if hasattr(docstore, "metadatas"):
+            metadatas = docstore.metadatas()
+        else:
+            metadatas = (doc.metadata for doc in docstore._dict.values())
+        return {cls.normalize_source(metadata["source"]) for metadata in metadatas if metadata.get("source")}
+
+    def save(self) -> Optional[str]:
+        """
+        Publish the live index as a new version (blocking)
+
+        Under the store's publish lock: if another writer published since the
+        version in memory, that version is loaded and the unpublished chunks
+        are re-applied to it first, so its documents are never dropped.
+
+        Returns:
+            Name of the published version (the current one if there was nothing new)
+        """
+        from src.compact_index import save_vectorstore
+        with self.store.lock():
+            pointer = self.store.pointer_stat()
+            current = self.store.current()
+            if current and current != self.index_name:
+                self._rebase(current)
+                self._pointer = pointer
+            with self._write_lock:
+                vectorstore, count = self.vectorstore, len(self._unpublished)
+            if vectorstore is None or not count:
+                return current
+            name = self.store.publish(lambda path: save_vectorstore(vectorstore, path), locked=True)
+            pointer = self.store.pointer_stat()
+        with self._write_lock:
+            del self._unpublished[:count]
+            self.index_name = name
+            self._pointer = pointer
+        return name
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Cache key: normalized text without surrounding punctuation"""
+        return normalize_text(query).strip(" ?!.,;:")
+
+    @staticmethod
+    def _format(query: str, docs) -> Optional[str]:
+        """Concatenate retrieved chunks"""
+        if docs:
+            logger.info(f"Found {len(docs)} relevant documents for query: {query[:50]}...")
+            return "\n\n".join([doc.page_content for doc in docs])
+        return None
+
+    def _cached_result(self, key: str, k: int) -> Optional[str]:
+        """Result cache lookup ("" stands for a cached empty result)"""
+        self.cache.check_version(self.index_version)
+        return self.cache.results.get((key, k, self.index_version))
+
+    def _search_batch(self, queries: List[str], ks: List[int]) -> List[Optional[str]]:
+        """Embed the uncached queries in one call and search each one (blocking)"""
+        version, vectorstore = self.index_version, self.vectorstore
+        self.cache.check_version(version)
+        keys = [self.normalize_query(query) for query in queries]
+
+        vectors = {}
+        missing = {}  # key -> first query with that key (embedded once per batch)
+        for query, key in zip(queries, keys):
+            if key not in vectors and key not in missing:
+                vector = self.cache.embeddings.get(key)
+                if vector is None:
+                    missing[key] = query
+                else:
+                    vectors[key] = vector
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            for key, vector in zip(missing, embedded):
+                vectors[key] = vector
+                self.cache.embeddings.put(key, vector)
+
+        results = []
+        for query, key, k in zip(queries, keys, ks):
+            result = self._format(query, vectorstore.similarity_search_by_vector(list(vectors[key]), k=k))
+            self.cache.results.put((key, k, version), result or "")
+            results.append(result)
+        return results
+
     def search(self, query: str, k: int = 3) -> Optional[str]:
         """
-        Search for relevant documents
-        
+        Search for relevant documents (blocking; use asearch from coroutines)
+
         Args:
             query: Search query
             k: Number of results to return
-            
+
         Returns:
             Concatenated relevant documents or None
         """
         if not self.vectorstore:
             return None
-        
+
         try:
-            docs = self.vectorstore.similarity_search(query, k=k)
-            if docs:
-                context = "\n\n".join([doc.page_content for doc in docs])
-                logger.info(f"Found {len(docs)} relevant documents for query: {query[:50]}...")
-                return context
-            return None
+            cached = self._cached_result(self.normalize_query(query), k)
+            if cached is not None:
+                return cached or None
+            return self._search_batch([query], [k])[0]
         except Exception as e:
             logger.error(f"Error searching RAG: {e}")
             return None
+
+    async def asearch(self, query: str, k: int = 3) -> Optional[str]:
+        """
+        Search for relevant documents without blocking the event loop
+
+        Args:
+            query: Search query
+            k: Number of results to return
+
+        Returns:
+            Concatenated relevant documents or None
+        """
+        if not self.vectorstore:
+            return None
+
+        self.stats["queries"] += 1
+        cached = self._cached_result(self.normalize_query(query), k)
+        if cached is not None:
+            return cached or None
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._run_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(self.batch_window, self._run_batch)
+        return await future
+
+    def _run_batch(self):
+        """Send the waiting queries to the thread pool as one batch"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self.stats["batches"] += 1
+        loop = asyncio.get_running_loop()
+        queries = [query for query, _, _ in batch]
+        ks = [k for _, k, _ in batch]
+        task = loop.run_in_executor(self._executor, self._search_batch, queries, ks)
+        task.add_done_callback(lambda done: self._deliver(batch, done))
+
+    @staticmethod
+    def _deliver(batch, done: asyncio.Future):
+        """Resolve each query's future with its result (None on error)"""
+        error = done.exception()
+        if error:
+            logger.error(f"Error searching RAG: {error}")
+        for i, (_, _, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(None if error else done.result()[i])
+
+    def get_cache_stats(self) -> dict:
+        """Hit rates and sizes of both cache levels"""
+        return self.cache.stats()
+
+    def shutdown(self):
+        """Stop the thread pool"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,83 @@
+"""
+School Registry - Resolves a student's school and location from a local CSV
+"""
+import csv
+import logging
+import os
+from typing import Dict, Optional
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class LocalizacaoEscola(BaseModel):
+    """School and precomputed coordinates used by the heatmap"""
+    escola: str
+    cidade: str
+    lat: float
+    lon: float
+
+
+# Used when the registry has no match and no "*" row
+ESCOLA_PADRAO = LocalizacaoEscola(
+    escola="Vista Alegre Park, Haras e Hípica",
+    cidade="João Pessoa",
+    lat=-7.1195,
+    lon=-34.845
+)
+
+
+class SchoolRegistry:
+    """In-memory index of schools keyed by phone number or instance name
+
+    The CSV has the columns ``chave,escola,cidade,lat,lon``. ``chave`` is a
+    student phone number, an Evolution instance name, or ``*`` for the
+    default school. The file is read once at startup.
+    """
+
+    def __init__(self, registry_file: str = "config/escolas.csv"):
+        """
+        Initialize school registry
+
+        Args:
+            registry_file: CSV file with the school registry
+        """
+        self.registry_file = registry_file
+        self._index: Dict[str, LocalizacaoEscola] = {}
+        self._load()
+
+    def _load(self):
+        """Load the registry into memory"""
+        if not os.path.exists(self.registry_file):
+            logger.warning(f"School registry not found at {self.registry_file}, using default school")
+            return
+
+        try:
+            with open(self.registry_file, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    self._index[row["chave"].strip()] = LocalizacaoEscola(
+                        escola=row["escola"].strip(),
+                        cidade=row["cidade"].strip(),
+                        lat=float(row["lat"]),
+                        lon=float(row["lon"])
+                    )
+            logger.info(f"School registry loaded: {len(self._index)} entries from {self.registry_file}")
+        except Exception as e:
+            logger.error(f"Error loading school registry: {e}")
+
+    def resolve(self, aluno_id: str, instance: Optional[str] = None) -> LocalizacaoEscola:
+        """
+        Resolve a student's school
+
+        Args:
+            aluno_id: Student phone number
+            instance: Evolution API instance the message arrived on
+
+        Returns:
+            LocalizacaoEscola (phone match, then instance, then default)
+        """
+        if aluno_id in self._index:
+            return self._index[aluno_id]
+        if instance and instance in self._index:
+            return self._index[instance]
+        return self._index.get("*", ESCOLA_PADRAO)
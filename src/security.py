@@ -3,7 +3,10 @@ Security module for prompt injection protection and input sanitization
 """
 import logging
 import re
-from typing import Tuple
+from collections import Counter
+from typing import Optional, Tuple, Union
+from src.pattern_sets import PatternSetLoader, compile_injection
+from src.text_analysis import MessageAnalysis, analyze_message
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +15,7 @@ class SecurityGuard:
     """Security guard for prompt injection and malicious input detection"""
     
     # Dangerous patterns that indicate prompt injection attempts
+    # (built-in fallback; the live set is config/patterns/security.json)
     INJECTION_PATTERNS = [
         r"ignore\s+(previous|above|all)\s+instructions?",
         r"disregard\s+(previous|above|all)\s+instructions?",
@@ -38,70 +42,87 @@ class SecurityGuard:
     # Token limits
     MAX_MESSAGE_TOKENS = 500  # Approximate (1 token ≈ 4 chars)
     
-    def __init__(self):
-        """Initialize security guard"""
+    # 10+ same chars in a row (explicit backreferences are faster than \1{9})
+    REPEATED_RUN = re.compile(r"(.)" + r"\1" * 9, re.DOTALL)
+    
+    # Not alphanumeric, not whitespace and not common punctuation
+    # (\w is isalnum() plus "_", \s is isspace(), accented letters are alnum)
+    SPECIAL_CHAR = re.compile(r"[^\w\s.,!?;:\-'\"()]|_")
+    
+    def __init__(self, pattern_sets: Optional[PatternSetLoader] = None):
+        """
+        Initialize security guard
+        
+        Args:
+            pattern_sets: Shared PatternSetLoader (hot reload); a private one is created if None
+        """
         self.blocked_count = 0
+        self.pattern_sets = pattern_sets or PatternSetLoader()
+        self.pattern_sets.register(
+            "security", "security.json", compile_injection,
+            {"version": 0, "injection_patterns": self.INJECTION_PATTERNS}
+        )
         logger.info("SecurityGuard initialized")
     
-    def check_prompt_injection(self, message: str) -> Tuple[bool, str]:
+    def check_prompt_injection(self, message: Union[str, MessageAnalysis]) -> Tuple[bool, str]:
         """
         Check if message contains prompt injection attempts
         
         Args:
-            message: User message to check
+            message: User message to check (or its MessageAnalysis)
             
         Returns:
             (is_safe, reason) - False if injection detected
         """
-        message_lower = message.lower()
+        analysis = analyze_message(message)
+        message = analysis.text
+        
+        # Check for injection patterns (accents, homoglyphs and leetspeak normalized)
+        injection = self.pattern_sets.get("security")
+        match = next(filter(None, (injection.regex.search(form) for form in analysis.forms)), None)
+        if match:
+            logger.warning(f"Prompt injection detected: {self._matched_pattern(injection.patterns, match.group(0))}")
+            self.blocked_count += 1
+            return False, "Mensagem bloqueada por segurança. Evite comandos especiais."
         
-        # Check for injection patterns
-        for pattern in self.INJECTION_PATTERNS:
-            if re.search(pattern, message_lower, re.IGNORECASE):
-                logger.warning(f"Prompt injection detected: {pattern}")
-                self.blocked_count += 1
-                return False, "Mensagem bloqueada por segurança. Evite comandos especiais."
+        has_long_run, max_word_count, special_chars = self._scan(message)
         
         # Check for excessive repetition (spam/DOS attempt)
-        if self._has_excessive_repetition(message):
+        if has_long_run or max_word_count > self.MAX_REPEATED_WORDS:
             logger.warning("Excessive repetition detected")
             self.blocked_count += 1
             return False, "Mensagem com muito texto repetido. Tente ser mais claro."
         
-        # Check for suspicious special characters
-        if self._has_suspicious_chars(message):
+        # Check for suspicious special characters (more than 20%)
+        if message and special_chars / len(message) > 0.2:
             logger.warning("Suspicious characters detected")
             self.blocked_count += 1
             return False, "Mensagem contém caracteres suspeitos."
         
         return True, ""
     
-    def _has_excessive_repetition(self, message: str) -> bool:
-        """Check for excessive character or word repetition"""
-        # Check repeated characters
-        for char in set(message):
-            if message.count(char * 10) > 0:  # 10+ same chars in a row
-                return True
-        
-        # Check repeated words
-        words = message.split()
-        if len(words) > 5:
-            for word in set(words):
-                if words.count(word) > self.MAX_REPEATED_WORDS:
-                    return True
-        
-        return False
+    def _matched_pattern(self, patterns: list, matched_text: str) -> str:
+        """Find which injection pattern produced a match (only runs on a hit)"""
+        for pattern in patterns:
+            if re.search(pattern, matched_text, re.IGNORECASE):
+                return pattern
+        return matched_text
     
-    def _has_suspicious_chars(self, message: str) -> bool:
-        """Check for suspicious special characters"""
-        # Count special chars
-        special_chars = sum(1 for c in message if not c.isalnum() and not c.isspace() and c not in ".,!?;:-'\"()áéíóúãõâêôàèìòùçÁÉÍÓÚÃÕÂÊÔÀÈÌÒÙÇ")
-        
-        # If more than 20% special chars, suspicious
-        if len(message) > 0 and special_chars / len(message) > 0.2:
-            return True
+    def _scan(self, message: str) -> Tuple[bool, int, int]:
+        """
+        Compute every repetition/character feature in linear time
         
-        return False
+        Args:
+            message: User message
+            
+        Returns:
+            (has_long_run, max_word_count, special_chars)
+        """
+        has_long_run = self.REPEATED_RUN.search(message) is not None
+        words = message.split()
+        max_word_count = max(Counter(words).values()) if len(words) > 5 else 0
+        special_chars = len(self.SPECIAL_CHAR.findall(message))
+        return has_long_run, max_word_count, special_chars
     
     def sanitize_input(self, message: str) -> str:
         """
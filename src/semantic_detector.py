@@ -0,0 +1,139 @@
+"""
+Semantic Crisis Detector - Second-stage detection of paraphrased crisis messages
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCrisisDetector:
+    """Compares message embeddings against per-category exemplar vectors
+
+    Exemplars of every category are embedded once at startup (with the same
+    MiniLM model RAGService loads) and stacked with their category centroids
+    into one normalized matrix. A message costs one embedding plus one
+    matmul; each category's score is its best cosine similarity, flagged if it
+    reaches the category threshold. Runs in a thread pool so the event loop
+    never waits on the model.
+    """
+
+    def __init__(self, embeddings, exemplars_file: str = "config/crisis_exemplars.json",
+                 max_workers: int = 1):
+        """
+        Initialize semantic detector
+
+        Args:
+            embeddings: LangChain embeddings (embed_query/embed_documents), e.g. RAGService.embeddings
+            exemplars_file: JSON with per-category thresholds and example messages
+            max_workers: Threads for embedding calls
+        """
+        self.embeddings = embeddings
+        self.exemplars_file = exemplars_file
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="semantic")
+
+        self.categories: List[str] = []
+        self.thresholds = np.zeros(0, dtype=np.float32)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._starts = np.zeros(0, dtype=np.intp)
+        self._load()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows"""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _load(self):
+        """Embed exemplars and build the (exemplars + centroids) matrix, grouped by category"""
+        if not os.path.exists(self.exemplars_file):
+            logger.warning(f"Crisis exemplars not found at {self.exemplars_file}, semantic detection disabled")
+            return
+
+        try:
+            with open(self.exemplars_file, "r", encoding="utf-8") as f:
+                categorias = json.load(f)["categorias"]
+
+            textos, contagens = [], []
+            for categoria, dados in categorias.items():
+                self.categories.append(categoria)
+                textos.extend(dados["exemplos"])
+                contagens.append(len(dados["exemplos"]))
+            self.thresholds = np.array([categorias[c]["threshold"] for c in self.categories], dtype=np.float32)
+
+            vetores = self._normalize(np.asarray(self.embeddings.embed_documents(textos), dtype=np.float32))
+
+            # Rows of each category are contiguous: its exemplars, then its centroid
+            blocos, inicio = [], 0
+            for contagem in contagens:
+                exemplares = vetores[inicio:inicio + contagem]
+                blocos.append(exemplares)
+                blocos.append(self._normalize(exemplares.mean(axis=0, keepdims=True)))
+                inicio += contagem
+            self._matrix = np.vstack(blocos)
+            self._starts = np.concatenate(([0], np.cumsum(np.array(contagens) + 1)[:-1])).astype(np.intp)
+
+            logger.info(f"SemanticCrisisDetector initialized ({len(textos)} exemplars, {len(self.categories)} categories)")
+        except Exception as e:
+            logger.error(f"Error loading crisis exemplars: {e}")
+            self.categories = []
+
+    @property
+    def enabled(self) -> bool:
+        """True if exemplars were loaded"""
+        return bool(self.categories)
+
+    def scores(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Best cosine similarity per category
+
+        Args:
+            vectors: (n, d) message embeddings
+
+        Returns:
+            (n, categories) scores
+        """
+        similarities = self._normalize(np.asarray(vectors, dtype=np.float32)) @ self._matrix.T
+        return np.maximum.reduceat(similarities, self._starts, axis=1)
+
+    def detect_many(self, texts: List[str]) -> List[List[Tuple[str, float]]]:
+        """
+        Detect crisis categories for several messages (one embedding batch, one matmul)
+
+        Args:
+            texts: Messages as written (MessageAnalysis.text), the same form as the exemplars
+
+        Returns:
+            For each message, flagged (category, score), highest score first
+        """
+        if not self.enabled or not texts:
+            return [[] for _ in texts]
+
+        scores = self.scores(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+        flagged = scores >= self.thresholds
+        resultados = []
+        for linha, marcados in zip(scores, flagged):
+            indices = np.flatnonzero(marcados)
+            ordem = indices[np.argsort(-linha[indices])]
+            resultados.append([(self.categories[i], float(linha[i])) for i in ordem])
+        return resultados
+
+    def detect(self, text: str) -> List[Tuple[str, float]]:
+        """Detect crisis categories for one message"""
+        return self.detect_many([text])[0]
+
+    async def adetect(self, text: str) -> List[Tuple[str, float]]:
+        """Detect in the thread pool (never blocks the event loop)"""
+        if not self.enabled:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.detect, text)
+
+    def shutdown(self):
+        """Stop the thread pool"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,99 @@
+"""
+Text Analysis - Normalized forms of a message, computed once and shared
+"""
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Cyrillic/Greek lookalikes (after casefold) and invisible characters
+HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "і": "i", "ј": "j", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "һ": "h",
+    "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x", "ω": "w",
+    "ı": "i",
+    "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None, "\u00ad": None,
+})
+
+# Leetspeak, only applied inside tokens that also contain letters ("n40" -> "nao", "3" stays)
+LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+LEET_TOKEN = re.compile(r"\S*[a-z]\S*")
+
+
+def strip_accents(text: str) -> str:
+    """Remove diacritics (compatibility decomposition, combining marks dropped)"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Casefold, strip accents, map homoglyphs and collapse whitespace
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Normalized text ("Não  AGUENTO" -> "nao aguento")
+    """
+    text = text.casefold()
+    if not text.isascii():
+        text = strip_accents(text).translate(HOMOGLYPHS)
+    return " ".join(text.split())
+
+
+def normalize_pattern(pattern: str) -> str:
+    """Normalize a regex or keyword so it matches normalized text (accents only, escapes untouched)"""
+    return strip_accents(pattern) if not pattern.isascii() else pattern
+
+
+class MessageAnalysis:
+    """Normalized forms of one message
+
+    Attributes:
+        text: Original message
+        lower: ``text.lower()`` (what the checks used before normalization)
+        normalized: Casefolded, accent-stripped, homoglyph-mapped, whitespace-collapsed
+        deleet: ``normalized`` with leetspeak mapped inside alphabetic tokens
+        forms: Distinct forms to scan, most literal first
+    """
+
+    __slots__ = ("text", "lower", "normalized", "deleet", "forms")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.normalized = normalize_text(text)
+        self.deleet = LEET_TOKEN.sub(lambda m: m.group(0).translate(LEET), self.normalized)
+        self.forms: Tuple[str, ...] = tuple(dict.fromkeys((self.lower, self.normalized, self.deleet)))
+
+    def __repr__(self) -> str:
+        return f"MessageAnalysis({self.normalized!r})"
+
+
+@lru_cache(maxsize=1024)
+def _analyze(text: str) -> MessageAnalysis:
+    return MessageAnalysis(text)
+
+
+def analyze_message(message: Union[str, MessageAnalysis]) -> MessageAnalysis:
+    """
+    Get the (cached) analysis of a message
+
+    The same message string returns the same object, so SecurityGuard,
+    AlertDetector, ProfessorAgent and LeoAgent share one analysis per message.
+
+    Args:
+        message: Message text or an existing analysis
+
+    Returns:
+        MessageAnalysis
+    """
+    if isinstance(message, MessageAnalysis):
+        return message
+    return _analyze(message)
@@ -0,0 +1,231 @@
+"""
+Usage Store - Compact per-user and per-day API usage counters backed by SQLite
+"""
+import logging
+import sqlite3
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UsageStore:
+    """Per-user, per-day and per-month request/token/cost counters
+
+    Users are interned to a row index; their counters live in three parallel
+    arrays, so a lookup is one dict access plus an array read and memory is a
+    few dozen bytes per student. Only the day partitions of the last
+    ``keep_days`` days are kept; older days are rolled into monthly
+    aggregates. Persistence is incremental: ``changes()`` collects only the
+    rows touched since the last call (absolute values, so a retried write is
+    harmless) and ``write()`` upserts them into SQLite.
+    """
+
+    def __init__(self, db_file: str = "api_stats.db", keep_days: int = 90):
+        """
+        Initialize usage store
+
+        Args:
+            db_file: SQLite database file
+            keep_days: Day partitions to keep before rolling them into months
+        """
+        self.db_file = db_file
+        self.keep_days = keep_days
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._create_schema()
+
+        # Interned users: phone -> row
+        self._index: Dict[str, int] = {}
+        self._users: List[str] = []
+        self._requests = array("q")
+        self._tokens = array("q")
+        self._cost = array("d")
+
+        # "YYYY-MM-DD" / "YYYY-MM" -> [requests, tokens, cost]
+        self.daily: Dict[str, List] = {}
+        self.monthly: Dict[str, List] = {}
+        # quota key -> [window id, count]
+        self.quotas: Dict[str, List] = {}
+
+        self._dirty_users = set()
+        self._dirty_days = set()
+        self._dirty_months = set()
+        self._dirty_quotas = set()
+        self._rolled_days: List[str] = []
+        self._load()
+        self._roll_up(datetime.now().strftime("%Y-%m-%d"))
+
+    def _create_schema(self):
+        """Create tables"""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS usuarios (
+                    user_id TEXT PRIMARY KEY, requests INTEGER, tokens INTEGER, cost REAL
+                );
+                CREATE TABLE IF NOT EXISTS diario (
+                    dia TEXT PRIMARY KEY, requests INTEGER, tokens INTEGER, cost REAL
+                );
+                CREATE TABLE IF NOT EXISTS mensal (
+                    mes TEXT PRIMARY KEY, requests INTEGER, tokens INTEGER, cost REAL
+                );
+                CREATE TABLE IF NOT EXISTS cotas (
+                    chave TEXT PRIMARY KEY, janela TEXT, contagem INTEGER
+                );
+            """)
+            self._conn.commit()
+
+    def _load(self):
+        """Load every counter into memory"""
+        with self._lock:
+            for user_id, requests, tokens, cost in self._conn.execute("SELECT * FROM usuarios"):
+                self._intern(user_id)
+                self._requests[-1], self._tokens[-1], self._cost[-1] = requests, tokens, cost
+            self.daily = {dia: [r, t, c] for dia, r, t, c in self._conn.execute("SELECT * FROM diario")}
+            self.monthly = {mes: [r, t, c] for mes, r, t, c in self._conn.execute("SELECT * FROM mensal")}
+            self.quotas = {chave: [j, n] for chave, j, n in self._conn.execute("SELECT * FROM cotas")}
+        self._dirty_users.clear()
+
+    def _intern(self, user_id: str) -> int:
+        """Row of a user, appending a zeroed row if new"""
+        row = self._index.get(user_id)
+        if row is None:
+            row = self._index[user_id] = len(self._users)
+            self._users.append(user_id)
+            self._requests.append(0)
+            self._tokens.append(0)
+            self._cost.append(0.0)
+            self._dirty_users.add(row)
+        return row
+
+    def _roll_up(self, today: str):
+        """Move day partitions older than keep_days into their month"""
+        cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=self.keep_days)).strftime("%Y-%m-%d")
+        for dia in [d for d in self.daily if d < cutoff]:
+            counters = self.daily.pop(dia)
+            month = self.monthly.setdefault(dia[:7], [0, 0, 0.0])
+            for i in range(3):
+                month[i] += counters[i]
+            self._dirty_days.discard(dia)
+            self._dirty_months.add(dia[:7])
+            self._rolled_days.append(dia)
+
+    def add(self, user_id: Optional[str], tokens: int, cost: float, day: Optional[str] = None):
+        """
+        Count one request
+
+        Args:
+            user_id: Student phone number (None for calls not made for a student)
+            tokens: Tokens used
+            cost: Cost in USD
+            day: "YYYY-MM-DD" (default today)
+        """
+        if user_id is not None:
+            row = self._intern(user_id)
+            self._requests[row] += 1
+            self._tokens[row] += tokens
+            self._cost[row] += cost
+            self._dirty_users.add(row)
+
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        counters = self.daily.get(day)
+        if counters is None:
+            counters = self.daily[day] = [0, 0, 0.0]
+            self._roll_up(day)
+        counters[0] += 1
+        counters[1] += tokens
+        counters[2] += cost
+        self._dirty_days.add(day)
+
+    def user(self, user_id: str) -> Dict:
+        """Counters of a user (O(1))"""
+        row = self._index.get(user_id)
+        if row is None:
+            return {"requests": 0, "tokens": 0, "cost": 0.0}
+        return {"requests": self._requests[row], "tokens": self._tokens[row], "cost": self._cost[row]}
+
+    def user_requests(self, user_id: str) -> int:
+        """Requests of a user (O(1))"""
+        row = self._index.get(user_id)
+        return 0 if row is None else self._requests[row]
+
+    def day(self, day: str) -> Dict:
+        """Counters of a day still kept as a partition"""
+        r, t, c = self.daily.get(day, (0, 0, 0.0))
+        return {"requests": r, "tokens": t, "cost": c}
+
+    def month_cost(self, month: str) -> float:
+        """Cost of a month: rolled-up days plus its day partitions"""
+        rolled = self.monthly.get(month, (0, 0, 0.0))[2]
+        return rolled + sum(c[2] for d, c in self.daily.items() if d.startswith(month))
+
+    def quota(self, key: str) -> Optional[Tuple[str, int]]:
+        """(window id, count) of a quota counter"""
+        value = self.quotas.get(key)
+        return (value[0], value[1]) if value else None
+
+    def set_quota(self, key: str, window_id: str, count: int):
+        """Set a quota counter"""
+        self.quotas[key] = [window_id, count]
+        self._dirty_quotas.add(key)
+
+    def changes(self) -> Dict:
+        """Rows changed since the last call (take it in the event loop thread)"""
+        changes = {
+            "usuarios": [(self._users[r], self._requests[r], self._tokens[r], self._cost[r]) for r in self._dirty_users],
+            "diario": [(d, *self.daily[d]) for d in self._dirty_days],
+            "mensal": [(m, *self.monthly[m]) for m in self._dirty_months],
+            "cotas": [(k, *self.quotas[k]) for k in self._dirty_quotas],
+            "removidos": self._rolled_days,
+        }
+        self._dirty_users, self._dirty_days, self._dirty_months, self._dirty_quotas = set(), set(), set(), set()
+        self._rolled_days = []
+        return changes
+
+    def write(self, changes: Dict):
+        """Upsert changed rows in one transaction (safe from a worker thread)"""
+        with self._lock:
+            with self._conn:
+                for table in ("usuarios", "diario", "mensal"):
+                    if changes[table]:
+                        self._conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)", changes[table])
+                if changes["cotas"]:
+                    self._conn.executemany("INSERT OR REPLACE INTO cotas VALUES (?, ?, ?)", changes["cotas"])
+                if changes["removidos"]:
+                    self._conn.executemany("DELETE FROM diario WHERE dia = ?", [(d,) for d in changes["removidos"]])
+
+    def restore(self, changes: Dict):
+        """Mark rows of a failed write as dirty again"""
+        self._dirty_users.update(self._index[u] for u, *_ in changes["usuarios"])
+        self._dirty_days.update(d for d, *_ in changes["diario"] if d in self.daily)
+        self._dirty_months.update(m for m, *_ in changes["mensal"])
+        self._dirty_quotas.update(k for k, *_ in changes["cotas"])
+        self._rolled_days.extend(changes["removidos"])
+
+    def import_stats(self, by_user: Dict, daily: Dict):
+        """One-time import of the "by_user"/"daily" dicts of an old api_stats.json"""
+        for user_id, usage in by_user.items():
+            row = self._intern(user_id)
+            self._requests[row] += usage.get("requests", 0)
+            self._tokens[row] += usage.get("tokens", 0)
+            self._cost[row] += usage.get("cost", 0.0)
+            self._dirty_users.add(row)
+        for dia, usage in daily.items():
+            counters = self.daily.setdefault(dia, [0, 0, 0.0])
+            counters[0] += usage.get("requests", 0)
+            counters[1] += usage.get("tokens", 0)
+            counters[2] += usage.get("cost", 0.0)
+            self._dirty_days.add(dia)
+        self._roll_up(datetime.now().strftime("%Y-%m-%d"))
+        self.write(self.changes())
+        logger.info(f"Imported {len(by_user)} users and {len(daily)} days into {self.db_file}")
+
+    def close(self):
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
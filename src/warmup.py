@@ -0,0 +1,100 @@
+"""
+Warmup - Background loading of slow startup components and readiness state
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Startup timings plus an ordered list of slow steps run after the server binds
+
+    Components built at import time are timed with ``mark()``. Slow steps
+    (embedding model, FAISS index, crisis exemplars) are registered with
+    ``add()`` and run one after another in a background task started from the
+    lifespan; blocking callables go to a worker thread, coroutine functions
+    are awaited. The service is ready once every step ran. A failed step is
+    logged with its traceback and reported as degraded instead of keeping the
+    service unready forever; the features that depend on it keep using
+    their fallback (e.g. replies without RAG context).
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        """
+        Initialize warmup
+
+        Args:
+            started: perf_counter() taken when the process started importing (default: now)
+        """
+        self.created = started if started is not None else time.perf_counter()
+        self._last_mark = self.created
+        self.startup: Dict[str, float] = {}
+        self.steps: Dict[str, Dict] = {}
+        self.ready = False
+        self._pending: List[Tuple[str, Callable]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, name: str):
+        """Record the time spent since the previous mark (or process start) as ``name``"""
+        now = time.perf_counter()
+        self.startup[name] = now - self._last_mark
+        self._last_mark = now
+
+    def add(self, name: str, func: Callable):
+        """Register a warmup step (blocking callable or coroutine function)"""
+        self._pending.append((name, func))
+
+    async def start(self):
+        """Run the registered steps in the background"""
+        self.startup["until_serving"] = time.perf_counter() - self.created
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel an unfinished warmup"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait(self):
+        """Wait for the warmup to finish (tests and scripts)"""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self):
+        start = time.perf_counter()
+        for name, func in self._pending:
+            step_start = time.perf_counter()
+            self.steps[name] = {"status": "running"}
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    await func()
+                else:
+                    await asyncio.to_thread(func)
+                self.steps[name] = {"status": "ok"}
+            except Exception as e:
+                logger.error(f"Warmup step '{name}' failed: {e}", exc_info=True)
+                self.steps[name] = {"status": "failed", "error": str(e)}
+            self.steps[name]["seconds"] = round(time.perf_counter() - step_start, 3)
+            logger.info(f"Warmup step '{name}': {self.steps[name]['status']} in {self.steps[name]['seconds']}s")
+
+        self.ready = True
+        total = time.perf_counter() - start
+        logger.info(f"Warmup finished in {total:.2f}s ({time.perf_counter() - self.created:.2f}s since startup)")
+
+    def status(self) -> Dict:
+        """Readiness report for the /ready endpoint"""
+        return {
+            "ready": self.ready,
+            "degraded": [name for name, step in self.steps.items() if step["status"] == "failed"],
+            "pending": [name for name, _ in self._pending if name not in self.steps],
+            "startup": {name: round(seconds, 3) for name, seconds in self.startup.items()},
+            "warmup": self.steps,
+        }
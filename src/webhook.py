@@ -1,6 +1,7 @@
 import logging
 from typing import Optional, Dict, Any
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from src.message_processor import MessageProcessor
 
@@ -42,12 +43,13 @@ class WebhookPayload(BaseModel):
     sender: Optional[str] = None
 
 
-def create_webhook_app(message_processor: MessageProcessor) -> FastAPI:
+def create_webhook_app(message_processor: MessageProcessor, warmup=None) -> FastAPI:
     """
     Create FastAPI application with webhook endpoint
     
     Args:
         message_processor: MessageProcessor instance
+        warmup: Optional Warmup whose state is served at /ready
         
     Returns:
         FastAPI application
@@ -123,6 +125,14 @@ def create_webhook_app(message_processor: MessageProcessor) -> FastAPI:
         """Health check endpoint"""
         return {"status": "healthy"}
     
+    @app.get("/ready")
+    async def readiness_check():
+        """Readiness endpoint: 503 until the background warmup has finished"""
+        if warmup is None:
+            return {"ready": True}
+        status = warmup.status()
+        return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+    
     @app.post("/webhook/debug")
     async def webhook_debug(request: Request):
         """Debug endpoint to see raw webhook payloads"""
@@ -0,0 +1,93 @@
+"""
+Microbenchmark do detector de alertas: loop de re.search por padrão vs. PatternMatcher
+
+Gera um corpus de mensagens realistas de alunos (a maioria sem alerta, algumas
+com uma ou mais categorias) e compara o tempo por mensagem e os resultados.
+
+Uso:
+    python -m tests.bench_alert_matcher [--mensagens 50000]
+"""
+import argparse
+import random
+import re
+import time
+from src.alert_detector import AlertDetector
+from src.pattern_matcher import PatternMatcher
+
+NORMAIS = [
+    "oi nino, tudo bem?",
+    "como faço pra resolver equação de segundo grau?",
+    "não entendi a questão 3 da lista de matemática, pode me explicar de novo com calma?",
+    "qual a diferença entre mitose e meiose",
+    "a professora passou um trabalho sobre a revolução francesa pra sexta",
+    "valeu!! agora entendi 😊",
+    "kkkkk muito bom",
+    "me ajuda a fazer uma redação sobre meio ambiente, tem que ter introdução, desenvolvimento e conclusão",
+    "quando é a prova de português?",
+    "to com preguiça de estudar hoje",
+]
+CRITICOS = [
+    "eu não aguento mais essa escola",
+    "acho que vou desistir, não sirvo pra isso",
+    "todo mundo me odeia na sala",
+    "tenho muito medo da prova de amanhã",
+    "meu pai chega bêbado e bate na minha mãe",
+    "queria sumir, ninguém vai sentir minha falta",
+    "se tirar nota baixa de novo vou sair da escola",
+]
+
+
+def gerar_corpus(n: int, taxa_critica: float = 0.02, seed: int = 42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        partes = [rng.choice(NORMAIS) for _ in range(rng.randint(1, 3))]
+        if rng.random() < taxa_critica:
+            partes.insert(rng.randint(0, len(partes)), rng.choice(CRITICOS))
+        corpus.append(" ".join(partes))
+    return corpus
+
+
+def detectar_antigo(mensagem: str):
+    """Algoritmo anterior: um re.search por padrão, primeira categoria encontrada"""
+    mensagem = mensagem.lower()
+    for category, patterns in AlertDetector.CRITICAL_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, mensagem, re.IGNORECASE):
+                return category
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=50000)
+    args = parser.parse_args()
+
+    corpus = gerar_corpus(args.mensagens)
+    matcher = PatternMatcher(AlertDetector.CRITICAL_PATTERNS, AlertDetector.SEVERITY)
+
+    inicio = time.perf_counter()
+    antigos = [detectar_antigo(m) for m in corpus]
+    t_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    novos = [matcher.match(m.lower()) for m in corpus]
+    t_novo = time.perf_counter() - inicio
+
+    # A categoria do algoritmo antigo tem que estar entre as encontradas agora
+    divergencias = sum(
+        1 for antigo, novo in zip(antigos, novos)
+        if (antigo is None) != (not novo) or (antigo and antigo not in {c for c, _ in novo})
+    )
+    multiplas = sum(1 for novo in novos if len(novo) > 1)
+    alertas = sum(1 for novo in novos if novo)
+
+    print(f"📊 {len(corpus):,} mensagens, {alertas} com alerta ({multiplas} com mais de uma categoria)\n")
+    print(f"   re.search por padrão: {t_antigo * 1e6 / len(corpus):7.2f} µs/msg")
+    print(f"   PatternMatcher:       {t_novo * 1e6 / len(corpus):7.2f} µs/msg")
+    print(f"   speedup:              {t_antigo / max(t_novo, 1e-9):7.2f}x")
+    print(f"\n{'✅' if divergencias == 0 else '❌'} divergências: {divergencias}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: tokens acumulados de analytics por conversa (modo completo vs. incremental)
+
+Não chama a API: o LLM é substituído por um que devolve sempre a mesma análise
+e conta os tokens (estimados como em SecurityGuard.estimate_tokens) enviados.
+
+Uso:
+    python -m tests.bench_analytics_tokens [--turns 60] [--every 1]
+"""
+import argparse
+import asyncio
+import json
+from types import SimpleNamespace
+from src.analytics_agent import AgenteAnalista
+from src.security import SecurityGuard
+
+RESPOSTA_FIXA = json.dumps({
+    "engajamento_comportamental": 0.6,
+    "engajamento_emocional": 0.5,
+    "engajamento_cognitivo": 0.6,
+    "score_desmotivacao": 0.43,
+    "observacoes_chave": ["Como somar frações com denominadores diferentes?"]
+})
+
+
+class CountingLLM:
+    """LLM falso que soma os tokens de entrada de cada chamada"""
+
+    def __init__(self):
+        self.guard = SecurityGuard()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.prompt_tokens += sum(self.guard.estimate_tokens(m.content) for m in messages)
+        self.completion_tokens += self.guard.estimate_tokens(RESPOSTA_FIXA)
+        return SimpleNamespace(content=RESPOSTA_FIXA)
+
+
+def gerar_conversa(turns: int):
+    """Gera uma conversa sintética com respostas de tamanho realista"""
+    historico = []
+    for i in range(turns):
+        historico.append({"role": "user", "content": f"Nino, tenho outra dúvida sobre a questão {i} da tarefa de matemática, pode me ajudar?"})
+        historico.append({"role": "assistant", "content": (
+            f"Claro! Na questão {i} a ideia é achar o MMC dos denominadores primeiro, "
+            "depois transformar as frações e somar os numeradores. Faz sentido? 📚"
+        )})
+    return historico
+
+
+async def medir(turns: int, every: int, incremental: bool):
+    agente = AgenteAnalista(api_key="bench", incremental=incremental)
+    agente.llm = CountingLLM()
+    agente._save_alert = lambda aluno_id, analise: None
+
+    conversa = gerar_conversa(turns)
+    for turn in range(1, turns + 1):
+        if turn % every == 0:
+            await agente.analisar_conversa("5581000000000", conversa[:turn * 2])
+
+    return agente.llm
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60, help="mensagens do aluno na conversa")
+    parser.add_argument("--every", type=int, default=1, help="analisar a cada N mensagens")
+    args = parser.parse_args()
+
+    print(f"📊 Conversa com {args.turns} mensagens do aluno, análise a cada {args.every}\n")
+    print(f"{'modo':<12} {'chamadas':>9} {'tokens entrada':>15} {'tokens saída':>13}")
+
+    resultados = {}
+    for nome, incremental in (("completo", False), ("incremental", True)):
+        llm = await medir(args.turns, args.every, incremental)
+        resultados[nome] = llm.prompt_tokens
+        print(f"{nome:<12} {llm.calls:>9} {llm.prompt_tokens:>15} {llm.completion_tokens:>13}")
+
+    reducao = 1 - resultados["incremental"] / resultados["completo"]
+    print(f"\n✅ Redução de tokens de entrada: {reducao:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Benchmark da gravação do CostMonitor com dezenas de milhares de alunos:
+JSON completo (by_user/daily no api_stats.json) vs. UsageStore incremental
+
+Uso:
+    python -m tests.bench_cost_monitor [--alunos 50000] [--dias 365]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from src.cost_monitor import CostMonitor
+
+
+def stats_antigo(alunos, dias):
+    hoje = datetime.now()
+    return {
+        "total_requests": alunos * 10, "total_tokens": alunos * 3000, "total_cost": 0.0, "by_provider": {},
+        "by_user": {f"5581{i:09d}": {"requests": 10, "tokens": 3000, "cost": 0.0} for i in range(alunos)},
+        "daily": {
+            (hoje - timedelta(days=d)).strftime("%Y-%m-%d"): {"requests": alunos // 10, "tokens": 0, "cost": 0.0}
+            for d in range(dias)
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alunos", type=int, default=50000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--lote", type=int, default=50, help="requisições por gravação (COST_FLUSH_EVERY)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        antigo = stats_antigo(args.alunos, args.dias)
+
+        # Antes: cada gravação serializava o dicionário inteiro
+        inicio = time.perf_counter()
+        dados = json.dumps(antigo, separators=(",", ":"))
+        with open(arquivo, "w") as f:
+            f.write(dados)
+        gravacao_antiga = time.perf_counter() - inicio
+        tamanho_antigo = len(dados)
+
+        inicio = time.perf_counter()
+        monitor = CostMonitor(arquivo, flush_every=10 ** 9)
+        migracao = time.perf_counter() - inicio
+
+        # Depois: um lote de requisições de alunos diferentes e uma gravação incremental
+        for i in range(args.lote):
+            monitor.log_request("groq", "llama-3.3-70b-versatile", 300, f"5581{i * 997 % args.alunos:09d}")
+        inicio = time.perf_counter()
+        monitor._save_stats()
+        gravacao_nova = time.perf_counter() - inicio
+        tamanho_novo = os.path.getsize(arquivo)
+
+        inicio = time.perf_counter()
+        for i in range(100000):
+            monitor.check_user_limit(f"5581{i % args.alunos:09d}")
+        limite = (time.perf_counter() - inicio) / 100000
+
+    print(f"📊 {args.alunos} alunos, {args.dias} dias, gravação a cada {args.lote} requisições\n")
+    print(f"   JSON completo:       {gravacao_antiga * 1000:8.1f} ms por gravação, {tamanho_antigo / 1024:8.0f} KiB")
+    print(f"   UsageStore + JSON:   {gravacao_nova * 1000:8.1f} ms por gravação, {tamanho_novo:8d} bytes de JSON")
+    print(f"   migração única:      {migracao * 1000:8.1f} ms")
+    print(f"   check_user_limit:    {limite * 1e6:8.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
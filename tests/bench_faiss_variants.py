@@ -0,0 +1,180 @@
+"""
+Benchmark das variantes do índice FAISS e do formato compacto (sem pickle)
+
+Para N trechos (padrão 50.000, o tamanho de uma rede de escolas) mede cada
+variante do prep_rag.py --index-type:
+    tamanho      - index.faiss no disco
+    build        - treino + inserção
+    recall@5     - fração dos 5 vizinhos exatos (flat) encontrados
+    p50 / p95    - latência de uma busca k=5
+    RSS          - memória de um worker que carregou a versão e fez 200 buscas,
+                   medida num processo novo: "privada" (RssAnon, não é
+                   compartilhada) e "arquivo" (RssFile, páginas do cache do
+                   sistema, compartilhadas entre os workers que mapeiam o
+                   mesmo arquivo), com mmap e lendo tudo para a memória
+
+E o docstore: index.pkl do LangChain vs. chunks.bin + offsets, tempo de
+carga e memória privada.
+
+Os vetores sintéticos (384 dimensões, em grupos) são mais difíceis para PQ
+que embeddings reais; com --manifesto faiss_index o benchmark usa os vetores
+do MiniLM gravados pelo prep_rag.py.
+
+Uso:
+    python -m tests.bench_faiss_variants [--trechos 50000] [--manifesto faiss_index]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+TIPOS = ("flat", "f16", "pq", "ivfpq")
+BUSCAS = 200
+
+
+def vetores_sinteticos(quantidade, dimensao=384, semente=0):
+    """Vetores normalizados em grupos de ~50 trechos parecidos, mais consultas da mesma distribuição"""
+    rng = np.random.default_rng(semente)
+    centros = rng.standard_normal((max(1, quantidade // 50), dimensao)).astype(np.float32)
+
+    def amostra(n):
+        vetores = centros[rng.integers(0, len(centros), n)] + 0.5 * rng.standard_normal((n, dimensao))
+        return (vetores / np.linalg.norm(vetores, axis=1, keepdims=True)).astype(np.float32)
+
+    return amostra(quantidade), amostra(BUSCAS)
+
+
+def vetores_do_manifesto(pasta, consultas=BUSCAS):
+    """Vetores do MiniLM do manifest.json do prep_rag; consultas = trechos com ruído"""
+    with open(os.path.join(pasta, "manifest.json"), "r", encoding="utf-8") as f:
+        vetores = np.load(os.path.join(pasta, json.load(f)["vectors"]))
+    rng = np.random.default_rng(0)
+    escolhidos = vetores[rng.integers(0, len(vetores), consultas)]
+    return vetores, (escolhidos + 0.02 * rng.standard_normal(escolhidos.shape)).astype(np.float32)
+
+
+def textos_sinteticos(quantidade):
+    from tests.bench_prep_rag import MATERIAS, MESES, PARAGRAFO
+    return [PARAGRAFO.format(serie=6 + i % 4, materia=MATERIAS[i % 6], dia=1 + i % 28, mes=MESES[i % 6],
+                             cap=i % 20, cap2=i % 20 + 2) * 2 for i in range(quantidade)]
+
+
+def medir_processo(pasta, modo, consultas):
+    """Carrega uma versão num processo novo; devolve segundos de carga e RSS (MB) acima do processo vazio"""
+    saida = subprocess.run(
+        [sys.executable, "-m", "tests.bench_faiss_variants", "--_carregar", pasta, modo, consultas],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def memoria():
+    campos = {}
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith(("RssAnon:", "RssFile:")):
+                nome, valor, _ = linha.split()
+                campos[nome.rstrip(":")] = int(valor) / 1024
+    return campos
+
+
+def carregar(pasta, modo, consultas):
+    """Executado no processo filho: carrega, busca e imprime as medidas em JSON"""
+    from langchain_community.vectorstores import FAISS
+    from src.compact_index import load_version
+    from tests.test_rag_service import LentoEmbeddings
+
+    embeddings = LentoEmbeddings()
+    vetores = np.load(consultas)
+    antes = memoria()
+    inicio = time.perf_counter()
+    if modo == "pickle":
+        vs = FAISS.load_local(pasta, embeddings, allow_dangerous_deserialization=True)
+    else:
+        vs = load_version(pasta, embeddings, use_mmap=(modo == "mmap"))
+    carga = time.perf_counter() - inicio
+    for vetor in vetores:
+        vs.similarity_search_by_vector(vetor.tolist(), k=5)
+    depois = memoria()
+    print(json.dumps({"carga": carga, **{nome: depois[nome] - antes[nome] for nome in depois}}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trechos", type=int, default=50000)
+    parser.add_argument("--manifesto", default=None, help="pasta do índice com manifest.json (vetores reais)")
+    parser.add_argument("--_carregar", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args._carregar:
+        carregar(*args._carregar)
+        return
+
+    logging.disable(logging.WARNING)
+    from langchain_community.vectorstores import FAISS
+    from src.compact_index import build_faiss_index, write_version
+    from tests.test_rag_service import LentoEmbeddings
+
+    if args.manifesto:
+        vetores, consultas = vetores_do_manifesto(args.manifesto)
+    else:
+        vetores, consultas = vetores_sinteticos(args.trechos)
+    textos = textos_sinteticos(len(vetores))
+    metadados = [{"source": f"documentos_escola/escola_{i % 40:02d}/aviso_{i // 40:05d}.txt"}
+                 for i in range(len(vetores))]
+    print(f"{len(vetores)} trechos de {vetores.shape[1]} dimensões, {BUSCAS} consultas, CPUs: {os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo_consultas = os.path.join(tmp, "consultas.npy")
+        np.save(arquivo_consultas, consultas)
+        exatos = None
+
+        print(f"\n{'tipo':>6} {'tamanho':>9} {'build':>8} {'recall@5':>9} {'p50':>8} {'p95':>8} "
+              f"{'privada mmap':>13} {'arquivo mmap':>13} {'privada cópia':>14}")
+        for tipo in TIPOS:
+            inicio = time.perf_counter()
+            indice = build_faiss_index(vetores, tipo)
+            build = time.perf_counter() - inicio
+
+            tempos = []
+            achados = []
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                achados.append(indice.search(consulta[None, :], 5)[1][0])
+                tempos.append(time.perf_counter() - inicio)
+            achados = np.asarray(achados)
+            if exatos is None:
+                exatos = achados
+            recall = np.mean([len(set(a) & set(e)) / 5 for a, e in zip(achados, exatos)])
+
+            pasta = os.path.join(tmp, tipo)
+            os.makedirs(pasta)
+            write_version(pasta, indice, textos, metadados)
+            mapeado = medir_processo(pasta, "mmap", arquivo_consultas)
+            copia = medir_processo(pasta, "copia", arquivo_consultas)
+            tamanho = os.path.getsize(os.path.join(pasta, "index.faiss")) / 2 ** 20
+            p50, p95 = np.percentile(tempos, [50, 95]) * 1000
+            print(f"{tipo:>6} {tamanho:>7.1f}MB {build:>7.2f}s {recall:>9.3f} {p50:>6.3f}ms {p95:>6.3f}ms "
+                  f"{mapeado['RssAnon']:>11.1f}MB {mapeado['RssFile']:>11.1f}MB {copia['RssAnon']:>12.1f}MB")
+
+        # Docstore: pickle do LangChain vs. formato compacto (mesmo índice flat)
+        pasta_pickle = os.path.join(tmp, "pickle")
+        FAISS.from_embeddings(list(zip(textos, vetores)), LentoEmbeddings(), metadatas=metadados).save_local(pasta_pickle)
+        docstores = {
+            "index.pkl": (os.path.getsize(os.path.join(pasta_pickle, "index.pkl")),
+                          medir_processo(pasta_pickle, "pickle", arquivo_consultas)),
+            "compacto": (sum(os.path.getsize(os.path.join(tmp, "flat", nome))
+                             for nome in os.listdir(os.path.join(tmp, "flat")) if nome != "index.faiss"),
+                         medir_processo(os.path.join(tmp, "flat"), "mmap", arquivo_consultas)),
+        }
+        print(f"\n{'docstore':>10} {'tamanho':>9} {'carga':>8} {'privada':>9}")
+        for nome, (tamanho, medidas) in docstores.items():
+            print(f"{nome:>10} {tamanho / 2 ** 20:>7.1f}MB {medidas['carga']:>7.2f}s {medidas['RssAnon']:>7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark de partida a frio: ``python -X importtime -c "import main"``
+
+Roda o import do main.py em processos novos (arquivos de estado num diretório
+temporário, para não mexer nos do projeto), mostra a mediana do tempo total,
+os módulos importados diretamente pelo main mais caros e confere o orçamento:
+
+    - tempo total de import abaixo de ORCAMENTO_MS
+    - nenhum módulo de MODULOS_ADIADOS carregado no import (SDKs dos provedores,
+      FAISS e embeddings só entram no aquecimento ou no primeiro uso)
+
+Sai com código 1 se o orçamento estourar, para rodar em CI a cada release.
+
+Uso:
+    python -m tests.bench_import_time [--rodadas 5] [--orcamento-ms 2500]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamento do import do main.py (ms, mediana). Medido em 1 CPU: ~3700 ms antes
+# dos imports adiados, ~1700 ms depois; a folga cobre máquinas mais lentas.
+ORCAMENTO_MS = 2500
+
+MODULOS_ADIADOS = [
+    "langchain_openai", "openai", "langchain_groq", "groq", "langchain_community",
+    "faiss", "sentence_transformers", "torch",
+]
+
+
+def importar_main(pasta):
+    """Importa main num processo novo e devolve [(nivel, modulo, proprio_us, acumulado_us)]"""
+    env = dict(
+        os.environ,
+        LLM_API_KEY=os.environ.get("LLM_API_KEY", "bench"),
+        EVOLUTION_API_URL=os.environ.get("EVOLUTION_API_URL", "http://localhost:8080"),
+        COST_STATS_FILE=os.path.join(pasta, "api_stats.json"),
+        COST_USAGE_DB=os.path.join(pasta, "api_stats.db"),
+        ENGAGEMENT_DB_FILE=os.path.join(pasta, "engajamento.db"),
+        ALERT_NOTIFICATIONS_FILE=os.path.join(pasta, "notifications.jsonl"),
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=RAIZ, env=env, capture_output=True, text=True, check=True
+    ).stderr
+
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|")
+        nivel = (len(nome) - len(nome.lstrip())) // 2
+        modulos.append((nivel, nome.strip(), int(proprio), int(acumulado)))
+    return modulos
+
+
+def medir(rodadas):
+    """Mediana do import do main (ms), módulos da última rodada"""
+    totais = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for _ in range(rodadas):
+            modulos = importar_main(pasta)
+            totais.append(next(acumulado for _, nome, _, acumulado in modulos if nome == "main") / 1000)
+    return statistics.median(totais), totais, modulos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_MS)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    mediana, totais, modulos = medir(args.rodadas)
+    carregados = {nome for _, nome, _, _ in modulos}
+    adiantados = sorted(m for m in MODULOS_ADIADOS if m in carregados)
+
+    print(f"import main: mediana {mediana:.0f} ms ({', '.join(f'{t:.0f}' for t in totais)})")
+    print(f"\nMais caros importados pelo main (acumulado):")
+    diretos = sorted((m for m in modulos if m[0] == 1), key=lambda m: -m[3])
+    for _, nome, _, acumulado in diretos[:args.top]:
+        print(f"  {acumulado / 1000:>8.1f} ms  {nome}")
+    proprio_main = next(proprio for _, nome, proprio, _ in modulos if nome == "main")
+    print(f"  {proprio_main / 1000:>8.1f} ms  (código do main.py: criação dos componentes)")
+
+    ok = mediana <= args.orcamento_ms and not adiantados
+    print(f"\nOrçamento: {mediana:.0f} / {args.orcamento_ms:.0f} ms"
+          f"{'' if not adiantados else f'; carregados no import: {adiantados}'} -> {'OK' if ok else 'ESTOUROU'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
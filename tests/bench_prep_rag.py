@@ -0,0 +1,118 @@
+"""
+Benchmark do prep_rag.py: reconstrução completa sequencial (antes) vs.
+build_index com manifesto por hash, divisão em processos e embeddings em lotes
+
+Para 10, 1.000 e 10.000 documentos sintéticos (avisos de ~1,5 KB, 4 trechos
+cada) mede:
+    antes        - lê, divide e calcula tudo em sequência (como o prep_rag antigo)
+    frio         - build_index sem manifesto (primeira execução)
+    sem mudança  - segunda execução, nenhum arquivo alterado
+    +1 doc       - um aviso novo de professor
+
+O modelo sintético custa 5 ms por chamada + 0,3 ms por texto, com sleep (como
+o MiniLM, libera o GIL); com --threads > 1 as chamadas se sobrepõem de forma
+ideal, o que numa CPU pequena com o modelo real não acontece por completo. O
+ganho de "sem mudança" e "+1 doc" não depende disso.
+
+Uso:
+    python -m tests.bench_prep_rag [--tamanhos 10 1000 10000] [--workers N] [--threads 2] [--lote 64]
+"""
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import time
+import zlib
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.rag_ingest import build_index
+
+PARAGRAFO = ("Atenção turma do {serie}º ano: a prova de {materia} será no dia {dia} de {mes}. "
+             "O conteúdo inclui os capítulos {cap} a {cap2} do livro, com exercícios de revisão "
+             "e uma questão dissertativa. Tragam lápis, borracha e calculadora. ")
+MATERIAS = ["matemática", "português", "história", "geografia", "ciências", "inglês"]
+MESES = ["março", "abril", "maio", "junho", "agosto", "setembro"]
+
+
+class CustoMiniLM:
+    """Vetores determinísticos de 384 dimensões com o custo aproximado do MiniLM em CPU"""
+
+    def __init__(self, por_chamada=0.005, por_texto=0.0003):
+        self.por_chamada = por_chamada
+        self.por_texto = por_texto
+        self.textos = 0
+
+    def embed_documents(self, textos):
+        time.sleep(self.por_chamada + self.por_texto * len(textos))
+        self.textos += len(textos)
+        return [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(384, dtype=np.float32)
+                for t in textos]
+
+    def embed_query(self, texto):
+        return self.embed_documents([texto])[0]
+
+
+def gerar_documentos(pasta, quantidade, inicio=0):
+    os.makedirs(pasta, exist_ok=True)
+    for i in range(inicio, inicio + quantidade):
+        texto = "".join(PARAGRAFO.format(serie=6 + i % 4, materia=MATERIAS[(i + j) % 6], dia=1 + (i + j) % 28,
+                                         mes=MESES[j % 6], cap=i % 20 + j, cap2=i % 20 + j + 2)
+                        for j in range(6))
+        with open(os.path.join(pasta, f"professor_msg_{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+def reconstruir_tudo(pasta, indice, embeddings):
+    """O prep_rag antigo: tudo em sequência, a cada execução"""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    textos, metadados = [], []
+    for caminho in sorted(glob.glob(os.path.join(pasta, "**", "*.txt"), recursive=True)):
+        with open(caminho, "r", encoding="utf-8") as f:
+            trechos = splitter.split_text(f.read())
+        textos.extend(trechos)
+        metadados.extend({"source": caminho} for _ in trechos)
+    vetores = []
+    for i in range(0, len(textos), 32):  # lotes internos do HuggingFaceEmbeddings
+        vetores.extend(embeddings.embed_documents(textos[i:i + 32]))
+    FAISS.from_embeddings(list(zip(textos, vetores)), embeddings, metadatas=metadados).save_local(indice)
+    return len(textos)
+
+
+def cronometrar(funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--lote", type=int, default=64)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    opcoes = {"workers": args.workers, "threads": args.threads, "batch_size": args.lote}
+
+    print(f"CPUs: {os.cpu_count()}  workers: {args.workers or 'CPUs'}  threads: {args.threads}  lote: {args.lote}")
+    print(f"{'docs':>6} {'trechos':>8} {'antes':>9} {'frio':>9} {'sem mudança':>12} {'+1 doc':>9} {'recalculados':>13}")
+    for quantidade in args.tamanhos:
+        with tempfile.TemporaryDirectory() as tmp:
+            pasta = os.path.join(tmp, "documentos_escola")
+            gerar_documentos(pasta, quantidade)
+
+            antes, trechos = cronometrar(reconstruir_tudo, pasta, os.path.join(tmp, "antigo"), CustoMiniLM())
+            indice = os.path.join(tmp, "faiss_index")
+            frio, _ = cronometrar(build_index, pasta, indice, embeddings=CustoMiniLM(), **opcoes)
+            quente, _ = cronometrar(build_index, pasta, indice, embeddings=CustoMiniLM(), **opcoes)
+            gerar_documentos(pasta, 1, inicio=quantidade)
+            novo, relatorio = cronometrar(build_index, pasta, indice, embeddings=CustoMiniLM(), **opcoes)
+
+            print(f"{quantidade:>6} {trechos:>8} {antes:>8.2f}s {frio:>8.2f}s {quente:>11.2f}s "
+                  f"{novo:>8.2f}s {relatorio['embedded']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark do atraso do loop de eventos sob carga de RAG: search() síncrono
+chamado dentro da corrotina (antes) vs. asearch() com thread pool e micro-batching
+
+Um relógio acorda a cada 5 ms e mede o atraso de cada despertar enquanto N
+alunos consultam o RAG ao mesmo tempo. Por padrão usa embeddings sintéticos
+com o custo aproximado do MiniLM em CPU (15 ms por chamada + 1 ms por texto);
+``--minilm`` usa o modelo real e o ./faiss_index. Os caches ficam desligados
+para medir o caminho completo.
+
+Uso:
+    python -m tests.bench_rag_event_loop [--minilm] [--rodadas 5]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+import numpy as np
+from src.rag_service import RAGService
+from tests.test_rag_service import LentoEmbeddings, criar_indice
+
+PERGUNTAS = [
+    "quando é a prova de matemática?", "qual a tarefa de português?", "quando começa o recesso?",
+    "onde vai ser a feira de ciências?", "o que cai na prova de história?", "tem trabalho pra amanhã?",
+]
+
+
+class CustoMiniLM(LentoEmbeddings):
+    """Custo fixo por chamada mais custo por texto"""
+
+    def embed_documents(self, textos):
+        time.sleep(0.001 * len(textos))
+        return super().embed_documents(textos)
+
+
+async def medir(rag, concorrencia, rodadas, assincrono):
+    atrasos = []
+    parar = False
+
+    async def relogio():
+        while not parar:
+            inicio = time.perf_counter()
+            await asyncio.sleep(0.005)
+            atrasos.append(time.perf_counter() - inicio - 0.005)
+
+    async def aluno(i):
+        pergunta = PERGUNTAS[i % len(PERGUNTAS)]
+        if assincrono:
+            await rag.asearch(pergunta)
+        else:
+            rag.search(pergunta)  # como LeoAgent fazia: direto na corrotina
+        await asyncio.sleep(0)
+
+    tarefa = asyncio.create_task(relogio())
+    await asyncio.sleep(0.02)
+    inicio = time.perf_counter()
+    for _ in range(rodadas):
+        await asyncio.gather(*(aluno(i) for i in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    parar = True
+    await tarefa
+    return np.array(atrasos) * 1000, concorrencia * rodadas / duracao
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minilm", action="store_true", help="usa o MiniLM e o ./faiss_index")
+    parser.add_argument("--rodadas", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.minilm:
+            rag = RAGService(api_key=None, embedding_cache_size=0, result_cache_size=0)
+        else:
+            rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=CustoMiniLM(atraso=0.015),
+                             embedding_cache_size=0, result_cache_size=0)
+
+        print(f"{'alunos':>6} {'modo':<10} {'atraso p50':>11} {'p99':>9} {'máx':>9} {'consultas/s':>12} {'lotes':>6}")
+        for concorrencia in (1, 8, 32):
+            for assincrono in (False, True):
+                rag.stats = {"queries": 0, "batches": 0}
+                atrasos, vazao = asyncio.run(medir(rag, concorrencia, args.rodadas, assincrono))
+                print(
+                    f"{concorrencia:>6} {'asearch' if assincrono else 'search':<10} "
+                    f"{np.percentile(atrasos, 50):>9.1f}ms {np.percentile(atrasos, 99):>7.1f}ms "
+                    f"{atrasos.max():>7.1f}ms {vazao:>12.0f} {rag.stats['batches'] if assincrono else '-':>6}"
+                )
+        rag.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark do SecurityGuard em entradas de pior caso de 2.000 caracteres
+(o limite de sanitize_input): algoritmo anterior vs. scanner linear
+
+Uso:
+    python -m tests.bench_security_scan [--repeticoes 200]
+"""
+import argparse
+import logging
+import time
+from src.security import SecurityGuard
+from tests.test_security import veredicto_antigo, veredicto_novo
+
+TAMANHO = 2000
+
+
+def entradas_pior_caso():
+    return {
+        # Cada caractere distinto custava um message.count()
+        "caracteres distintos": "".join(chr(0x4E00 + i) for i in range(TAMANHO)),
+        # Cada palavra distinta custava um words.count()
+        "palavras distintas": " ".join(f"p{i}" for i in range(TAMANHO))[:TAMANHO],
+        # Sequências de 9 iguais (nunca chegam a 10)
+        "quase repetição": ("a" * 9 + "b" * 9) * (TAMANHO // 18),
+        # Quase injeções: prefixos que forçam tentativas em vários padrões
+        "quase injeção": ("ignore previous act as system sudo dan " * 60)[:TAMANHO],
+        "mensagem normal": " ".join(
+            f"não entendi a questão {i} de frações, pode explicar de novo?" for i in range(40)
+        )[:TAMANHO],
+    }
+
+
+def medir(funcao, mensagem, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(mensagem)
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    guard = SecurityGuard()
+    print(f"📊 Entradas de {TAMANHO} caracteres, {args.repeticoes} repetições\n")
+    print(f"{'entrada':<22} {'anterior':>12} {'linear':>12} {'speedup':>9}  veredicto")
+    for nome, mensagem in entradas_pior_caso().items():
+        antigo = medir(veredicto_antigo, mensagem, args.repeticoes)
+        novo = medir(lambda m: veredicto_novo(guard, m), mensagem, args.repeticoes)
+        igual = veredicto_antigo(mensagem) == veredicto_novo(guard, mensagem)
+        print(f"{nome:<22} {antigo * 1e6:>9.1f} µs {novo * 1e6:>9.1f} µs {antigo / novo:>8.1f}x  "
+              f"{'✅' if igual else '❌'} {veredicto_novo(guard, mensagem) or 'ok'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Relatório de calibração do pré-avaliador local contra os scores do LLM em alertas.json
+
+alertas.json não guarda as transcrições, então cada registro é reconstruído a
+partir das observacoes_chave (frases do aluno que justificaram a análise).
+O relatório mostra erro por pilar, correlação e a matriz do gate
+(escalar para o LLM vs. risco real do LLM).
+
+Uso:
+    python -m tests.calibrate_prescorer [--alertas alertas.json] [--risco 0.5]
+"""
+import argparse
+import json
+import time
+import numpy as np
+from src.engagement_prescorer import EngagementPreScorer
+
+PILARES = [
+    "engajamento_comportamental",
+    "engajamento_emocional",
+    "engajamento_cognitivo",
+    "score_desmotivacao",
+]
+
+
+def carregar_registros(caminho: str):
+    with open(caminho, "r", encoding="utf-8") as f:
+        registros = json.load(f)
+    return [r for r in registros if r.get("observacoes_chave")]
+
+
+def reconstruir_historico(registro):
+    """Uma mensagem do aluno por observação, intercaladas com respostas do Nino"""
+    historico = []
+    for frase in registro["observacoes_chave"]:
+        historico.append({"role": "user", "content": frase})
+        historico.append({"role": "assistant", "content": "Entendi, me conta mais?"})
+    return historico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alertas", default="alertas.json")
+    parser.add_argument("--risco", type=float, default=0.5, help="risco do LLM considerado relevante")
+    args = parser.parse_args()
+
+    registros = carregar_registros(args.alertas)
+    historicos = [reconstruir_historico(r) for r in registros]
+    scorer = EngagementPreScorer(min_messages=1)
+
+    inicio = time.perf_counter()
+    local = scorer.score(historicos)
+    duracao = time.perf_counter() - inicio
+
+    print(f"📊 Calibração com {len(registros)} análises do LLM ({args.alertas})\n")
+    print(f"{'pilar':<28} {'MAE':>6} {'viés':>7} {'r':>6}")
+    for pilar in PILARES:
+        llm = np.array([r[pilar] for r in registros], dtype=np.float64)
+        est = local[pilar]
+        erro = est - llm
+        r = np.corrcoef(est, llm)[0, 1] if len(llm) > 1 and est.std() > 0 and llm.std() > 0 else float("nan")
+        print(f"{pilar:<28} {np.abs(erro).mean():>6.2f} {erro.mean():>+7.2f} {r:>6.2f}")
+
+    risco_llm = np.array([r["score_desmotivacao"] for r in registros]) >= args.risco
+    escalar = local["escalate"]
+    print(f"\n🚦 Gate (risco LLM ≥ {args.risco})")
+    print(f"   escalado e relevante:      {int(np.sum(escalar & risco_llm))}")
+    print(f"   escalado sem necessidade:  {int(np.sum(escalar & ~risco_llm))}")
+    print(f"   não escalado (correto):    {int(np.sum(~escalar & ~risco_llm))}")
+    print(f"   não escalado (PERDIDO):    {int(np.sum(~escalar & risco_llm))}")
+    if risco_llm.any():
+        print(f"   recall dos casos de risco: {np.mean(escalar[risco_llm]):.0%}")
+    print(f"   chamadas ao LLM evitadas:  {np.mean(~escalar):.0%}")
+
+    print("\n📝 Por registro")
+    for registro, est, esc in zip(registros, local["score_desmotivacao"], escalar):
+        marca = "→ LLM" if esc else "local"
+        print(f"   {registro['aluno_id']:<15} LLM={registro['score_desmotivacao']:.2f} local={est:.2f} {marca}")
+
+    print(f"\n⏱️ {len(historicos) / max(duracao, 1e-9):,.0f} conversas/s")
+
+
+if __name__ == "__main__":
+    main()
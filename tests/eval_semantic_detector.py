@@ -0,0 +1,151 @@
+"""
+Relatório offline do detector semântico de crise: precisão/recall e latência
+
+Compara só regex (AlertDetector.CRITICAL_PATTERNS) com regex + detector
+semântico num conjunto rotulado de paráfrases que não aparecem em
+config/crisis_exemplars.json, mais mensagens normais de alunos. Usa o mesmo
+MiniLM do RAGService.
+
+Uso:
+    python -m tests.eval_semantic_detector [--exemplos config/crisis_exemplars.json] [--delta 0.0]
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from src.alert_detector import AlertDetector
+from src.semantic_detector import SemanticCrisisDetector
+from src.text_analysis import analyze_message
+
+# (mensagem, categoria esperada ou None)
+CONJUNTO = [
+    ("tô pensando em sumir do mapa", "self_harm"),
+    ("às vezes acho que seria melhor não existir", "self_harm"),
+    ("não tenho mais vontade de nada, nem de acordar", "self_harm"),
+    ("se eu sumisse ninguém ia perceber", "self_harm"),
+    ("queria desaparecer de vez", "self_harm"),
+    ("to cansado de viver", "self_harm"),
+    ("não aguento mais", "self_harm"),
+    ("acho que vou parar de ir pra escola", "dropout_risk"),
+    ("ano que vem vou trabalhar com meu tio e largar o estudo", "dropout_risk"),
+    ("não faz sentido continuar no colégio", "dropout_risk"),
+    ("minha mãe disse que eu vou ter que sair da escola", "dropout_risk"),
+    ("vou desistir", "dropout_risk"),
+    ("a galera da sala vive tirando sarro de mim", "bullying"),
+    ("me xingaram de novo no intervalo", "bullying"),
+    ("criaram um grupo só pra falar mal de mim", "bullying"),
+    ("ninguém deixa eu jogar bola com eles no recreio", "bullying"),
+    ("sofro bullying", "bullying"),
+    ("meu pai bebe e fica agressivo", "family_issues"),
+    ("em casa ninguém se fala, só gritam", "family_issues"),
+    ("hoje não tinha nada pra comer de novo", "family_issues"),
+    ("tenho medo do meu padrasto", "family_issues"),
+    ("passo fome", "family_issues"),
+    ("só de pensar na prova minhas mãos suam e eu travo", "severe_anxiety"),
+    ("fico nervoso demais e esqueço tudo na hora", "severe_anxiety"),
+    ("não consegui dormir de tanta ansiedade", "severe_anxiety"),
+    ("meu peito aperta quando a professora me chama", "severe_anxiety"),
+    ("entro em pânico", "severe_anxiety"),
+    ("oi nino, tudo bem?", None),
+    ("me explica equação de segundo grau", None),
+    ("quando é a prova de história?", None),
+    ("valeu, agora entendi!", None),
+    ("qual é a tarefa pra amanhã?", None),
+    ("a professora passou um trabalho sobre a segunda guerra", None),
+    ("não entendi a questão 4", None),
+    ("como faço uma redação dissertativa?", None),
+    ("hoje a aula de educação física foi muito boa", None),
+    ("meu time ganhou ontem kkkk", None),
+    ("to com preguiça de estudar hoje", None),
+    ("o que é fotossíntese?", None),
+    ("a prova foi difícil mas acho que fui bem", None),
+    ("sumiu minha borracha na sala", None),
+    ("meu irmão apagou meu desenho", None),
+    ("quero desistir dessa questão, é muito difícil", None),
+    ("minha mãe fez bolo hoje", None),
+    ("tenho que apresentar trabalho amanhã, me ajuda a treinar?", None),
+    ("o que cai na prova de matemática?", None),
+]
+
+
+def metricas(esperado, previsto, categorias):
+    linhas = []
+    for categoria in categorias:
+        vp = sum(1 for e, p in zip(esperado, previsto) if e == categoria and categoria in p)
+        fp = sum(1 for e, p in zip(esperado, previsto) if e != categoria and categoria in p)
+        fn = sum(1 for e, p in zip(esperado, previsto) if e == categoria and categoria not in p)
+        precisao = vp / (vp + fp) if vp + fp else float("nan")
+        recall = vp / (vp + fn) if vp + fn else float("nan")
+        linhas.append((categoria, precisao, recall))
+
+    crise = [e is not None for e in esperado]
+    marcado = [bool(p) for p in previsto]
+    vp = sum(c and m for c, m in zip(crise, marcado))
+    fp = sum(m and not c for c, m in zip(crise, marcado))
+    fn = sum(c and not m for c, m in zip(crise, marcado))
+    linhas.append(("qualquer crise", vp / (vp + fp) if vp + fp else float("nan"), vp / (vp + fn) if vp + fn else float("nan")))
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exemplos", default="config/crisis_exemplars.json")
+    parser.add_argument("--delta", type=float, default=0.0, help="soma a todos os thresholds")
+    args = parser.parse_args()
+
+    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    inicio = time.perf_counter()
+    semantico = SemanticCrisisDetector(embeddings, args.exemplos)
+    carga = time.perf_counter() - inicio
+    semantico.thresholds = semantico.thresholds + args.delta
+
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = AlertDetector(alerts_dir=tmp, legacy_alerts_file=None)
+        mensagens = [m for m, _ in CONJUNTO]
+        esperado = [c for _, c in CONJUNTO]
+        textos = mensagens  # como escritas, na mesma forma dos exemplos
+
+        so_regex = [{c for c, _ in detector.matcher.match(*analyze_message(m).forms)} for m in mensagens]
+        semanticos = semantico.detect_many(textos)
+        combinado = [r or {c for c, _ in s} for r, s in zip(so_regex, semanticos)]
+
+    print(f"📊 {len(CONJUNTO)} mensagens ({sum(e is not None for e in esperado)} de crise), "
+          f"{semantico._matrix.shape[0]} vetores de referência (carga {carga:.1f}s)\n")
+    print(f"{'categoria':<16} {'regex P':>8} {'regex R':>8} {'+sem P':>8} {'+sem R':>8}")
+    for (categoria, p1, r1), (_, p2, r2) in zip(metricas(esperado, so_regex, semantico.categories),
+                                                metricas(esperado, combinado, semantico.categories)):
+        print(f"{categoria:<16} {p1:>8.2f} {r1:>8.2f} {p2:>8.2f} {r2:>8.2f}")
+
+    print("\n🔎 Erros do regex + semântico")
+    for mensagem, e, p, s in zip(mensagens, esperado, combinado, semanticos):
+        if (e is None and p) or (e is not None and e not in p):
+            melhor = f"{s[0][0]} {s[0][1]:.2f}" if s else "-"
+            print(f"   {'FP' if e is None else 'FN'} {mensagem!r} esperado={e} previsto={sorted(p)} ({melhor})")
+
+    # Latência: uma mensagem por vez (caminho do webhook) e em lote
+    for texto in textos[:5]:
+        semantico.detect(texto)  # aquecimento
+    tempos = []
+    for texto in textos * 3:
+        inicio = time.perf_counter()
+        semantico.detect(texto)
+        tempos.append(time.perf_counter() - inicio)
+    inicio = time.perf_counter()
+    semantico.detect_many(textos)
+    lote = time.perf_counter() - inicio
+
+    vetor = np.asarray([embeddings.embed_query(textos[0])], dtype=np.float32)
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        semantico.scores(vetor)
+    matmul = (time.perf_counter() - inicio) / 1000
+
+    print("\n⏱️ Latência")
+    print(f"   por mensagem: p50 {np.percentile(tempos, 50) * 1000:.1f} ms, p95 {np.percentile(tempos, 95) * 1000:.1f} ms")
+    print(f"   em lote:      {len(textos) / lote:.0f} mensagens/s")
+    print(f"   só a matmul:  {matmul * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Teste do detector de alertas críticos e do log de alertas
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from src.alert_detector import AlertDetector
+from src.alert_log import AlertLog
+from src.pattern_matcher import PatternMatcher, required_literal
+
+
+def test_alert_log_status_flow():
+    """Alertas novos aparecem como pendentes até serem tratados"""
+    with tempfile.TemporaryDirectory() as tmp:
+        alerts_dir = os.path.join(tmp, "critical_alerts")
+        detector = AlertDetector(alerts_dir=alerts_dir, legacy_alerts_file=None)
+
+        is_critical, alert = detector.detect_critical_situation("Eu não aguento mais", "5581000000001")
+        assert is_critical and alert["category"] == "self_harm"
+        detector.detect_critical_situation("Acho que vou desistir da escola", "5581000000002")
+
+        pending = detector.get_pending_alerts()
+        assert [a["user_id"] for a in pending] == ["5581000000001", "5581000000002"]
+
+        detector.mark_alert_handled(alert["alert_id"])
+        assert [a["user_id"] for a in detector.get_pending_alerts()] == ["5581000000002"]
+        handled = detector.get_pending_alerts("HANDLED")
+        assert handled[0]["alert_id"] == alert["alert_id"] and "handled_at" in handled[0]
+
+        # Reopen from the index, then from segments only
+        reopened = AlertDetector(alerts_dir=alerts_dir, legacy_alerts_file=None)
+        assert len(reopened.get_pending_alerts()) == 1
+        os.remove(os.path.join(alerts_dir, "index.jsonl"))
+        rebuilt = AlertDetector(alerts_dir=alerts_dir, legacy_alerts_file=None)
+        assert len(rebuilt.get_pending_alerts()) == 1
+        assert len(rebuilt.get_pending_alerts("HANDLED")) == 1
+        print("✅ Status dos alertas preservado no log")
+
+
+def test_legacy_migration():
+    """O critical_alerts.json antigo é migrado para o log"""
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "critical_alerts.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([
+                {"alert_id": "a1", "user_id": "1", "status": "NEW", "category": "bullying"},
+                {"alert_id": "a2", "user_id": "2", "status": "HANDLED", "handled_at": "2025-11-09T10:00:00",
+                 "category": "dropout_risk"},
+            ], f)
+
+        detector = AlertDetector(alerts_dir=os.path.join(tmp, "critical_alerts"), legacy_alerts_file=legacy)
+        assert [a["alert_id"] for a in detector.get_pending_alerts()] == ["a1"]
+        assert detector.get_pending_alerts("HANDLED")[0]["handled_at"] == "2025-11-09T10:00:00"
+        assert os.path.exists(legacy + ".migrated")
+        print("✅ Alertas antigos migrados")
+
+
+def test_matcher_ranks_all_categories():
+    """Todas as categorias são retornadas, da mais grave para a menos grave"""
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = AlertDetector(alerts_dir=os.path.join(tmp, "critical_alerts"), legacy_alerts_file=None)
+        mensagem = "Tenho muito medo da prova, todo mundo me odeia e eu não aguento mais"
+        is_critical, alert = detector.detect_critical_situation(mensagem, "5581000000003")
+        assert is_critical
+        assert alert["category"] == "self_harm" and alert["severity"] == "CRITICAL"
+        assert alert["categories"] == ["self_harm", "bullying", "severe_anxiety"]
+        print("✅ Categorias ordenadas por severidade")
+
+
+def test_matcher_equivalent_to_re_search():
+    """O pré-filtro não perde nenhum padrão que re.search encontraria"""
+    assert required_literal(r"vou\s+sair\s+da\s+escola") == "escola"
+    assert required_literal(r"tenho\s+medo\s+dos?\s+colegas") == "colegas"
+    assert required_literal(r"abc|def") is None
+
+    patterns = {
+        **AlertDetector.CRITICAL_PATTERNS,
+        "extra": [r"colou?r", r"(a|b)c+d", r"x{0,2}yz"],
+    }
+    matcher = PatternMatcher(patterns, AlertDetector.SEVERITY)
+    mensagens = [
+        "", "oi nino", "VOU DESISTIR", "meu pai sempre me bate", "minha mãe bate",
+        "ninguém gosta de mim e me batem", "fico tremendo quando chego na escola",
+        "color colour", "bccccd", "yz", "não consigo dormir pensando na prova",
+    ]
+    for mensagem in mensagens:
+        esperado = {
+            category for category, ps in patterns.items()
+            if any(re.search(p, mensagem, re.IGNORECASE) for p in ps)
+        }
+        assert {c for c, _ in matcher.match(mensagem)} == esperado, mensagem
+    print("✅ Matcher equivalente a re.search por padrão")
+
+
+def test_normalized_variants():
+    """Sem acento, com leetspeak ou homóglifos a mensagem ainda gera alerta"""
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = AlertDetector(alerts_dir=os.path.join(tmp, "critical_alerts"), legacy_alerts_file=None)
+        for mensagem, categoria in [
+            ("nao aguento mais", "self_harm"),
+            ("N40 AGU3NT0 M4IS", "self_harm"),
+            ("ninguem gosta de mim", "bullying"),
+            ("minha mae me bate", "family_issues"),
+            ("entro em panico", "severe_anxiety"),
+            ("vоu desistir", "dropout_risk"),  # "о" cirílico
+        ]:
+            is_critical, alert = detector.detect_critical_situation(mensagem, "5581000000004")
+            assert is_critical and alert["category"] == categoria, mensagem
+            assert alert["message"] == mensagem
+        assert not detector.detect_critical_situation("a questão 3 vale 4 pontos", "5581000000004")[0]
+        print("✅ Variações normalizadas detectadas")
+
+
+def test_index_compacted_on_rollover():
+    """Na virada do segmento o índice fica com uma linha por alerta"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = AlertLog(tmp, legacy_file=None)
+        log._segment_name = lambda: "alerts-20251109.jsonl"
+        ids = [log.append({"alert_id": f"a{i}", "status": "NEW"}) for i in range(3)]
+        log.update_status(ids[0], "HANDLED", handled_at="2025-11-09T10:00:00")
+        log.update_status(ids[1], "HANDLED")
+        log.update_status(ids[1], "NEW")
+
+        def linhas():
+            with open(os.path.join(tmp, AlertLog.INDEX_FILE), encoding="utf-8") as f:
+                return len(f.readlines())
+        assert linhas() == 6
+
+        log._segment_name = lambda: "alerts-20251110.jsonl"
+        log.append({"alert_id": "a3", "status": "NEW"})
+        assert linhas() == 3 + 2 + 1  # uma por alerta, a última mudança de a0 e a1, alerta novo
+        assert not [nome for nome in os.listdir(tmp) if nome.endswith(".tmp")]
+
+        reaberto = AlertLog(tmp, legacy_file=None)
+        assert [a["alert_id"] for a in reaberto.by_status("NEW")] == ["a1", "a2", "a3"]
+        assert reaberto.get("a0")["status"] == "HANDLED" and reaberto.get("a0")["handled_at"] == "2025-11-09T10:00:00"
+        print("✅ Índice compactado na virada do segmento")
+
+
+def test_recovers_alert_missing_from_index():
+    """Queda entre o fsync do segmento e o do índice não perde o alerta"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = AlertLog(tmp, legacy_file=None)
+        log._segment_name = lambda: "alerts-20251109.jsonl"
+        log.append({"alert_id": "a0", "status": "NEW"})
+        log.update_status("a0", "HANDLED", handled_at="2025-11-09T10:00:00")
+
+        # Simula a queda: o registro chega ao segmento, o índice não
+        log._write_line("alerts-20251109.jsonl", {"type": "alert", "alert_id": "a1", "status": "NEW"})
+        log._write_line("alerts-20251110.jsonl", {"type": "alert", "alert_id": "a2", "status": "NEW"})
+        log._write_line("alerts-20251110.jsonl", {"type": "status", "alert_id": "a2", "status": "HANDLED"})
+
+        reaberto = AlertLog(tmp, legacy_file=None)
+        assert [a["alert_id"] for a in reaberto.by_status("NEW")] == ["a1"]
+        assert [a["alert_id"] for a in reaberto.by_status("HANDLED")] == ["a0", "a2"]
+
+        # Recuperado uma vez: vai para o índice e não é reaplicado
+        with open(os.path.join(tmp, AlertLog.INDEX_FILE), encoding="utf-8") as f:
+            linhas = len(f.readlines())
+        AlertLog(tmp, legacy_file=None)
+        with open(os.path.join(tmp, AlertLog.INDEX_FILE), encoding="utf-8") as f:
+            assert len(f.readlines()) == linhas == 5
+
+        # Também depois da compactação na virada do dia
+        reaberto._segment_name = lambda: "alerts-20251111.jsonl"
+        reaberto.update_status("a1", "HANDLED")
+        outro = AlertLog(tmp, legacy_file=None)
+        assert outro.by_status("NEW") == [] and len(outro.by_status("HANDLED")) == 3
+        assert outro.get("a0")["handled_at"] == "2025-11-09T10:00:00"
+        print("✅ Alerta fora do índice recuperado na abertura")
+
+
+def test_save_off_event_loop():
+    """A gravação com fsync do alerta não trava o event loop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = AlertDetector(alerts_dir=tmp, legacy_alerts_file=None)
+        append = detector.alert_log.append
+
+        def append_lento(alert):
+            time.sleep(0.2)  # disco lento
+            return append(alert)
+        detector.alert_log.append = append_lento
+
+        async def cenario():
+            batidas = 0
+
+            async def relogio():
+                nonlocal batidas
+                while True:
+                    await asyncio.sleep(0.01)
+                    batidas += 1
+
+            tarefa = asyncio.create_task(relogio())
+            resultado = await detector.adetect_critical_situation("eu não aguento mais", "5581000000005")
+            tarefa.cancel()
+            return resultado, batidas
+
+        (is_critical, alert), batidas = asyncio.run(cenario())
+        assert is_critical and batidas >= 5
+        assert [a["alert_id"] for a in detector.get_pending_alerts()] == [alert["alert_id"]]
+        print(f"✅ Alerta gravado fora do event loop ({batidas} ticks durante a gravação)")
+
+
+if __name__ == "__main__":
+    test_alert_log_status_flow()
+    test_legacy_migration()
+    test_matcher_ranks_all_categories()
+    test_matcher_equivalent_to_re_search()
+    test_normalized_variants()
+    test_index_compacted_on_rollover()
+    test_recovers_alert_missing_from_index()
+    test_save_off_event_loop()
@@ -0,0 +1,124 @@
+"""
+Teste do envio de alertas para a equipe, com um servidor HTTP local como webhook
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from src.alert_detector import AlertDetector
+from src.alert_dispatcher import AlertDispatcher, FileSink, WebhookSink, WhatsAppSink
+
+
+class WebhookStub:
+    """Servidor HTTP local que responde 500 nas primeiras `falhas` requisições"""
+
+    def __init__(self, falhas=0):
+        self.recebidos = []
+        self.tentativas = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.tentativas += 1
+                status = 500 if stub.tentativas <= falhas else 200
+                if status == 200:
+                    stub.recebidos.append(corpo)
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/alertas"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class FakeEvolution:
+    def __init__(self):
+        self.enviados = []
+
+    async def send_message(self, numero, texto):
+        self.enviados.append((numero, texto))
+        return True
+
+
+def test_fan_out_with_retries():
+    """Um alerta chega em todos os destinos; o webhook é reenviado após falhar"""
+    stub = WebhookStub(falhas=2)
+    evolution = FakeEvolution()
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "notifications.jsonl")
+        dispatcher = AlertDispatcher(
+            [WhatsAppSink(evolution, "5581999990000"), WebhookSink(stub.url), FileSink(arquivo)],
+            window=60, retry_backoff=0.01
+        )
+        detector = AlertDetector(alerts_dir=os.path.join(tmp, "alerts"), legacy_alerts_file=None,
+                                 dispatcher=dispatcher)
+
+        async def cenario():
+            await dispatcher.start()
+            inicio = time.perf_counter()
+            detector.detect_critical_situation("eu não aguento mais", "5581000000001")
+            duracao = time.perf_counter() - inicio
+            await dispatcher.stop()
+            return duracao
+
+        duracao = asyncio.run(cenario())
+        stub.close()
+
+        assert stub.tentativas == 3 and len(stub.recebidos) == 1
+        assert stub.recebidos[0]["alerts"][0]["category"] == "self_harm"
+        assert len(evolution.enviados) == 1 and "self_harm" in evolution.enviados[0][1]
+        with open(arquivo, encoding="utf-8") as f:
+            assert len(f.readlines()) == 1
+        assert dispatcher.get_stats()["retries"] == 2 and dispatcher.get_stats()["failed"] == 0
+        assert duracao < 0.05  # detecção não espera o envio
+        print(f"✅ Alerta enviado a 3 destinos com retry (detecção levou {duracao * 1000:.1f} ms)")
+
+
+def test_aggregation_window_and_escalation():
+    """Vários alertas do mesmo aluno viram um resumo; escalada de severidade sai na hora"""
+    evolution = FakeEvolution()
+    dispatcher = AlertDispatcher([WhatsAppSink(evolution, "5581999990000", min_severity="LOW")], window=0.3)
+
+    def alerta(i, severidade, usuario="5581000000002"):
+        return {"alert_id": f"{usuario}_{i}", "user_id": usuario, "severity": severidade,
+                "category": "bullying" if severidade == "HIGH" else "severe_anxiety",
+                "message": f"mensagem {i}", "timestamp": "2025-11-09T10:00:00"}
+
+    async def cenario():
+        await dispatcher.start()
+        dispatcher.notify(alerta(1, "MEDIUM"))
+        for i in range(2, 20):
+            dispatcher.notify(alerta(i, "MEDIUM"))
+        dispatcher.notify(alerta(2, "MEDIUM"))  # duplicado
+        dispatcher.notify(alerta(1, "MEDIUM", usuario="5581000000003"))
+        await asyncio.sleep(0.05)
+        enviados_antes = len(evolution.enviados)
+        dispatcher.notify(alerta(20, "HIGH"))  # escalada
+        await asyncio.sleep(0.05)
+        enviados_escalada = len(evolution.enviados)
+        dispatcher.notify(alerta(21, "MEDIUM"))
+        await asyncio.sleep(0.4)  # janela fecha
+        await dispatcher.stop()
+        return enviados_antes, enviados_escalada
+
+    enviados_antes, enviados_escalada = asyncio.run(cenario())
+    assert enviados_antes == 2  # primeiro alerta de cada aluno
+    assert enviados_escalada == 3 and "19 alertas" in evolution.enviados[2][1]
+    assert len(evolution.enviados) == 4 and "mensagem 21" in evolution.enviados[3][1]
+    assert dispatcher.get_stats()["duplicates"] == 1
+    print(f"✅ 22 alertas viraram {len(evolution.enviados)} notificações")
+
+
+if __name__ == "__main__":
+    test_fan_out_with_retries()
+    test_aggregation_window_and_escalation()
@@ -0,0 +1,162 @@
+"""
+Teste da análise em lote - vários alunos por chamada, com retentativa individual
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from src.analytics_agent import AgenteAnalista
+
+
+def _scores(aluno_id=None):
+    item = {
+        "engajamento_comportamental": 0.7,
+        "engajamento_emocional": 0.6,
+        "engajamento_cognitivo": 0.8,
+        "observacoes_chave": ["Como somar frações?"]
+    }
+    if aluno_id:
+        item["aluno_id"] = aluno_id
+    return item
+
+
+class LoteLLM:
+    """LLM falso: responde o lote com um resultado inválido para um aluno"""
+
+    def __init__(self, invalido: str):
+        self.invalido = invalido
+        self.chamadas = []
+
+    async def ainvoke(self, messages):
+        conteudo = messages[-1].content
+        alunos = [linha.split()[2] for linha in conteudo.splitlines() if linha.startswith("### aluno_id:")]
+        self.chamadas.append(alunos or ["individual"])
+
+        if not alunos:
+            return SimpleNamespace(content=json.dumps(_scores()))
+
+        analises = []
+        for aluno_id in alunos:
+            item = _scores(aluno_id)
+            if aluno_id == self.invalido:
+                del item["engajamento_emocional"]
+            analises.append(item)
+        return SimpleNamespace(content=json.dumps({"analises": analises}))
+
+
+def _conversa(i):
+    return [
+        {"role": "user", "content": f"Oi Nino, sou o aluno {i}"},
+        {"role": "assistant", "content": "E aí! Como posso ajudar?"},
+        {"role": "user", "content": "Preciso de ajuda com frações"},
+        {"role": "assistant", "content": "Claro! O que você quer saber?"},
+        {"role": "user", "content": "Como somar frações com denominadores diferentes?"},
+    ]
+
+
+def test_lote_com_retentativa():
+    """Resultados válidos vêm do lote; o inválido é refeito sozinho"""
+    agente = AgenteAnalista(api_key="test")
+    agente.llm = LoteLLM(invalido="5581000000002")
+    salvos = []
+    agente._save_alert = lambda aluno_id, analise: salvos.append(aluno_id)
+
+    pendentes = {f"558100000000{i}": _conversa(i) for i in range(1, 5)}
+    resultados = asyncio.run(agente.analisar_lote(pendentes))
+
+    assert set(resultados) == set(pendentes)
+    assert len(agente.llm.chamadas) == 2  # one batch + one individual retry
+    assert agente.llm.chamadas[1] == ["individual"]
+    assert sorted(salvos) == sorted(pendentes)
+    assert abs(resultados["5581000000001"].score_desmotivacao - 0.3) < 1e-9
+    print("✅ 4 alunos analisados em 2 chamadas")
+
+
+def test_lote_respeita_orcamento():
+    """O orçamento de tokens divide os alunos em vários lotes"""
+    agente = AgenteAnalista(api_key="test")
+    agente.llm = LoteLLM(invalido="")
+    agente._save_alert = lambda aluno_id, analise: None
+
+    pendentes = {f"558100000000{i}": _conversa(i) for i in range(1, 7)}
+    resultados = asyncio.run(agente.analisar_lote(pendentes, max_tokens_lote=110))
+
+    assert set(resultados) == set(pendentes)
+    assert len(agente.llm.chamadas) == 3
+    assert all(len(chamada) == 2 for chamada in agente.llm.chamadas)
+    print("✅ Lotes respeitam o orçamento de tokens")
+
+
+class RegistraLLM:
+    """LLM falso: guarda as mensagens de cada chamada e responde com scores fixos"""
+
+    def __init__(self):
+        self.chamadas = []
+
+    async def ainvoke(self, messages):
+        self.chamadas.append(messages)
+        return SimpleNamespace(content=json.dumps(_scores()))
+
+
+def test_analise_incremental():
+    """Depois da primeira análise só vão os turnos novos e os scores anteriores"""
+    agente = AgenteAnalista(api_key="test", full_every=2)
+    agente.llm = RegistraLLM()
+    agente._save_alert = lambda aluno_id, analise: None
+    aluno = "5581000000001"
+
+    def analisar(historico):
+        return asyncio.run(agente.analisar_conversa(aluno, historico))
+
+    def ultima():
+        sistema, humano = agente.llm.chamadas[-1]
+        return sistema.content, humano.content
+
+    historico = _conversa(1)
+    analisar(historico)
+    sistema, conteudo = ultima()
+    assert sistema == agente.system_prompt and "Conversa completa" in conteudo
+
+    # Segunda chamada: só o que veio depois do cursor + análise anterior
+    historico = historico + [{"role": "assistant", "content": "Iguale os denominadores."},
+                             {"role": "user", "content": "Agora entendi, valeu!"}]
+    analisar(historico)
+    sistema, conteudo = ultima()
+    assert sistema == agente.incremental_prompt
+    assert "Análise anterior" in conteudo and '"engajamento_cognitivo": 0.8' in conteudo
+    assert "Agora entendi, valeu!" in conteudo and "Iguale os denominadores." in conteudo
+    assert "Preciso de ajuda com frações" not in conteudo
+
+    # Sem turno novo do aluno: devolve a análise anterior sem chamar o LLM
+    anterior = agente._estados[aluno]["analise"]
+    historico = historico + [{"role": "assistant", "content": "Mais alguma dúvida?"}]
+    assert analisar(historico) is anterior and len(agente.llm.chamadas) == 2
+
+    # full_every=2: depois de 2 incrementais vem uma análise completa
+    historico = historico + [{"role": "user", "content": "E multiplicar frações?"}]
+    analisar(historico)
+    assert ultima()[0] == agente.incremental_prompt
+    historico = historico + [{"role": "user", "content": "E dividir frações?"}]
+    analisar(historico)
+    sistema, conteudo = ultima()
+    assert sistema == agente.system_prompt and "Preciso de ajuda com frações" in conteudo
+    assert agente._estados[aluno]["incrementos"] == 0
+
+    # Memória reiniciada (histórico menor que o cursor): análise completa
+    analisar(_conversa(1))
+    sistema, conteudo = ultima()
+    assert sistema == agente.system_prompt and "Conversa completa" in conteudo
+    assert agente._estados[aluno]["cursor"] == len(_conversa(1))
+    assert len(agente.llm.chamadas) == 5
+
+    # Aluno removido por inatividade: volta com análise completa
+    agente.forget(aluno)
+    assert aluno not in agente._estados
+    analisar(historico)
+    assert ultima()[0] == agente.system_prompt
+    print("✅ Análise incremental, completa periódica e após reinício")
+
+
+if __name__ == "__main__":
+    test_lote_com_retentativa()
+    test_lote_respeita_orcamento()
+    test_analise_incremental()
@@ -0,0 +1,175 @@
+"""
+Teste do agendador de analytics - debounce por aluno e prioridade das respostas
+"""
+import asyncio
+from types import SimpleNamespace
+from src.analytics_scheduler import AnalyticsScheduler
+from src.engagement_prescorer import EngagementPreScorer
+
+
+class FakeAnalista:
+    """Agente analista falso que só conta as chamadas"""
+
+    def __init__(self):
+        self.calls = []
+        self.forgotten = []
+
+    async def analisar_conversa(self, aluno_id, historico):
+        self.calls.append((aluno_id, len(historico)))
+        return SimpleNamespace(score_desmotivacao=0.5)
+
+    def forget(self, aluno_id):
+        self.forgotten.append(aluno_id)
+
+
+def _historico(n):
+    return [{"role": "user", "content": f"mensagem {i}"} for i in range(n)]
+
+
+def test_debounce_per_student():
+    """Várias mensagens do mesmo aluno viram uma única análise"""
+
+    async def run():
+        analista = FakeAnalista()
+        scheduler = AnalyticsScheduler(analista, min_interval=3600, every_n_messages=5, tick=0.01)
+        await scheduler.start()
+
+        # First message is due immediately, the next ones are collapsed
+        for i in range(1, 5):
+            scheduler.record_message("5581000000001", _historico(i))
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return analista.calls
+
+    calls = asyncio.run(run())
+    assert len(calls) == 1
+    assert calls[0][0] == "5581000000001"
+    print("✅ Mensagens agrupadas em uma análise")
+
+
+def test_every_n_messages():
+    """A cada N mensagens novas o aluno volta a ser analisado"""
+
+    async def run():
+        analista = FakeAnalista()
+        scheduler = AnalyticsScheduler(analista, min_interval=3600, every_n_messages=3, tick=0.01)
+        await scheduler.start()
+
+        for i in range(1, 8):
+            scheduler.record_message("5581000000002", _historico(i))
+            await asyncio.sleep(0.02)
+        await scheduler.stop()
+        return analista.calls
+
+    calls = asyncio.run(run())
+    # First message is due right away, then every 3 new messages
+    assert [size for _, size in calls] == [1, 4, 7]
+    print(f"✅ {len(calls)} análises para 7 mensagens")
+
+
+def test_waits_for_live_replies():
+    """O worker não roda análise enquanto há uma resposta em andamento"""
+
+    async def run():
+        analista = FakeAnalista()
+        scheduler = AnalyticsScheduler(analista, min_interval=0, every_n_messages=1, tick=0.01)
+        await scheduler.start()
+
+        async with scheduler.live_reply():
+            scheduler.record_message("5581000000003", _historico(4))
+            await asyncio.sleep(0.05)
+            during_reply = len(analista.calls)
+
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return during_reply, len(analista.calls)
+
+    during_reply, after_reply = asyncio.run(run())
+    assert during_reply == 0
+    assert after_reply == 1
+    print("✅ Analytics esperou a resposta ao aluno")
+
+
+def test_idle_students_evicted():
+    """Aluno sem mensagens há alguns intervalos sai da memória; quem continua conversando fica"""
+
+    async def run():
+        analista = FakeAnalista()
+        scheduler = AnalyticsScheduler(analista, min_interval=0.05, every_n_messages=100, tick=0.01,
+                                       idle_intervals=2)
+        await scheduler.start()
+
+        scheduler.record_message("5581000000003", _historico(1))
+        for i in range(15):
+            scheduler.record_message("5581000000004", _historico(i + 1))
+            await asyncio.sleep(0.02)
+        ativos = set(scheduler._students)
+        stats = scheduler.get_stats()
+
+        # Quando volta, começa do zero e é analisado logo
+        scheduler.record_message("5581000000003", _historico(2))
+        await asyncio.sleep(0.03)
+        await scheduler.stop()
+        return ativos, stats, analista.calls, analista.forgotten
+
+    ativos, stats, calls, forgotten = asyncio.run(run())
+    assert ativos == {"5581000000004"} and forgotten == ["5581000000003"]
+    assert stats["evicted"] == 1 and stats["students"] == 1
+    assert [size for aluno_id, size in calls if aluno_id == "5581000000003"] == [1, 2]
+    print("✅ Alunos inativos removidos da memória")
+
+
+def _mensagens(*textos):
+    return [{"role": "user", "content": texto} for texto in textos]
+
+
+def test_prescreen_gate():
+    """Pré-score local: aluno tranquilo não chega ao LLM; risco alto ou incerto chega"""
+    engajado = _mensagens(
+        "Oi Nino! Hoje eu queria entender melhor como funcionam as frações equivalentes?",
+        "Adorei a explicação, faz sentido! E como simplifico 4/8?",
+        "Legal, consegui fazer os exercícios do livro, obrigado 😊",
+    )
+    desanimado = _mensagens("QUE T3DIO", "N4O SEI", "dificil demais, nao entendo")
+    incerto = _mensagens("Adorei a explicação sobre frações, faz sentido! Como faço o próximo? 😊")
+
+    async def run():
+        analista = FakeAnalista()
+        scheduler = AnalyticsScheduler(analista, min_interval=3600, every_n_messages=100, tick=0.01,
+                                       prescorer=EngagementPreScorer())
+        for aluno_id, historico in (("1", engajado), ("2", desanimado), ("3", incerto)):
+            scheduler.record_message(aluno_id, historico)
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return scheduler, analista.calls
+
+    scheduler, calls = asyncio.run(run())
+    assert sorted(aluno_id for aluno_id, _ in calls) == ["2", "3"]
+    assert scheduler.stats["skipped_local"] == 1 and scheduler.get_stats()["pending"] == 0
+    # Pulado localmente conta como análise feita: só volta depois do intervalo
+    assert scheduler._students["1"].last_run > float("-inf")
+    print("✅ Pré-score local decide quem vai para o LLM")
+
+
+def test_prescorer_vocabulary_normalized():
+    """Vocabulário sem acento, em maiúsculas ou leetspeak conta; "não entendi" não é positivo"""
+    scorer = EngagementPreScorer()
+    negativo = EngagementPreScorer.FEATURES.index("negative")
+    positivo = EngagementPreScorer.FEATURES.index("positive")
+    features, _ = scorer.extract_features([
+        _mensagens("que tedio"), _mensagens("muito dificil"), _mensagens("nao entendo"), _mensagens("N4O SEI"),
+        _mensagens("Não entendi"), _mensagens("ENTENDI, VALEU"),
+    ])
+    assert list(features[:, negativo]) == [1.0, 1.0, 1.0, 1.0, 1.0, 0.0]
+    assert list(features[:, positivo]) == [0.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+    print("✅ Vocabulário do pré-score normalizado")
+
+
+if __name__ == "__main__":
+    test_debounce_per_student()
+    test_every_n_messages()
+    test_waits_for_live_replies()
+    test_idle_students_evicted()
+    test_prescreen_gate()
+    test_prescorer_vocabulary_normalized()
@@ -0,0 +1,153 @@
+"""
+Teste do BudgetController: previsão de gasto, rebaixamento progressivo e cotas
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from src.analytics_scheduler import AnalyticsScheduler, _StudentState
+from src.budget_controller import BudgetController
+from src.cost_monitor import CostMonitor
+from src.leo_agent import LeoAgent
+from src.school_registry import SchoolRegistry
+
+
+def criar_controlador(tmp, quotas=None, **kwargs):
+    monitor = CostMonitor(os.path.join(tmp, "api_stats.json"), flush_every=1000)
+    arquivo = os.path.join(tmp, "quotas.json")
+    if quotas is not None:
+        with open(arquivo, "w") as f:
+            json.dump(quotas, f)
+    return monitor, BudgetController(monitor, quotas_file=arquivo, cheap_model="llama-3.1-8b-instant", **kwargs)
+
+
+def test_forecast_and_levels():
+    """A taxa móvel projeta o gasto e o nível sobe conforme a previsão/orçamento"""
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor, budget = criar_controlador(tmp, daily_budget=10.0, sample_interval=0.0)
+        assert budget.evaluate().name == "normal"
+
+        # Gasto de $0.01 entre duas amostras com 1s de intervalo: ~$36/h
+        budget._samples.clear()
+        budget._samples.append((time.time() - 1.0, monitor.stats["total_cost"]))
+        monitor.log_request("openai", "gpt-3.5-turbo", 6667, "5581000000001")
+        plano = budget.evaluate()
+        previsao = budget.forecast()
+
+        assert 30 < previsao["rate_per_hour"] < 40
+        agora = datetime.now()
+        restante = 86400 - (agora.hour * 3600 + agora.minute * 60 + agora.second)
+        if restante > 3600:
+            assert previsao["end_of_day"] > 12.0
+            assert plano.name == "minimum" and plano.model == "llama-3.1-8b-instant"
+            assert plano.max_tokens == 120 and plano.analytics_factor == 8.0
+        print(f"✅ Previsão: ${previsao['end_of_day']:.2f} no fim do dia -> nível {plano.name}")
+
+
+def test_level_thresholds():
+    """Cada faixa da razão previsão/orçamento tem seu nível"""
+    with tempfile.TemporaryDirectory() as tmp:
+        _, budget = criar_controlador(tmp, daily_budget=100.0)
+        for gasto, esperado in ((50, "normal"), (85, "economy"), (105, "reduced"), (130, "minimum")):
+            budget.forecast = lambda g=gasto: {"end_of_day": g, "end_of_month": g}
+            assert budget.evaluate().name == esperado, (gasto, esperado)
+        # Sem orçamento configurado nunca rebaixa
+        budget.daily_budget = 0.0
+        assert budget.evaluate().name == "normal"
+        print("✅ Faixas de rebaixamento")
+
+
+def test_quotas_calendar_window():
+    """Cotas por aluno e por escola, zeradas quando a janela do calendário muda"""
+    with tempfile.TemporaryDirectory() as tmp:
+        escolas = os.path.join(tmp, "escolas.csv")
+        with open(escolas, "w") as f:
+            f.write("chave,escola,cidade,lat,lon\n")
+            f.write("5581000000001,Escola A,Recife,-8.0,-34.9\n")
+            f.write("5581000000002,Escola A,Recife,-8.0,-34.9\n")
+        quotas = {
+            "users": {"*": {"requests": 3, "window": "day"}, "5581000000002": {"requests": 10, "window": "day"}},
+            "schools": {"Escola A": {"requests": 5, "window": "month"}},
+        }
+        monitor, budget = criar_controlador(tmp, quotas, registry=SchoolRegistry(escolas))
+
+        for _ in range(3):
+            assert budget.check_quota("5581000000001")[0]
+            budget.record_request("5581000000001")
+        ok, mensagem = budget.check_quota("5581000000001")
+        assert not ok and "3 mensagens de hoje" in mensagem
+
+        # O outro aluno tem cota própria, mas esbarra na cota da escola
+        for _ in range(2):
+            assert budget.check_quota("5581000000002")[0]
+            budget.record_request("5581000000002")
+        ok, mensagem = budget.check_quota("5581000000002")
+        assert not ok and "escola" in mensagem
+
+        # Janela anterior: contador volta a zero
+        monitor.usage.set_quota("user:5581000000001", "2000-01-01", 3)
+        monitor.usage.set_quota("school:Escola A", "2000-01", 5)
+        assert budget.check_quota("5581000000001")[0]
+
+        # Os contadores são salvos junto com o CostMonitor
+        monitor._save_stats()
+        assert CostMonitor(monitor.stats_file).usage.quota("user:5581000000002")[1] == 2
+        print("✅ Cotas por aluno e por escola")
+
+
+def test_analytics_stretched_by_budget():
+    """Acima do orçamento, o agendador analisa com menos frequência"""
+    with tempfile.TemporaryDirectory() as tmp:
+        _, budget = criar_controlador(tmp, daily_budget=100.0, sample_interval=3600)
+        budget.forecast = lambda: {"end_of_day": 110, "end_of_month": 110}
+        budget.evaluate()
+
+        scheduler = AnalyticsScheduler(None, min_interval=600, every_n_messages=10, budget=budget)
+        estado = _StudentState()
+        estado.pending = True
+        estado.new_messages = 10
+        estado.last_run = time.monotonic() - 1000
+        assert not scheduler._is_due(estado, time.monotonic(), scheduler._factor())
+        assert scheduler._is_due(estado, time.monotonic())
+        print("✅ Analytics com intervalos esticados")
+
+
+def test_openai_provider_under_pressure():
+    """Com OpenAI, o modelo barato precisa ser um modelo OpenAI com preço; senão mantém o configurado"""
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = CostMonitor(os.path.join(tmp, "api_stats.json"), flush_every=1000)
+        pressao = lambda: {"end_of_day": 130, "end_of_month": 130}
+
+        # Modelo do Groq numa instalação OpenAI: ignorado, só encurta as respostas
+        budget = BudgetController(monitor, daily_budget=100.0, cheap_model="llama-3.1-8b-instant",
+                                  provider="openai", quotas_file=None)
+        budget.forecast = pressao
+        plano = budget.evaluate()
+        assert budget.cheap_model is None and plano.name == "minimum" and plano.model is None
+        agente = LeoAgent(api_key="teste", model="gpt-4", provider="openai", cost_monitor=monitor, budget=budget)
+        llm = agente._llm_for(plano.model or agente.model, plano.max_tokens)
+        assert type(llm).__name__ == "ChatOpenAI" and llm.model_name == "gpt-4" and llm.max_tokens == 120
+
+        # Modelo OpenAI com preço: usado a partir do nível "reduced"
+        budget = BudgetController(monitor, daily_budget=100.0, cheap_model="gpt-3.5-turbo",
+                                  provider="openai", quotas_file=None)
+        budget.forecast = pressao
+        plano = budget.evaluate()
+        llm = agente._llm_for(plano.model or agente.model, plano.max_tokens)
+        assert llm.model_name == "gpt-3.5-turbo" and monitor._calculate_cost("openai", "gpt-3.5-turbo", 1000) > 0
+
+        # O modelo barato baixa a previsão um pouco: não volta de nível até ficar 0.1 abaixo
+        budget.forecast = lambda: {"end_of_day": 115, "end_of_month": 115}
+        assert budget.evaluate().name == "minimum"
+        budget.forecast = lambda: {"end_of_day": 105, "end_of_month": 105}
+        assert budget.evaluate().name == "reduced"
+        print("✅ OpenAI sob pressão de orçamento")
+
+
+if __name__ == "__main__":
+    test_forecast_and_levels()
+    test_level_thresholds()
+    test_quotas_calendar_window()
+    test_analytics_stretched_by_budget()
+    test_openai_provider_under_pressure()
@@ -0,0 +1,35 @@
+"""
+Teste da partida a frio: importar o main não carrega SDKs de LLM nem FAISS/embeddings
+"""
+import os
+import tempfile
+from src.cost_monitor import CostMonitor
+from src.leo_agent import LeoAgent
+from tests.bench_import_time import MODULOS_ADIADOS, importar_main
+
+
+def test_main_import_defers_heavy_modules():
+    """SDKs dos provedores, FAISS e embeddings ficam para o aquecimento"""
+    with tempfile.TemporaryDirectory() as pasta:
+        carregados = {nome for _, nome, _, _ in importar_main(pasta)}
+    assert "main" in carregados and "fastapi" in carregados
+    assert [m for m in MODULOS_ADIADOS if m in carregados] == []
+    print("✅ Import do main sem módulos pesados")
+
+
+def test_llm_created_on_first_use():
+    """O cliente do provedor escolhido só é criado no primeiro acesso"""
+    with tempfile.TemporaryDirectory() as pasta:
+        monitor = CostMonitor(os.path.join(pasta, "api_stats.json"))
+        agente = LeoAgent(api_key="teste", model="llama-3.3-70b-versatile", provider="groq", cost_monitor=monitor)
+        assert agente._llm is None
+        assert type(agente.llm).__name__ == "ChatGroq" and agente.llm is agente.llm
+
+        agente = LeoAgent(api_key="teste", model="gpt-4o-mini", provider="openai", cost_monitor=monitor)
+        assert type(agente.llm).__name__ == "ChatOpenAI"
+    print("✅ Cliente LLM criado no primeiro uso")
+
+
+if __name__ == "__main__":
+    test_main_import_defers_heavy_modules()
+    test_llm_created_on_first_use()
@@ -0,0 +1,111 @@
+"""
+Teste do formato compacto do índice (sem pickle, mapeado em memória) e das variantes do FAISS
+"""
+import os
+import tempfile
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from src.compact_index import build_faiss_index, load_version, save_vectorstore, write_version
+from src.index_store import IndexStore
+from src.rag_ingest import build_index
+from src.rag_service import RAGService
+from tests.test_rag_ingest import criar_documentos
+from tests.test_rag_service import LentoEmbeddings, TRECHOS
+
+
+def vetores_agrupados(quantidade, dimensao=64, grupos=60, semente=0):
+    """Vetores normalizados em grupos, como embeddings de avisos parecidos"""
+    rng = np.random.default_rng(semente)
+    centros = rng.standard_normal((grupos, dimensao)).astype(np.float32)
+    vetores = centros[rng.integers(0, grupos, quantidade)] + 0.5 * rng.standard_normal((quantidade, dimensao))
+    return (vetores / np.linalg.norm(vetores, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_roundtrip_without_pickle():
+    """Versão gravada sem index.pkl devolve os mesmos trechos, com e sem mmap"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = LentoEmbeddings()
+        original = FAISS.from_texts(TRECHOS, embeddings, metadatas=[{"source": f"doc_{i % 2}.txt"} for i in range(5)])
+        save_vectorstore(original, tmp)
+        assert "index.pkl" not in os.listdir(tmp)
+
+        for use_mmap in (True, False):
+            carregado = load_version(tmp, embeddings, use_mmap=use_mmap)
+            assert len(carregado.index_to_docstore_id) == 5 and len(carregado.docstore) == 5
+            for trecho in TRECHOS:
+                vetor = embeddings.embed_query(trecho)
+                esperado = original.similarity_search_by_vector(vetor, k=2)
+                obtido = carregado.similarity_search_by_vector(vetor, k=2)
+                assert [d.page_content for d in obtido] == [d.page_content for d in esperado]
+                assert [d.metadata for d in obtido] == [d.metadata for d in esperado]
+        assert sorted(m["source"] for m in carregado.docstore.metadatas()) == ["doc_0.txt", "doc_1.txt"]
+        assert carregado.docstore.search("99") == "ID 99 not found."
+        print("✅ Formato compacto sem pickle")
+
+
+def test_variants_recall_and_size():
+    """f16 quase exato; pq/ivfpq bem menores e ainda acham o vizinho certo"""
+    vetores = vetores_agrupados(3000)
+    rng = np.random.default_rng(1)
+    consultas = vetores[:100] + 0.05 * rng.standard_normal((100, 64)).astype(np.float32)
+    _, exatos = build_faiss_index(vetores, "flat").search(consultas, 5)
+
+    tamanhos = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for tipo in ("flat", "f16", "pq", "ivfpq"):
+            pasta = os.path.join(tmp, tipo)
+            os.makedirs(pasta)
+            write_version(pasta, build_faiss_index(vetores, tipo), [f"trecho {i}" for i in range(3000)],
+                          [{"source": "a.txt"}] * 3000)
+            tamanhos[tipo] = os.path.getsize(os.path.join(pasta, "index.faiss"))
+
+            indice = load_version(pasta, LentoEmbeddings()).index
+            _, achados = indice.search(consultas, 5)
+            recall = np.mean([len(set(a) & set(e)) / 5 for a, e in zip(achados, exatos)])
+            primeiro = np.mean(achados[:, 0] == np.arange(100))
+            print(f"   {tipo}: recall@5 {recall:.2f}, vizinho certo {primeiro:.2f}, {tamanhos[tipo]} bytes")
+            assert recall >= (0.99 if tipo in ("flat", "f16") else 0.5) and primeiro >= 0.95
+
+    assert tamanhos["f16"] < 0.55 * tamanhos["flat"]
+    assert tamanhos["pq"] < 0.15 * tamanhos["flat"] and tamanhos["ivfpq"] < 0.25 * tamanhos["flat"]
+
+    # Poucos trechos para treinar PQ: cai para f16
+    assert type(build_faiss_index(vetores[:100], "ivfpq")).__name__ == "IndexScalarQuantizer"
+    print("✅ Variantes do índice")
+
+
+def test_build_types_and_live_updates():
+    """prep_rag troca o tipo sem recalcular embeddings; índice mapeado aceita trechos novos"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta, indice = os.path.join(tmp, "documentos_escola"), os.path.join(tmp, "faiss_index")
+        criar_documentos(pasta, TRECHOS)
+        assert build_index(pasta, indice, embeddings=LentoEmbeddings())["version"] == "v1"
+
+        # Só o tipo mudou: publica sem carregar o modelo (embeddings=None)
+        relatorio = build_index(pasta, indice, index_type="f16")
+        assert relatorio["version"] == "v2" and relatorio["embedded"] == 0
+        assert build_index(pasta, indice, index_type="f16")["version"] is None
+
+        embeddings = LentoEmbeddings()
+        rag = RAGService(api_key=None, index_path=indice, embeddings=embeddings)
+        assert rag.index_name == "v2" and type(rag.vectorstore.index).__name__ == "IndexScalarQuantizer"
+        assert "frações" in rag.search("prova de matemática", k=1)
+
+        rag.add_texts(["A excursão ao museu será na quinta-feira."], [{"source": os.path.join(pasta, "novo.txt")}])
+        assert "museu" in rag.search("excursão ao museu", k=1)
+        assert os.path.normpath(os.path.join(pasta, "novo.txt")) in rag.indexed_sources()
+        assert len(rag.indexed_sources()) == 6
+
+        assert rag.save() == "v3"
+        salvo = RAGService(api_key=None, index_path=indice, embeddings=embeddings)
+        assert salvo.vectorstore.index.ntotal == 6 and "museu" in salvo.search("excursão ao museu", k=1)
+        assert IndexStore(indice).versions() == [1, 2, 3]
+        rag.shutdown()
+        salvo.shutdown()
+        print("✅ Tipo escolhido no build e atualizações sobre o índice mapeado")
+
+
+if __name__ == "__main__":
+    test_roundtrip_without_pickle()
+    test_variants_recall_and_size()
+    test_build_types_and_live_updates()
@@ -0,0 +1,227 @@
+"""
+Teste do CostMonitor com gravação adiada (write-behind)
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from langchain_core.messages import AIMessage
+from src.cost_monitor import CostMonitor, token_usage
+from src.usage_store import UsageStore
+
+
+def test_flush_every_n_updates():
+    """O arquivo só é gravado a cada N atualizações; leituras não tocam o disco"""
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        monitor = CostMonitor(arquivo, flush_every=5)
+
+        for _ in range(4):
+            monitor.log_request("groq", "llama-3.3-70b-versatile", 100, "5581000000001")
+        assert not os.path.exists(arquivo)
+        assert monitor.get_user_usage("5581000000001")["requests"] == 4
+        assert monitor.check_user_limit("5581000000001", max_requests=4)[0] is False
+
+        monitor.log_request("groq", "llama-3.3-70b-versatile", 100, "5581000000001")
+        with open(arquivo) as f:
+            assert json.load(f)["total_requests"] == 5
+        assert not [nome for nome in os.listdir(tmp) if nome.startswith(".api_stats.json.")]
+
+        # Reabrindo, os contadores voltam do arquivo
+        assert CostMonitor(arquivo).get_user_usage("5581000000001")["tokens"] == 500
+        print("✅ Gravação a cada N atualizações")
+
+
+def test_background_flush_and_shutdown():
+    """Depois de start(), grava em thread pelo timer e no stop()"""
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        monitor = CostMonitor(arquivo, flush_every=1000, flush_interval=0.05)
+
+        async def cenario():
+            await monitor.start()
+            monitor.log_request("openai", "gpt-3.5-turbo", 1000, "5581000000002")
+            await asyncio.sleep(0.15)
+            with open(arquivo) as f:
+                pelo_timer = json.load(f)["total_requests"]
+            monitor.log_request("openai", "gpt-3.5-turbo", 1000, "5581000000002")
+            await monitor.stop()
+            return pelo_timer
+
+        assert asyncio.run(cenario()) == 1
+        with open(arquivo) as f:
+            stats = json.load(f)
+        assert stats["total_requests"] == 2 and abs(stats["total_cost"] - 0.003) < 1e-9
+        print("✅ Gravação periódica e no desligamento")
+
+
+def test_record_call_counts_toward_flush_every():
+    """Chamadas registradas só em histogramas também disparam a gravação a cada N"""
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        monitor = CostMonitor(arquivo, flush_every=3, flush_interval=3600)
+
+        async def cenario():
+            await monitor.start()
+            for _ in range(2):
+                monitor.record_call("LeoAgent", "groq", "llama-3.3-70b-versatile", 1.0)
+            await asyncio.sleep(0.05)
+            antes = os.path.exists(arquivo)
+            monitor.record_call("LeoAgent", "groq", "llama-3.3-70b-versatile", 1.0)
+            await asyncio.sleep(0.05)  # o flush roda em thread, sem esperar o timer
+            depois = os.path.exists(arquivo)
+            await monitor.stop()
+            return antes, depois
+
+        assert asyncio.run(cenario()) == (False, True)
+        assert CostMonitor(arquivo).get_percentiles("latency_ms")["count"] == 3
+        print("✅ record_call respeita flush_every")
+
+
+def test_flushes_never_overlap():
+    """Timer e flush_every nunca gravam ao mesmo tempo; a última gravação tem tudo"""
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        monitor = CostMonitor(arquivo, flush_every=2, flush_interval=0.01)
+        escrever = monitor._write
+        gravando, maximo = 0, 0
+
+        def escrever_lento(snapshot):
+            nonlocal gravando, maximo
+            gravando += 1
+            maximo = max(maximo, gravando)
+            time.sleep(0.03)
+            try:
+                escrever(snapshot)
+            finally:
+                gravando -= 1
+        monitor._write = escrever_lento
+
+        async def cenario():
+            await monitor.start()
+            for _ in range(20):
+                monitor.log_request("groq", "llama-3.3-70b-versatile", 100, "5581000000003")
+                await asyncio.sleep(0.005)
+            await monitor.stop()
+
+        asyncio.run(cenario())
+        assert maximo == 1
+        reaberto = CostMonitor(arquivo)
+        assert reaberto.stats["total_requests"] == 20
+        assert reaberto.get_user_usage("5581000000003")["requests"] == 20
+        print("✅ Gravações em série")
+
+
+def test_latency_histograms():
+    """Percentis por provedor/modelo/agente saem dos buckets, com ~20% de erro"""
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        monitor = CostMonitor(arquivo)
+        rng = random.Random(7)
+
+        latencias = sorted(rng.lognormvariate(0, 0.5) for _ in range(2000))
+        for latencia in latencias:
+            monitor.record_call("LeoAgent", "groq", "llama-3.3-70b-versatile", latencia,
+                                ttft=latencia / 4, prompt_tokens=800, completion_tokens=rng.randint(50, 300))
+        for _ in range(50):
+            monitor.record_call("AgenteAnalista", "groq", "llama-3.3-70b-versatile", 8.0, prompt_tokens=3000)
+
+        leo = monitor.get_percentiles("latency_ms", agent="LeoAgent")
+        assert leo["count"] == 2000
+        for q, chave in ((0.5, "p50"), (0.95, "p95"), (0.99, "p99")):
+            exato = latencias[int(q * len(latencias))] * 1000
+            assert abs(leo[chave] - exato) / exato < 0.2, (chave, leo[chave], exato)
+
+        assert monitor.get_percentiles("ttft_ms", agent="AgenteAnalista")["count"] == 0
+        assert monitor.get_percentiles("latency_ms")["count"] == 2050
+        assert 100 < monitor.get_percentiles("completion_tokens", agent="LeoAgent")["p50"] < 250
+
+        relatorio = monitor.get_latency_report()
+        assert set(relatorio) == {"groq/llama-3.3-70b-versatile/LeoAgent", "groq/llama-3.3-70b-versatile/AgenteAnalista"}
+
+        # Os histogramas sobrevivem a flush + reabertura
+        monitor._save_stats()
+        reaberto = CostMonitor(arquivo)
+        assert reaberto.get_percentiles("latency_ms", agent="LeoAgent") == leo
+        print(f"✅ Histogramas: p50 {leo['p50']:.0f} ms, p95 {leo['p95']:.0f} ms, p99 {leo['p99']:.0f} ms")
+
+
+def test_token_usage():
+    """Tokens reportados pelo provedor (usage_metadata ou token_usage)"""
+    mensagem = AIMessage(content="oi", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150})
+    assert token_usage(mensagem) == (120, 30)
+    mensagem = AIMessage(content="oi", response_metadata={"token_usage": {"prompt_tokens": 90, "completion_tokens": 10}})
+    assert token_usage(mensagem) == (90, 10)
+    assert token_usage(AIMessage(content="oi")) == (None, None)
+    print("✅ Extração de tokens da resposta")
+
+
+def test_usage_store_rollup_and_incremental_writes():
+    """Dias antigos viram agregados mensais; cada escrita só leva as linhas alteradas"""
+    hoje = datetime.now()
+    ontem = (hoje - timedelta(days=1)).strftime("%Y-%m-%d")
+    antigo = hoje - timedelta(days=70)
+    mes_antigo = antigo.strftime("%Y-%m")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        banco = os.path.join(tmp, "api_stats.db")
+        usage = UsageStore(banco, keep_days=30)
+        for i in range(1000):
+            usage.add(f"55810000{i:05d}", 100, 0.01, day=ontem)
+        assert len(usage.changes()["usuarios"]) == 1000
+
+        usage.add("5581000000007", 50, 0.005, day=ontem)
+        mudancas = usage.changes()
+        assert [u for u, *_ in mudancas["usuarios"]] == ["5581000000007"]
+        assert usage.user("5581000000007") == {"requests": 2, "tokens": 150, "cost": 0.015}
+        usage.write(mudancas)
+
+        # Dias com mais de keep_days saem dos diários e somam no mês
+        usage.add(None, 10, 1.0, day=antigo.strftime("%Y-%m-%d"))
+        usage.add(None, 10, 0.5, day=hoje.strftime("%Y-%m-%d"))
+        assert antigo.strftime("%Y-%m-%d") not in usage.daily
+        assert usage.monthly[mes_antigo][2] == 1.0
+        usage.write(usage.changes())
+
+        reaberto = UsageStore(banco, keep_days=30)
+        assert reaberto.user("5581000000007")["requests"] == 2
+        assert reaberto.monthly[mes_antigo][2] == 1.0
+        assert reaberto.day(ontem)["requests"] == 1001
+        assert abs(reaberto.day(hoje.strftime("%Y-%m-%d"))["cost"] - 0.5) < 1e-9
+        print("✅ UsageStore: agregados mensais e escrita incremental")
+
+
+def test_migrates_old_stats_file():
+    """Um api_stats.json antigo (by_user/daily no JSON) é importado para o banco"""
+    ontem = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, "api_stats.json")
+        with open(arquivo, "w") as f:
+            json.dump({
+                "total_requests": 3, "total_tokens": 300, "total_cost": 0.0, "by_provider": {},
+                "by_user": {"5581000000001": {"requests": 3, "tokens": 300, "cost": 0.0}},
+                "daily": {ontem: {"requests": 3, "tokens": 300, "cost": 0.0}},
+            }, f)
+
+        monitor = CostMonitor(arquivo)
+        assert monitor.get_user_usage("5581000000001")["requests"] == 3
+        assert monitor.check_user_limit("5581000000001", max_requests=3)[0] is False
+        with open(arquivo) as f:
+            stats = json.load(f)
+        assert "by_user" not in stats and "daily" not in stats and stats["total_requests"] == 3
+        assert CostMonitor(arquivo).get_daily_usage(ontem)["tokens"] == 300
+        print("✅ Migração do api_stats.json antigo")
+
+
+if __name__ == "__main__":
+    test_flush_every_n_updates()
+    test_background_flush_and_shutdown()
+    test_record_call_counts_toward_flush_every()
+    test_flushes_never_overlap()
+    test_latency_histograms()
+    test_token_usage()
+    test_usage_store_rollup_and_incremental_writes()
+    test_migrates_old_stats_file()
@@ -0,0 +1,72 @@
+"""
+Teste do armazenamento de engajamento (SQLite) - inserção em lote, importação e exportação
+"""
+import asyncio
+import json
+import os
+import tempfile
+from src.engagement_store import EngagementStore
+
+
+def _registro(aluno_id, score, timestamp="2025-11-09T12:00:00"):
+    return {
+        "aluno_id": aluno_id,
+        "timestamp": timestamp,
+        "engajamento_comportamental": 0.5,
+        "engajamento_emocional": 0.5,
+        "engajamento_cognitivo": 0.5,
+        "score_desmotivacao": score,
+        "observacoes_chave": ["Não entendi nada 😞"],
+        "escola": "Colégio Estadual Padre Roma",
+        "cidade": "Campina Grande",
+        "lat": -7.2305,
+        "lon": -35.8811
+    }
+
+
+def test_batched_inserts_do_not_lose_writes():
+    """Análises concorrentes são todas gravadas"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EngagementStore(os.path.join(tmp, "engajamento.db"), batch_size=7, flush_interval=0.01)
+
+        async def run():
+            await store.start()
+
+            async def analise(i):
+                await asyncio.sleep(0)
+                store.add(_registro(f"55810000{i:05d}", i / 200))
+
+            await asyncio.gather(*(analise(i) for i in range(200)))
+            await store.stop()
+
+        asyncio.run(run())
+        assert len(store.query()) == 200
+        assert store.query(aluno_id="5581000000007")[0]["observacoes_chave"] == ["Não entendi nada 😞"]
+        print("✅ 200 análises concorrentes gravadas")
+
+
+def test_import_once_and_export():
+    """O JSON antigo é importado uma única vez e pode ser exportado de volta"""
+    with tempfile.TemporaryDirectory() as tmp:
+        legado = os.path.join(tmp, "alertas.json")
+        with open(legado, "w", encoding="utf-8") as f:
+            json.dump([_registro("5583912345678", 0.4), _registro("5583998877665", 0.9, "2025-11-10T09:00:00")], f)
+
+        store = EngagementStore(os.path.join(tmp, "engajamento.db"))
+        assert store.import_json(legado) == 2
+        assert store.import_json(legado) == 0
+
+        store.add(_registro("5581987654321", 0.85, "2025-11-11T10:00:00"))
+        assert [r["aluno_id"] for r in store.query(since="2025-11-10")] == ["5581987654321", "5583998877665"]
+        assert len(store.query(escola="Colégio Estadual Padre Roma")) == 3
+
+        exportado = os.path.join(tmp, "export.json")
+        assert store.export_json(exportado) == 3
+        with open(exportado, "r", encoding="utf-8") as f:
+            assert json.load(f)[0]["aluno_id"] == "5583912345678"
+        print("✅ Importação única e exportação funcionando")
+
+
+if __name__ == "__main__":
+    test_batched_inserts_do_not_lose_writes()
+    test_import_once_and_export()
@@ -0,0 +1,105 @@
+"""
+Teste do IndexStore: versões imutáveis e ponteiro CURRENT trocado atomicamente
+"""
+import os
+import tempfile
+import threading
+import time
+from src.index_store import IndexStore
+
+
+def escrever(conteudo):
+    def write(pasta):
+        with open(os.path.join(pasta, "index.faiss"), "w") as f:
+            f.write(conteudo)
+    return write
+
+
+def test_publish_and_pointer():
+    """Cada publicação cria v<N> e só então move o ponteiro"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(os.path.join(tmp, "faiss_index"), keep=2, grace=0)
+        assert store.current() is None and store.pointer_stat() is None
+
+        assert store.publish(escrever("a")) == "v1"
+        primeiro = store.pointer_stat()
+        assert store.publish(escrever("b")) == "v2"
+        assert store.current() == "v2" and store.pointer_stat() != primeiro
+        with open(os.path.join(store.path("v2"), "index.faiss")) as f:
+            assert f.read() == "b"
+
+        # Só as últimas `keep` versões ficam no disco
+        store.publish(escrever("c"))
+        assert store.versions() == [2, 3]
+        assert not [nome for nome in os.listdir(store.root) if nome.startswith(".") and nome != ".publish.lock"]
+        print("✅ Publicação versionada com ponteiro atômico")
+
+
+def test_failed_write_keeps_current():
+    """Erro ao gravar não deixa versão pela metade nem mexe no ponteiro"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(tmp)
+        store.publish(escrever("a"))
+
+        def quebra(pasta):
+            escrever("meio")(pasta)
+            raise IOError("disco cheio")
+
+        try:
+            store.publish(quebra)
+            assert False, "deveria falhar"
+        except IOError:
+            pass
+        assert store.current() == "v1" and store.versions() == [1]
+        assert sorted(os.listdir(tmp)) == [".publish.lock", "CURRENT", "v1"]
+        print("✅ Falha na gravação preserva a versão atual")
+
+
+def test_prune_keeps_recent_versions():
+    """Versão anterior fica no disco: a recém-substituída e a de quem ainda pode estar carregando"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(tmp, keep=1)
+        for conteudo in "abcd":
+            store.publish(escrever(conteudo))
+        assert store.versions() == [1, 2, 3, 4]  # substituídas há menos de `grace` segundos
+
+        store.grace = 0
+        store.prune()
+        assert store.versions() == [3, 4]  # keep=1 ainda guarda a anterior
+        print("✅ Limpeza preserva versões recentes")
+
+
+def test_publish_lock():
+    """Quem segura o lock bloqueia a publicação de outro escritor"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(tmp)
+        publicado = []
+        with store.lock():
+            outro = threading.Thread(target=lambda: publicado.append(IndexStore(tmp).publish(escrever("b"))))
+            outro.start()
+            time.sleep(0.1)
+            assert publicado == [] and store.current() is None
+            store.publish(escrever("a"), locked=True)
+        outro.join()
+        assert publicado == ["v2"] and store.current() == "v2"
+        print("✅ Publicações serializadas pelo lock")
+
+
+def test_legacy_layout():
+    """Pasta antiga (index.faiss na raiz, sem CURRENT) continua sendo lida"""
+    with tempfile.TemporaryDirectory() as tmp:
+        escrever("antigo")(tmp)
+        store = IndexStore(tmp)
+        assert store.current() == "legacy" and store.path("legacy") == tmp
+
+        store.publish(escrever("novo"))
+        assert store.current() == "v1"
+        print("✅ Formato antigo ainda suportado")
+
+
+if __name__ == "__main__":
+    test_publish_and_pointer()
+    test_failed_write_keeps_current()
+    test_prune_keeps_recent_versions()
+    test_publish_lock()
+    test_legacy_layout()
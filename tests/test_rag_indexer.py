@@ -0,0 +1,199 @@
+"""
+Teste do RAGIndexer: documento novo entra no índice em memória sem reindexar tudo
+"""
+import asyncio
+import os
+import tempfile
+from langchain_community.vectorstores import FAISS
+from src.compact_index import load_version
+from src.index_store import IndexStore
+from src.professor_agent import ProfessorAgent
+from src.rag_indexer import RAGIndexer
+from src.rag_service import RAGService
+from tests.test_rag_service import LentoEmbeddings, TRECHOS, criar_indice
+
+AVISO = "Atenção turma: a excursão ao museu será na quinta-feira, levar autorização assinada."
+
+
+def criar_documento(pasta, nome, texto):
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(texto)
+    return caminho
+
+
+def test_index_new_document():
+    """Só os trechos do documento novo são calculados e a busca já encontra"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = LentoEmbeddings()
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=embeddings)
+        pasta = os.path.join(tmp, "documentos_escola")
+        indexer = RAGIndexer(rag, documents_dir=pasta, persist_delay=0.05)
+        caminho = criar_documento(pasta, "professor_msg_1.txt", AVISO)
+
+        async def cenario():
+            antes = await rag.asearch("excursão ao museu", k=1)
+            embeddings.lotes.clear()
+            adicionados = await indexer.index_file(caminho)
+            depois = await rag.asearch("excursão ao museu", k=1)
+            await asyncio.sleep(0.2)  # gravação em segundo plano
+            return antes, adicionados, depois
+
+        antes, adicionados, depois = asyncio.run(cenario())
+        assert "museu" not in antes
+        assert adicionados == 1 and "museu" in depois
+        assert embeddings.lotes[0] == 1  # só o documento novo, não o índice inteiro
+        assert rag.vectorstore.index.ntotal == 6
+        assert rag.index_version == 2 and rag.get_cache_stats()["invalidations"] == 1
+
+        # Gravado em disco sem bloquear quem chamou
+        assert indexer.stats["saves"] == 1
+        assert rag.store.current() == rag.index_name == "v1"
+        salvo = load_version(rag.store.path("v1"), embeddings)
+        assert salvo.index.ntotal == 6 and "museu" in salvo.docstore.search(salvo.index_to_docstore_id[5]).page_content
+        assert not os.path.exists(os.path.join(rag.store.path("v1"), "index.pkl"))
+        rag.shutdown()
+        print("✅ Documento novo indexado e gravado em segundo plano")
+
+
+def test_inflight_search_keeps_old_index():
+    """Uma busca em andamento termina com a versão do índice em que começou"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = LentoEmbeddings(atraso=0.2)
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=embeddings)
+        pasta = os.path.join(tmp, "documentos_escola")
+        indexer = RAGIndexer(rag, documents_dir=pasta)
+        caminho = criar_documento(pasta, "professor_msg_1.txt", AVISO)
+        antigo = rag.vectorstore
+
+        async def cenario():
+            busca = asyncio.create_task(rag.asearch("excursão ao museu", k=1))
+            await asyncio.sleep(0.05)
+            await indexer.index_file(caminho)
+            return await busca
+
+        assert "museu" not in asyncio.run(cenario())
+        assert antigo.index.ntotal == 5 and rag.vectorstore is not antigo
+        rag.shutdown()
+        print("✅ Busca em andamento não é afetada pela troca do índice")
+
+
+def test_sync_directory_skips_indexed():
+    """sync_directory só indexa o que falta (inclusive caminhos gravados no Windows)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = os.path.join(tmp, "documentos_escola")
+        antigo = criar_documento(pasta, "calendario.txt", "O recesso escolar começa no dia 1 de julho.")
+        criar_documento(pasta, "professor_msg_1.txt", AVISO)
+
+        caminho = os.path.join(tmp, "faiss_index")
+        FAISS.from_texts(["O recesso escolar começa no dia 1 de julho."], LentoEmbeddings(),
+                         metadatas=[{"source": antigo.replace("/", "\\")}]).save_local(caminho)
+        rag = RAGService(api_key=None, index_path=caminho, embeddings=LentoEmbeddings())
+        indexer = RAGIndexer(rag, documents_dir=pasta)
+
+        async def cenario():
+            primeira = await indexer.sync_directory()
+            segunda = await indexer.sync_directory()
+            await indexer.stop()
+            return primeira, segunda
+
+        assert asyncio.run(cenario()) == (1, 0)
+        assert rag.vectorstore.index.ntotal == 2 and indexer.stats["saves"] == 1
+        rag.shutdown()
+        print("✅ Sincronização indexa só documentos novos")
+
+
+def test_publish_before_index_loads():
+    """Documento publicado antes do aquecimento entra sobre o índice publicado, não no lugar dele"""
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, "faiss_index")
+        IndexStore(caminho).publish(FAISS.from_texts(TRECHOS, LentoEmbeddings()).save_local)
+        rag = RAGService(api_key=None, index_path=caminho, embeddings=LentoEmbeddings(), load_index=False)
+        pasta = os.path.join(tmp, "documentos_escola")
+        indexer = RAGIndexer(rag, documents_dir=pasta, persist_delay=0.05)
+        documento = criar_documento(pasta, "professor_msg_1.txt", AVISO)
+
+        async def cenario():
+            await indexer.index_file(documento)
+            await indexer.stop()
+
+        asyncio.run(cenario())
+        assert rag.store.current() == "v2" and load_version(rag.store.path("v2"), LentoEmbeddings()).index.ntotal == 6
+
+        # O aquecimento termina depois: não descarta o trecho novo
+        assert rag.load() is True and rag.vectorstore.index.ntotal == 6
+        assert "frações" in rag.search("prova de matemática", k=1) and "museu" in rag.search("excursão ao museu", k=1)
+
+        # Um índice montado sem o publicado nunca o substitui
+        outro = RAGService(api_key=None, index_path=caminho, embeddings=LentoEmbeddings(), load_index=False)
+        outro._set_vectorstore(FAISS.from_texts([AVISO], LentoEmbeddings()))
+        assert outro.save() == "v2" and rag.store.current() == "v2"
+        assert outro.vectorstore.index.ntotal == 6
+        rag.shutdown()
+        outro.shutdown()
+        print("✅ Publicação antes do índice carregar não apaga o corpus")
+
+
+def test_workers_publish_without_losing_documents():
+    """Dois workers indexam documentos diferentes: a última publicação tem os dois"""
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, "faiss_index")
+        IndexStore(caminho).publish(FAISS.from_texts(TRECHOS, LentoEmbeddings()).save_local)
+        pasta = os.path.join(tmp, "documentos_escola")
+        um, dois = (RAGService(api_key=None, index_path=caminho, embeddings=LentoEmbeddings()) for _ in range(2))
+        aviso = criar_documento(pasta, "professor_msg_1.txt", AVISO)
+        reuniao = criar_documento(pasta, "professor_msg_2.txt", "A reunião de pais será no sábado às 9h.")
+
+        um.add_texts([AVISO], [{"source": aviso}])
+        dois.add_texts(["A reunião de pais será no sábado às 9h."], [{"source": reuniao}])
+        # O mesmo documento nos dois workers (sincronização na inicialização) não é duplicado
+        dois.add_texts([AVISO], [{"source": aviso}])
+        assert um.save() == "v2"
+        assert dois.save() == "v3"
+
+        publicado = load_version(um.store.path("v3"), LentoEmbeddings())
+        assert publicado.index.ntotal == 7 and dois.vectorstore.index.ntotal == 7
+        fontes = {m.get("source") for m in publicado.docstore.metadatas()}
+        assert {um.normalize_source(aviso), um.normalize_source(reuniao)} <= fontes
+
+        # O primeiro worker recebe a versão nova sem perder nada; sem novidades, nada é publicado
+        assert um.refresh() and um.vectorstore.index.ntotal == 7
+        assert um.save() == "v3" and um.store.versions() == [1, 2, 3]
+        um.shutdown()
+        dois.shutdown()
+        print("✅ Publicações de workers diferentes não se sobrescrevem")
+
+
+def test_professor_publish_indexes():
+    """PUBLICAR salva o arquivo e o aluno já encontra sem REINDEXAR"""
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=LentoEmbeddings())
+        indexer = RAGIndexer(rag, persist_delay=0.05)
+        professor = ProfessorAgent(api_key="teste", indexer=indexer)
+        pasta_original = os.getcwd()
+        os.chdir(tmp)
+        try:
+            async def cenario():
+                professor.start_professor_session("5581999999999")
+                professor.add_to_buffer("5581999999999", AVISO)
+                resposta = professor.add_to_buffer("5581999999999", "PUBLICAR")
+                await indexer.stop()
+                return resposta, await rag.asearch("excursão ao museu", k=1)
+
+            resposta, contexto = asyncio.run(cenario())
+        finally:
+            os.chdir(pasta_original)
+        assert "REINDEXAR" not in resposta and "alguns segundos" in resposta
+        assert "museu" in contexto
+        rag.shutdown()
+        print("✅ Publicação do professor indexada automaticamente")
+
+
+if __name__ == "__main__":
+    test_index_new_document()
+    test_inflight_search_keeps_old_index()
+    test_sync_directory_skips_indexed()
+    test_publish_before_index_loads()
+    test_workers_publish_without_losing_documents()
+    test_professor_publish_indexes()
@@ -0,0 +1,86 @@
+"""
+Teste da ingestão incremental (manifesto por hash + divisão em processos)
+"""
+import os
+import tempfile
+import time
+from src.index_store import IndexStore
+from src.rag_ingest import build_index
+from src.rag_service import RAGService
+from tests.test_rag_service import LentoEmbeddings, TRECHOS
+
+
+def criar_documentos(pasta, textos):
+    os.makedirs(pasta, exist_ok=True)
+    for i, texto in enumerate(textos):
+        with open(os.path.join(pasta, f"doc_{i:02d}.txt"), "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+def test_only_changed_files_are_embedded():
+    """Segunda execução não recalcula nada; arquivo alterado recalcula só ele"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta, indice = os.path.join(tmp, "documentos_escola"), os.path.join(tmp, "faiss_index")
+        criar_documentos(pasta, TRECHOS)
+        embeddings = LentoEmbeddings()
+
+        primeira = build_index(pasta, indice, embeddings=embeddings, workers=2, batch_size=2, threads=2)
+        assert primeira["version"] == "v1" and primeira["embedded"] == 5 and primeira["chunks"] == 5
+        assert sorted(embeddings.lotes) == [1, 2, 2]
+
+        # Nada mudou: nem lê os arquivos, nem publica versão nova
+        embeddings.lotes.clear()
+        segunda = build_index(pasta, indice, embeddings=embeddings)
+        assert segunda["version"] is None and segunda["split"] == 0 and embeddings.lotes == []
+
+        # Só a data mudou (mesmo conteúdo): relê, mas não recalcula
+        os.utime(os.path.join(pasta, "doc_00.txt"), (time.time() + 5, time.time() + 5))
+        assert build_index(pasta, indice, embeddings=embeddings)["embedded"] == 0
+
+        # Um arquivo alterado, um novo e um removido
+        with open(os.path.join(pasta, "doc_03.txt"), "w", encoding="utf-8") as f:
+            f.write("O recesso escolar começa no dia 8 de julho.")
+        with open(os.path.join(pasta, "doc_09.txt"), "w", encoding="utf-8") as f:
+            f.write("A excursão ao museu será na quinta-feira.")
+        os.remove(os.path.join(pasta, "doc_04.txt"))
+        terceira = build_index(pasta, indice, embeddings=embeddings)
+        assert (terceira["changed"], terceira["removed"], terceira["embedded"]) == (2, 1, 2)
+        assert terceira["version"] == "v2" and embeddings.lotes == [2]
+
+        rag = RAGService(api_key=None, index_path=indice, embeddings=LentoEmbeddings())
+        assert rag.index_name == "v2" and rag.vectorstore.index.ntotal == 5
+        assert "8 de julho" in rag.search("quando começa o recesso?", k=1)
+        assert "museu" in rag.search("excursão ao museu", k=1)
+        assert "feira de ciências" not in (rag.search("feira de ciências no ginásio", k=5) or "")
+        rag.shutdown()
+        print("✅ Só arquivos novos/alterados são recalculados")
+
+
+def test_same_result_as_full_rebuild():
+    """Índice incremental tem os mesmos trechos e vetores de uma reconstrução completa"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta, indice = os.path.join(tmp, "documentos_escola"), os.path.join(tmp, "faiss_index")
+        criar_documentos(pasta, TRECHOS[:3])
+        build_index(pasta, indice, embeddings=LentoEmbeddings(), workers=1)
+        criar_documentos(pasta, TRECHOS)
+        incremental = build_index(pasta, indice, embeddings=LentoEmbeddings(), workers=1)
+        completo = build_index(pasta, indice, embeddings=LentoEmbeddings(), workers=1, full=True)
+        assert incremental["embedded"] == 2 and completo["embedded"] == 5
+
+        rag = RAGService(api_key=None, index_path=indice, embeddings=LentoEmbeddings())
+        assert rag.index_name == "v3" and IndexStore(indice).versions() == [1, 2, 3]
+
+        def conteudo(nome):
+            vs = rag._load(nome)
+            textos = sorted(vs.docstore.search(vs.index_to_docstore_id[i]).page_content for i in range(vs.index.ntotal))
+            vetores = sorted(map(tuple, vs.index.reconstruct_n(0, vs.index.ntotal).round(5)))
+            return textos, vetores
+
+        assert conteudo("v2") == conteudo("v3")
+        rag.shutdown()
+        print("✅ Incremental igual à reconstrução completa")
+
+
+if __name__ == "__main__":
+    test_only_changed_files_are_embedded()
+    test_same_result_as_full_rebuild()
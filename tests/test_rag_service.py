@@ -0,0 +1,191 @@
+"""
+Teste do RAGService assíncrono (embeddings falsos, índice FAISS temporário)
+"""
+import asyncio
+import gc
+import os
+import tempfile
+import time
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from src.index_store import IndexStore
+from src.rag_service import RAGService
+from tests.test_semantic_detector import TrigramEmbeddings
+
+TRECHOS = [
+    "A prova de matemática será no dia 15 de março, conteúdo: frações e decimais.",
+    "A prova de história será no dia 20 de março, sobre a Segunda Guerra Mundial.",
+    "Tarefa de português: ler o capítulo 3 do livro e fazer um resumo.",
+    "O recesso escolar começa no dia 1 de julho.",
+    "A feira de ciências acontece no ginásio na última sexta do mês.",
+]
+
+
+class LentoEmbeddings(TrigramEmbeddings):
+    """Trigramas normalizados com custo fixo por chamada (como o MiniLM, libera o GIL)"""
+
+    def __init__(self, atraso=0.0):
+        super().__init__()
+        self.atraso = atraso
+        self.lotes = []
+
+    def embed_documents(self, textos):
+        self.lotes.append(len(textos))
+        time.sleep(self.atraso)
+        return super().embed_documents(textos)
+
+    def _embed(self, texto):
+        vetor = np.asarray(super()._embed(texto))
+        return (vetor / np.linalg.norm(vetor)).tolist()
+
+
+def criar_indice(pasta, trechos=TRECHOS):
+    caminho = os.path.join(pasta, "faiss_index")
+    FAISS.from_texts(trechos, LentoEmbeddings()).save_local(caminho)
+    return caminho
+
+
+def test_async_search_matches_sync():
+    """asearch devolve o mesmo contexto que search"""
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=LentoEmbeddings())
+        for pergunta in ("quando é a prova de matemática?", "qual a tarefa de português?"):
+            assert asyncio.run(rag.asearch(pergunta, k=2)) == rag.search(pergunta, k=2)
+        assert "frações" in rag.search("quando é a prova de matemática?", k=1)
+        rag.shutdown()
+        print("✅ Busca assíncrona igual à síncrona")
+
+
+def test_micro_batching():
+    """Consultas simultâneas viram uma única chamada a embed_documents"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = LentoEmbeddings(atraso=0.02)
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=embeddings,
+                         batch_window=0.01, max_batch=16)
+        embeddings.lotes.clear()
+        perguntas = [f"quando é a prova {i}?" for i in range(10)] + ["recesso escolar"]
+
+        async def cenario(perguntas):
+            return await asyncio.gather(*(rag.asearch(p, k=1) for p in perguntas))
+
+        resultados = asyncio.run(cenario(perguntas))
+        assert embeddings.lotes == [11]
+        assert "recesso" in resultados[-1]
+        assert rag.stats == {"queries": 11, "batches": 1}
+
+        # Acima de max_batch o lote sai na hora
+        embeddings.lotes.clear()
+        rag.max_batch = 4
+        asyncio.run(cenario([f"tem tarefa {i}?" for i in range(11)]))
+        assert embeddings.lotes == [4, 4, 3]
+        rag.shutdown()
+        print("✅ Micro-batching de consultas simultâneas")
+
+
+def test_event_loop_not_blocked():
+    """Enquanto o embedding roda, o loop continua atendendo outras corrotinas"""
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=LentoEmbeddings(atraso=0.2))
+
+        async def cenario():
+            ticks = 0
+
+            async def relogio():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            tarefa = asyncio.create_task(relogio())
+            await rag.asearch("prova de história")
+            tarefa.cancel()
+            return ticks
+
+        assert asyncio.run(cenario()) >= 10
+        rag.shutdown()
+        print("✅ Loop de eventos livre durante a busca")
+
+
+def test_missing_index():
+    """Sem índice, asearch devolve None sem erro"""
+    rag = RAGService(api_key=None, index_path="/nao/existe", embeddings=LentoEmbeddings())
+    assert asyncio.run(rag.asearch("prova")) is None
+    rag.shutdown()
+    print("✅ Sem índice")
+
+
+def test_two_level_cache():
+    """Consultas normalizadas iguais reaproveitam embedding e resultado"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = LentoEmbeddings()
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=embeddings,
+                         embedding_cache_size=2, result_cache_size=8)
+        embeddings.lotes.clear()
+
+        primeiro = rag.search("Quando é a prova?")
+        assert rag.search("quando e a prova") == primeiro
+        assert rag.search("  QUANDO É A PROVA ") == primeiro
+        assert embeddings.lotes == [1]
+
+        # Outro k: resultado novo, mas o embedding vem do cache
+        rag.search("quando é a prova?", k=1)
+        assert embeddings.lotes == [1]
+
+        # Mesma pergunta repetida no mesmo lote: um embedding só
+        async def cenario():
+            return await asyncio.gather(*(rag.asearch(p) for p in ["recesso?", "Recesso", "feira de ciências"]))
+        asyncio.run(cenario())
+        assert embeddings.lotes == [1, 2]
+
+        stats = rag.get_cache_stats()
+        assert stats["results"]["hits"] == 2 and stats["embeddings"]["evictions"] == 1
+        assert stats["embeddings"]["bytes"] == 2 * 512 * 4
+
+        # Índice novo: os dois níveis são invalidados
+        rag._set_vectorstore(rag.vectorstore)
+        rag.search("quando é a prova?")
+        assert embeddings.lotes == [1, 2, 1]
+        assert rag.get_cache_stats()["invalidations"] == 1
+        rag.shutdown()
+        print(f"✅ Cache em dois níveis: {stats['results']['hit_rate']:.0%} de acerto nos resultados")
+
+
+def test_hot_swap_published_version():
+    """Versão publicada por outro processo entra sem atrapalhar a busca em andamento"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(os.path.join(tmp, "faiss_index"))
+        store.publish(FAISS.from_texts(TRECHOS, LentoEmbeddings()).save_local)
+        embeddings = LentoEmbeddings(atraso=0.2)
+        rag = RAGService(api_key=None, index_path=store.root, embeddings=embeddings, poll_interval=0.02)
+        assert rag.index_name == "v1" and not rag.refresh()
+
+        async def cenario():
+            await rag.start()
+            busca = asyncio.create_task(rag.asearch("excursão ao museu", k=1))
+            await asyncio.sleep(0.05)
+            # prep_rag.py em outro processo
+            novos = TRECHOS + ["A excursão ao museu será na quinta-feira."]
+            store.publish(FAISS.from_texts(novos, LentoEmbeddings()).save_local)
+            await asyncio.sleep(0.1)
+            trocou, ocupadas = rag.index_name, rag.draining()
+            antigo = await busca
+            gc.collect()
+            novo = await rag.asearch("excursão ao museu", k=1)
+            await rag.stop()
+            return trocou, ocupadas, antigo, novo
+
+        trocou, ocupadas, antigo, novo = asyncio.run(cenario())
+        assert trocou == "v2" and ocupadas == [1]  # v1 ainda servindo a busca em andamento
+        assert "museu" not in antigo and "museu" in novo
+        assert rag.draining() == []  # liberado depois que a busca terminou
+        rag.shutdown()
+        print("✅ Troca de versão a quente sem bloquear buscas")
+
+
+if __name__ == "__main__":
+    test_async_search_matches_sync()
+    test_micro_batching()
+    test_event_loop_not_blocked()
+    test_missing_index()
+    test_two_level_cache()
+    test_hot_swap_published_version()
@@ -0,0 +1,64 @@
+"""
+Teste do cadastro de escolas - ordem da busca e localização fora do LLM
+"""
+import os
+import tempfile
+from src.analytics_agent import AgenteAnalista
+from src.school_registry import ESCOLA_PADRAO, SchoolRegistry
+
+CABECALHO = "chave,escola,cidade,lat,lon\n"
+LINHAS = [
+    "5581000000001,Escola do Telefone,Recife,-8.05,-34.9\n",
+    "instancia-cg,Escola da Instância,Campina Grande,-7.23,-35.88\n",
+    "*,Escola Padrão do Cadastro,João Pessoa,-7.12,-34.86\n",
+]
+
+
+def criar_cadastro(pasta, linhas):
+    caminho = os.path.join(pasta, "escolas.csv")
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(CABECALHO + "".join(linhas))
+    return caminho
+
+
+def test_resolve_order():
+    """Telefone, depois instância, depois "*", depois ESCOLA_PADRAO"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registro = SchoolRegistry(criar_cadastro(tmp, LINHAS))
+        assert registro.resolve("5581000000001", "instancia-cg").escola == "Escola do Telefone"
+        assert registro.resolve("5581000000002", "instancia-cg").escola == "Escola da Instância"
+        assert registro.resolve("5581000000002", "outra").escola == "Escola Padrão do Cadastro"
+        assert registro.resolve("5581000000002").escola == "Escola Padrão do Cadastro"
+
+        sem_padrao = SchoolRegistry(criar_cadastro(tmp, LINHAS[:2]))
+        assert sem_padrao.resolve("5581000000002", "outra") == ESCOLA_PADRAO
+        assert SchoolRegistry(os.path.join(tmp, "nao_existe.csv")).resolve("5581000000001") == ESCOLA_PADRAO
+        print("✅ Ordem de busca do cadastro de escolas")
+
+
+def test_llm_location_replaced():
+    """escola/cidade/lat/lon inventados pelo LLM são descartados e vêm do cadastro"""
+    with tempfile.TemporaryDirectory() as tmp:
+        agente = AgenteAnalista(api_key="test", registry=SchoolRegistry(criar_cadastro(tmp, LINHAS)),
+                                instance="instancia-cg")
+        analise = agente._criar_analise("5581000000002", {
+            "aluno_id": "5581000000002",
+            "engajamento_comportamental": 0.7,
+            "engajamento_emocional": 0.6,
+            "engajamento_cognitivo": 0.8,
+            "score_desmotivacao": 0.3,
+            "observacoes_chave": ["Como somar frações?"],
+            "escola": "Escola Inventada",
+            "cidade": "Atlântida",
+            "lat": 0.0,
+            "lon": 0.0,
+        })
+        assert (analise.escola, analise.cidade, analise.lat, analise.lon) == \
+            ("Escola da Instância", "Campina Grande", -7.23, -35.88)
+        assert analise.engajamento_cognitivo == 0.8
+        print("✅ Localização vem do cadastro, não do LLM")
+
+
+if __name__ == "__main__":
+    test_resolve_order()
+    test_llm_location_replaced()
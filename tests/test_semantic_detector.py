@@ -0,0 +1,98 @@
+"""
+Teste do detector semântico de crise (embeddings falsos, sem baixar o MiniLM)
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import zlib
+import numpy as np
+from src.alert_detector import AlertDetector
+from src.semantic_detector import SemanticCrisisDetector
+
+
+class TrigramEmbeddings:
+    """Embeddings determinísticos: trigramas de caracteres em 512 dimensões"""
+
+    def __init__(self):
+        self.threads = set()
+
+    def _embed(self, texto):
+        vetor = np.zeros(512, dtype=np.float32)
+        texto = f"  {texto.lower()}  "
+        for i in range(len(texto) - 2):
+            vetor[zlib.crc32(texto[i:i + 3].encode()) % 512] += 1
+        return vetor.tolist()
+
+    def embed_documents(self, textos):
+        self.threads.add(threading.current_thread().name)
+        return [self._embed(t) for t in textos]
+
+    def embed_query(self, texto):
+        return self._embed(texto)
+
+
+def criar_exemplares(pasta):
+    caminho = os.path.join(pasta, "crisis_exemplars.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "categorias": {
+            "self_harm": {"threshold": 0.6, "exemplos": ["pensando em sumir do mapa", "queria desaparecer pra sempre"]},
+            "bullying": {"threshold": 0.6, "exemplos": ["os meninos ficam me zoando", "me empurram no corredor"]},
+            "severe_anxiety": {"threshold": 0.6, "exemplos": ["meu coração dispara na prova"]},
+        }}, f)
+    return caminho
+
+
+def test_detect_by_category():
+    """Paráfrases próximas dos exemplos são marcadas, o resto não"""
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = SemanticCrisisDetector(TrigramEmbeddings(), criar_exemplares(tmp))
+        assert detector.enabled and detector._matrix.shape == (8, 512)  # 5 exemplos + 3 centroides
+
+        resultados = detector.detect_many([
+            "to pensando em sumir do mapa",
+            "os meninos da sala ficam me zoando",
+            "qual a fórmula de bhaskara?",
+        ])
+        assert [c for c, _ in resultados[0]] == ["self_harm"]
+        assert [c for c, _ in resultados[1]] == ["bullying"]
+        assert resultados[2] == []
+        unico = detector.detect("to pensando em sumir do mapa")
+        assert unico[0][0] == "self_harm" and abs(unico[0][1] - resultados[0][0][1]) < 1e-5
+        print("✅ Categorias semânticas detectadas")
+
+
+def test_second_stage_in_thread_pool():
+    """Sem padrão correspondente, o AlertDetector usa o detector semântico fora do event loop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = TrigramEmbeddings()
+        textos = []
+        embed_documents = embeddings.embed_documents
+        embeddings.embed_documents = lambda lote: textos.extend(lote) or embed_documents(lote)
+        detector = AlertDetector(
+            alerts_dir=os.path.join(tmp, "critical_alerts"),
+            legacy_alerts_file=None,
+            semantic_detector=SemanticCrisisDetector(embeddings, criar_exemplares(tmp))
+        )
+
+        async def cenario():
+            regex = await detector.adetect_critical_situation("não aguento mais", "1")
+            semantico = await detector.adetect_critical_situation("tô pensando em sumir do mapa", "2")
+            normal = await detector.adetect_critical_situation("me explica frações?", "3")
+            return regex, semantico, normal
+
+        (ok1, a1), (ok2, a2), (ok3, _) = asyncio.run(cenario())
+        assert ok1 and not a1["pattern_matched"].startswith("semantic")
+        assert ok2 and a2["category"] == "self_harm" and a2["pattern_matched"].startswith("semantic:")
+        assert not ok3
+        assert any(name.startswith("semantic") for name in embeddings.threads)
+        # Mensagem embutida como escrita, na mesma forma dos exemplos
+        assert "tô pensando em sumir do mapa" in textos and "pensando em sumir do mapa" in textos
+        assert len(detector.get_pending_alerts()) == 2
+        print("✅ Segundo estágio semântico no thread pool")
+
+
+if __name__ == "__main__":
+    test_detect_by_category()
+    test_second_stage_in_thread_pool()
@@ -0,0 +1,101 @@
+"""
+Teste do aquecimento em segundo plano e do endpoint /ready
+"""
+import asyncio
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from fastapi.testclient import TestClient
+from src.rag_service import RAGService
+from src.warmup import Warmup
+from src.webhook import create_webhook_app
+from tests.test_rag_service import LentoEmbeddings, criar_indice
+
+
+def test_steps_and_failures():
+    """Passos rodam em ordem fora do loop; falha vira 'degraded' e não trava o ready"""
+    warmup = Warmup()
+    ordem = []
+
+    def modelo():
+        time.sleep(0.05)
+        ordem.append("modelo")
+
+    def quebra():
+        raise RuntimeError("índice corrompido")
+
+    async def atualizacoes():
+        ordem.append("atualizacoes")
+
+    warmup.add("modelo", modelo)
+    warmup.add("indice", quebra)
+    warmup.add("atualizacoes", atualizacoes)
+    warmup.mark("imports")
+
+    async def cenario():
+        await warmup.start()
+        antes = warmup.status()
+        await warmup.wait()
+        return antes
+
+    antes = asyncio.run(cenario())
+    assert antes["ready"] is False and antes["pending"] == ["modelo", "indice", "atualizacoes"]
+    status = warmup.status()
+    assert status["ready"] and status["degraded"] == ["indice"] and status["pending"] == []
+    assert ordem == ["modelo", "atualizacoes"]
+    assert status["warmup"]["modelo"]["seconds"] >= 0.05
+    assert "índice corrompido" in status["warmup"]["indice"]["error"]
+    assert set(status["startup"]) == {"imports", "until_serving"}
+    print("✅ Passos do aquecimento e falhas reportadas")
+
+
+def test_search_before_warmup():
+    """Antes do aquecimento a busca devolve None na hora (caminho sem RAG)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = RAGService(api_key=None, index_path=criar_indice(tmp), embeddings=LentoEmbeddings(atraso=0.5),
+                         load_index=False)
+        inicio = time.perf_counter()
+        assert asyncio.run(rag.asearch("prova de matemática")) is None
+        assert time.perf_counter() - inicio < 0.1
+
+        assert rag.load() is True and rag.index_name == "legacy"
+        assert "frações" in rag.search("prova de matemática", k=1)
+        rag.shutdown()
+        print("✅ Sem RAG até o índice carregar")
+
+
+def test_ready_endpoint():
+    """/ready responde 503 até o aquecimento terminar; /health sempre 200"""
+    warmup = Warmup()
+    liberar = asyncio.Event()
+
+    async def modelo():
+        await liberar.wait()
+
+    warmup.add("modelo", modelo)
+    app = create_webhook_app(None, warmup=warmup)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await warmup.start()
+        yield
+        await warmup.stop()
+
+    app.router.lifespan_context = lifespan
+
+    with TestClient(app) as client:
+        resposta = client.get("/ready")
+        assert resposta.status_code == 503 and resposta.json()["warmup"]["modelo"]["status"] == "running"
+        assert client.get("/health").status_code == 200
+
+        client.portal.call(liberar.set)
+        client.portal.call(warmup.wait)
+        resposta = client.get("/ready")
+        assert resposta.status_code == 200 and resposta.json()["ready"] is True
+    print("✅ Endpoint /ready")
+
+
+if __name__ == "__main__":
+    test_steps_and_failures()
+    test_search_before_warmup()
+    test_ready_endpoint()